@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+# runs the Exasol check plugins against a local fake EXAoperation and reports wall time, XMLRPC
+# calls and peak memory per check and cluster size
+import json, time
+from glob               import glob
+from os                 import environ, remove, wait4, WIFEXITED, WEXITSTATUS
+from os.path            import dirname, realpath, join, basename
+from subprocess         import Popen, PIPE, DEVNULL
+from sys                import exit, argv, executable, path
+from tempfile           import mkdtemp
+from urllib.parse       import quote_plus
+from fake_exaoperation  import ClusterLayout, FakeExaoperation, createCertificate, startServer
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+from cachedirectory     import cacheDirectory #the same directory the plugins use
+
+pluginVersion           = "19.7"
+checkDirectory          = join(dirname(dirname(realpath(__file__))), 'monitoring')
+nodeCounts              = [4, 16, 64]
+volumeCount             = 4
+backupCount             = 30
+logEntryCount           = 20
+latency                 = 0.0 #seconds per request
+multicall               = True
+repetitions             = 3
+checkNames              = ['check_services.py', 'check_nodes.py', 'check_cluster_health.py', 'check_db_diskspace.py', 'check_backup.py', 'check_logservice.py']
+databaseConnection      = None #connection string, user and password for check_db_performance.py
+resultFile              = None
+baselineFile            = None
+tolerance               = 20.0 #percent
+importBudget            = 200.0 #milliseconds of module imports per check run, 0 disables the check
+
+def checkArguments(checkName, hostName):
+    arguments = ['-H', hostName, '-u', 'benchmark', '-p', 'benchmark']
+    if checkName in ['check_db_diskspace.py', 'check_backup.py']:
+        arguments += ['-d', 'exa_db1']
+    elif checkName == 'check_logservice.py':
+        arguments += ['-i', '1']
+    elif checkName == 'check_db_performance.py':
+        arguments += ['-d', 'exa_db1', '-l', databaseConnection[1], '-a', databaseConnection[2]]
+    return arguments
+
+def clearCaches(hostName):
+    """removes all cache files the plugins have written for the fake license server"""
+    for name in set([hostName, quote_plus(hostName)]):
+        for fileName in glob(join(cacheDirectory, '*%s*' % name)):
+            remove(fileName)
+
+def checkProcess(checkName, hostName, options = [], stderr = DEVNULL):
+    environment = dict(environ)
+    environment['EXASOL_MONITORD_SOCKET'] = join(cacheDirectory, 'exasol-benchmark-no-daemon.sock')
+    return Popen([executable] + options + [join(checkDirectory, checkName)] + checkArguments(checkName, hostName),
+            stdout=PIPE, stderr=stderr, env=environment)
+
+def runCheck(checkName, hostName):
+    """runs a plugin as its own process like Nagios does, returns (return code, output, wall time, peak RSS in KiB)"""
+    started = time.perf_counter()
+    process = checkProcess(checkName, hostName)
+    output = process.stdout.read().decode('utf-8', 'replace')
+    pid, status, usage = wait4(process.pid, 0)
+    duration = time.perf_counter() - started
+    process.returncode = WEXITSTATUS(status) if WIFEXITED(status) else 3
+    process.stdout.close()
+    return process.returncode, output, duration, usage.ru_maxrss
+
+def importTime(checkName, hostName):
+    """runs a plugin with "python3 -X importtime", returns the sum of all module import times in seconds"""
+    process = checkProcess(checkName, hostName, ['-X', 'importtime'], PIPE)
+    stdout, stderr = process.communicate()
+    microseconds = 0
+    for line in stderr.decode('utf-8', 'replace').split('\n'):
+        fields = line.split('|')
+        if line.startswith('import time:') and fields[0].split(':')[1].strip().isdigit():
+            microseconds += int(fields[0].split(':')[1])
+    return microseconds / 1000000.0
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if len(values) % 2 else (values[len(values) // 2 - 1] + values[len(values) // 2]) / 2.0
+
+def benchmark(certificate, key):
+    results = []
+    for nodes in nodeCounts:
+        layout = ClusterLayout(nodes, volumeCount, backupCount, logEntryCount)
+        if databaseConnection:
+            layout.connectionString = databaseConnection[0]
+        fake = FakeExaoperation(layout, latency, multicall)
+        server = startServer(fake, certificate, key)
+        hostName = '127.0.0.1:%i' % server.server_address[1]
+        try:
+            for checkName in checkNames:
+                for mode in ['cold', 'warm']:
+                    runs = []
+                    for repetition in range(repetitions):
+                        if mode == 'cold':
+                            clearCaches(hostName)
+                        fake.reset()
+                        returnCode, output, duration, maxRss = runCheck(checkName, hostName)
+                        runs.append((duration, maxRss, fake.statistics(), returnCode, output))
+                    statistics = runs[-1][2]
+                    if mode == 'cold':
+                        clearCaches(hostName)
+                    imports = importTime(checkName, hostName)
+                    results.append({
+                        'check':        checkName,
+                        'nodes':        nodes,
+                        'mode':         mode,
+                        'wall':         median([run[0] for run in runs]),
+                        'imports':      imports,
+                        'maxRss':       max(run[1] for run in runs),
+                        'calls':        statistics['calls'],
+                        'requests':     statistics['requests'],
+                        'connections':  statistics['connections'],
+                        'methods':      statistics['methods'],
+                        'returnCode':   runs[-1][3],
+                        'output':       runs[-1][4].split('\n')[0][:60]
+                    })
+        finally:
+            clearCaches(hostName)
+            server.shutdown()
+            server.server_close()
+    return results
+
+def printResults(results):
+    print('%-24s %6s %5s %9s %8s %7s %8s %6s %9s  %s' % ('check', 'nodes', 'mode', 'wall [ms]', 'imp. [ms]', 'calls', 'requests', 'conns', 'RSS [MiB]', 'output'))
+    for result in results:
+        print('%-24s %6i %5s %9.1f %8.1f %7i %8i %6i %9.1f  %s' % (
+            result['check'], result['nodes'], result['mode'], result['wall'] * 1000, result['imports'] * 1000, result['calls'],
+            result['requests'], result['connections'], result['maxRss'] / 1024.0, result['output']
+        ))
+
+def checkImportBudget(results):
+    """returns a list of checks which spend more than importBudget milliseconds importing modules"""
+    return ['%s with %i nodes (%s): imports take %.1fms, budget is %.1fms' % (
+                result['check'], result['nodes'], result['mode'], result['imports'] * 1000, importBudget)
+            for result in results if result['imports'] * 1000 > importBudget]
+
+def compareResults(results, baseline):
+    """returns a list of regressions against the results of a previous run"""
+    regressions = []
+    previous = dict(((result['check'], result['nodes'], result['mode']), result) for result in baseline)
+    for result in results:
+        old = previous.get((result['check'], result['nodes'], result['mode']))
+        if old is None:
+            continue
+        for field in ['wall', 'imports', 'calls', 'requests', 'maxRss']:
+            if field not in old:
+                continue
+            if result[field] > old[field] * (1 + tolerance / 100.0) and result[field] - old[field] > (0.01 if field in ['wall', 'imports'] else 0):
+                regressions.append('%s with %i nodes (%s): %s %s -> %s' % (
+                    result['check'], result['nodes'], result['mode'], field, round(old[field], 3), round(result[field], 3)))
+    return regressions
+
+if __name__ == '__main__':
+    from getopt import getopt
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVn:v:b:l:L:mr:c:D:o:B:T:I:')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+Exasol check plugin benchmark (version %s)
+  Runs every check against a local fake EXAoperation, once with empty caches (cold) and once
+  with the caches of the previous run (warm). Cache files of the fake license server are
+  removed from %s afterwards.
+
+  Options:
+    -h                      shows this help
+    -V                      shows the version
+    -n <nodes,...>          simulated cluster sizes (default: %s)
+    -v <volumes>            additional data volumes (default: %i)
+    -b <backups>            length of the backup list (default: %i)
+    -l <log entries>        log messages per logservice request (default: %i)
+    -L <latency in sec>     delay of every EXAoperation request (default: %.2f)
+    -m                      simulate an EXAoperation without system.multicall
+    -r <repetitions>        runs per check and mode, the median wall time is reported (default: %i)
+    -c <checks,...>         checks to run (default: %s)
+    -D <conn,user,password> also run check_db_performance.py against this database
+    -o <json file>          (optional) store the results for later comparisons
+    -B <json file>          (optional) compare with stored results, exits with 1 on regressions
+    -T <percent>            (optional) tolerance of the comparison (default: %.0f)
+    -I <milliseconds>       (optional) import time budget per check run ("python3 -X importtime"),
+                            exits with 1 if a check exceeds it, 0 disables the check (default: %.0f)
+""" % (pluginVersion, cacheDirectory, ','.join(str(nodes) for nodes in nodeCounts), volumeCount, backupCount,
+       logEntryCount, latency, repetitions, ','.join(checkNames), tolerance, importBudget))
+            exit(0)
+
+        elif parameter == '-V':
+            print("Exasol check plugin benchmark (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-n':
+            nodeCounts = [int(nodes) for nodes in value.split(',')]
+        elif parameter == '-v':
+            volumeCount = int(value)
+        elif parameter == '-b':
+            backupCount = int(value)
+        elif parameter == '-l':
+            logEntryCount = int(value)
+        elif parameter == '-L':
+            latency = float(value)
+        elif parameter == '-m':
+            multicall = False
+        elif parameter == '-r':
+            repetitions = int(value)
+        elif parameter == '-c':
+            checkNames = [basename(checkName.strip()) for checkName in value.split(',')]
+        elif parameter == '-D':
+            databaseConnection = value.split(',', 2)
+            if 'check_db_performance.py' not in checkNames:
+                checkNames.append('check_db_performance.py')
+        elif parameter == '-o':
+            resultFile = value.strip()
+        elif parameter == '-B':
+            baselineFile = value.strip()
+        elif parameter == '-T':
+            tolerance = float(value)
+        elif parameter == '-I':
+            try:
+                importBudget = float(value)
+            except ValueError:
+                importBudget = -1.0
+            if importBudget < 0:
+                print('import time budget must be a number of milliseconds, 0 disables it')
+                exit(4)
+
+    if 'check_db_performance.py' in checkNames and not databaseConnection:
+        print('check_db_performance.py needs a database, please define it with -D')
+        exit(4)
+
+    certificate, key = createCertificate(mkdtemp())
+    results = benchmark(certificate, key)
+    printResults(results)
+
+    if resultFile:
+        with open(resultFile, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    failed = False
+    if baselineFile:
+        with open(baselineFile, 'r') as f:
+            regressions = compareResults(results, json.load(f))
+        if len(regressions) > 0:
+            print('\n%i regressions (tolerance %.0f%%):\n%s' % (len(regressions), tolerance, '\n'.join(regressions)))
+            failed = True
+        else:
+            print('\nno regressions (tolerance %.0f%%)' % tolerance)
+
+    if importBudget > 0:
+        violations = checkImportBudget(results)
+        if len(violations) > 0:
+            print('\n%i checks over the import time budget:\n%s' % (len(violations), '\n'.join(violations)))
+            failed = True
+        else:
+            print('\nall checks within the import time budget of %.1fms' % importBudget)
+    exit(1 if failed else 0)
@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+# compares the free space computation of check_db_diskspace.py (volumespace.py) with the former
+# per-volume loop and, if NumPy is installed, with a NumPy scatter-add on synthetic storage layouts
+import random, time
+from os.path            import dirname, realpath, join
+from sys                import exit, argv, path
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+import volumespace
+
+pluginVersion           = "19.7"
+nodeCounts              = [200]
+volumeCounts            = [10, 100, 1000]
+repetitions             = 5
+seed                    = 1
+
+def syntheticLayout(nodes, volumes):
+    """returns (partition sizes, volume infos, database volume, temporary volume) of a cluster with
+    data volumes of random size, redundancy and placement on a part of the nodes"""
+    generator = random.Random(seed)
+    nodeNames = ['n%04d' % (11 + i) for i in range(nodes)]
+    partitionSizes = dict((node, generator.uniform(20.0, 40.0) * (volumes + 10)) for node in nodeNames)
+    volumeInfos = {}
+    for i in range(volumes + 2):
+        placement = generator.sample(nodeNames, generator.randint(max(nodes // 8, 1), nodes))
+        redundancy = 1 if i == 1 else generator.randint(1, 2)
+        volumeInfos['v%04i' % i] = {
+            'size': generator.uniform(1.0, 20.0) * len(placement),
+            'redundancy': redundancy,
+            'segments': [placement, placement[1:] + placement[:1]][:redundancy],
+            'disk': 'd03_storage'
+        }
+    return partitionSizes, volumeInfos, 'v0000', 'v0001'
+
+def legacyFreeSpace(partitionSizes, volumeInfos, databaseVolume, databaseTempVolume, databaseUsage, databaseTempUsage):
+    """the computation of check_db_diskspace.py before volumespace.py, returns (minimum, used space)"""
+    databaseVolumeInfo = volumeInfos[databaseVolume]
+    databaseSegments = []
+    for redundancyLayer in range(0, databaseVolumeInfo['redundancy']):
+        databaseSegments += databaseVolumeInfo['segments'][redundancyLayer]
+    databaseTempSegments = volumeInfos[databaseTempVolume]['segments'][0]
+    databaseSegmentUsage =      (databaseUsage      / float(len(databaseSegments)))     * databaseVolumeInfo['redundancy']
+    databaseTempSegmentUsage =  (databaseTempUsage  / float(len(databaseTempSegments)))
+
+    storagePartitionSizes = dict((node, partitionSizes[node]) for node in set(databaseSegments))
+    for volume in sorted(volumeInfos):
+        if volume.startswith('v') and volume not in [databaseVolume, databaseTempVolume]:
+            volumeInfo = volumeInfos[volume]
+            volumeSizePerNode = (volumeInfo['size'] / float(len(volumeInfo['segments'][0])))
+            allSegments = []
+            for redundancyLayer in range(0, volumeInfo['redundancy']):
+                allSegments += volumeInfo['segments'][redundancyLayer]
+            for node in allSegments:
+                if node in storagePartitionSizes.keys():
+                    storagePartitionSizes[node] -= volumeSizePerNode
+        elif volume == databaseVolume:
+            for node in databaseSegments:
+                storagePartitionSizes[node] -= databaseSegmentUsage
+        elif volume == databaseTempVolume:
+            for node in databaseTempSegments:
+                if node in storagePartitionSizes: #the synthetic temporary volume may use other nodes
+                    storagePartitionSizes[node] -= databaseTempSegmentUsage
+
+    minPartitionSize = None
+    minPartitionNode = ''
+    for node in storagePartitionSizes:
+        if not minPartitionSize or storagePartitionSizes[node] < minPartitionSize:
+            minPartitionSize = storagePartitionSizes[node]
+            minPartitionNode = node
+    return minPartitionSize, databaseSegmentUsage * databaseSegments.count(minPartitionNode) + databaseTempSegmentUsage
+
+def arrayFreeSpace(partitionSizes, volumeInfos, databaseVolume, databaseTempVolume, databaseUsage, databaseTempUsage):
+    """the computation of check_db_diskspace.py with volumespace.py, returns (minimum, used space)"""
+    databaseVolumeInfo = volumeInfos[databaseVolume]
+    databaseSegments = volumespace.segmentNodes(databaseVolumeInfo)
+    databaseTempSegments = volumespace.segmentNodes(volumeInfos[databaseTempVolume], 1)
+    databaseSegmentUsage =      (databaseUsage      / float(len(databaseSegments)))     * databaseVolumeInfo['redundancy']
+    databaseTempSegmentUsage =  (databaseTempUsage  / float(len(databaseTempSegments)))
+
+    storagePartitionSizes = dict((node, partitionSizes[node]) for node in set(databaseSegments))
+    segments = [(databaseSegments, databaseSegmentUsage), (databaseTempSegments, databaseTempSegmentUsage)]
+    for volume in sorted(volumeInfos):
+        if volume.startswith('v') and volume not in [databaseVolume, databaseTempVolume]:
+            volumeInfo = volumeInfos[volume]
+            segments.append((volumespace.segmentNodes(volumeInfo), volumeInfo['size'] / float(len(volumeInfo['segments'][0]))))
+    nodes, nodeFreeSpace, nodeDatabaseSegments = volumespace.freeSpace(storagePartitionSizes, segments)
+    minimum = volumespace.smallest(nodeFreeSpace)
+    volumespace.percentiles(nodeFreeSpace, [10, 50, 90])
+    return nodeFreeSpace[minimum], databaseSegmentUsage * nodeDatabaseSegments[minimum] + databaseTempSegmentUsage
+
+def numpyFreeSpace(partitionSizes, volumeInfos, databaseVolume, databaseTempVolume, databaseUsage, databaseTempUsage):
+    """the same computation with a NumPy scatter-add (bincount) over all segments, returns (minimum, used space)"""
+    import numpy
+    databaseVolumeInfo = volumeInfos[databaseVolume]
+    databaseSegments = volumespace.segmentNodes(databaseVolumeInfo)
+    databaseTempSegments = volumespace.segmentNodes(volumeInfos[databaseTempVolume], 1)
+    databaseSegmentUsage =      (databaseUsage      / float(len(databaseSegments)))     * databaseVolumeInfo['redundancy']
+    databaseTempSegmentUsage =  (databaseTempUsage  / float(len(databaseTempSegments)))
+
+    nodes = numpy.array(sorted(set(databaseSegments)))
+    segments = [(databaseSegments, databaseSegmentUsage), (databaseTempSegments, databaseTempSegmentUsage)]
+    for volume in sorted(volumeInfos):
+        if volume.startswith('v') and volume not in [databaseVolume, databaseTempVolume]:
+            volumeInfo = volumeInfos[volume]
+            segments.append((volumespace.segmentNodes(volumeInfo), volumeInfo['size'] / float(len(volumeInfo['segments'][0]))))
+    allNodes = []
+    for placement, size in segments:
+        allNodes += placement
+    allNodes = numpy.array(allNodes)
+    #segments on other nodes are added to an additional last element which is dropped
+    indices = numpy.minimum(numpy.searchsorted(nodes, allNodes), len(nodes) - 1)
+    indices[nodes[indices] != allNodes] = len(nodes)
+    sizes = numpy.repeat([size for placement, size in segments], [len(placement) for placement, size in segments])
+    nodeFreeSpace = numpy.array([partitionSizes[node] for node in nodes]) - numpy.bincount(indices, sizes, minlength=len(nodes) + 1)[:len(nodes)]
+    nodeDatabaseSegments = numpy.bincount(indices[:len(databaseSegments)], minlength=len(nodes) + 1)
+    minimum = int(numpy.argmin(nodeFreeSpace))
+    numpy.percentile(nodeFreeSpace, [10, 50, 90])
+    return float(nodeFreeSpace[minimum]), databaseSegmentUsage * int(nodeDatabaseSegments[minimum]) + databaseTempSegmentUsage
+
+def measure(function, layout):
+    """returns (median seconds of the repetitions, result), the database uses 10 GiB per node"""
+    durations = []
+    for repetition in range(repetitions):
+        started = time.perf_counter()
+        result = function(*(layout + (10.0 * len(layout[0]), 0.25 * len(layout[0]))))
+        durations.append(time.perf_counter() - started)
+    return sorted(durations)[len(durations) // 2], result
+
+if __name__ == '__main__':
+    from getopt import getopt
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVn:v:r:s:')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+Exasol free space computation benchmark (version %s)
+  Computes the smallest free space per node of check_db_diskspace.py on synthetic layouts with
+  the former per-volume loop, with volumespace.py and with a NumPy scatter-add (if installed), and
+  exits with 1 if the results differ.
+
+  Options:
+    -h                      shows this help
+    -V                      shows the version
+    -n <nodes,...>          simulated cluster sizes (default: %s)
+    -v <volumes,...>        data volumes besides the database volumes (default: %s)
+    -r <repetitions>        runs per layout, the median is reported (default: %i)
+    -s <seed>               seed of the random layouts (default: %i)
+""" % (pluginVersion, ','.join(str(nodes) for nodes in nodeCounts), ','.join(str(volumes) for volumes in volumeCounts), repetitions, seed))
+            exit(0)
+
+        elif parameter == '-V':
+            print("Exasol free space computation benchmark (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-n':
+            nodeCounts = [int(nodes) for nodes in value.split(',')]
+        elif parameter == '-v':
+            volumeCounts = [int(volumes) for volumes in value.split(',')]
+        elif parameter == '-r':
+            repetitions = int(value)
+        elif parameter == '-s':
+            seed = int(value)
+
+    implementations = [('loop', legacyFreeSpace), ('indexed', arrayFreeSpace)]
+    try:
+        started = time.perf_counter()
+        import numpy
+        numpyImport = time.perf_counter() - started
+        implementations.append(('numpy', numpyFreeSpace))
+        print('NumPy import: %.1fms (not included in the times below)\n' % (numpyImport * 1000))
+    except ImportError:
+        print('NumPy is not installed, the scatter-add version is not measured\n')
+
+    failed = False
+    print('%6s %8s %10s %10s %11s %14s' % ('nodes', 'volumes', 'version', 'time [ms]', 'speedup', 'min free [GiB]'))
+    for nodes in nodeCounts:
+        for volumes in volumeCounts:
+            layout = syntheticLayout(nodes, volumes)
+            reference = None
+            for name, function in implementations:
+                duration, result = measure(function, layout)
+                if reference is None:
+                    reference = (duration, result)
+                elif abs(result[0] - reference[1][0]) > 1e-6 or abs(result[1] - reference[1][1]) > 1e-6:
+                    print('%s differs from the former computation: %r != %r' % (name, result, reference[1]))
+                    failed = True
+                print('%6i %8i %10s %10.2f %10.1fx %14.1f' % (nodes, volumes, name, duration * 1000, reference[0] / duration, result[0]))
+    exit(1 if failed else 0)
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+# local stand-in for the EXAoperation XMLRPC interface, used by the plugin benchmarks
+import ssl, time
+from os.path            import join
+from socketserver       import ThreadingMixIn
+from subprocess         import check_call, DEVNULL
+from sys                import exit, argv
+from threading          import Lock, local
+from xmlrpc.client      import Fault
+from xmlrpc.server      import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+pluginVersion           = "19.7"
+
+class ClusterLayout(object):
+    """simulated cluster: nodes, volumes with segment placement, backups and log messages"""
+    def __init__(self, nodes = 8, volumes = 4, backups = 30, logEntries = 20, databaseName = 'exa_db1'):
+        self.databaseName = databaseName
+        self.connectionString = '127.0.0.1:8563'
+        self.nodes = ['n%04d' % (11 + i) for i in range(nodes)]
+        self.failedNodes = set(self.nodes[-1:]) if nodes > 1 else set()
+
+        shifted = self.nodes[1:] + self.nodes[:1]
+        self.volumes = {
+            'v0000': {'size': 100.0 * nodes, 'redundancy': 2, 'segments': [self.nodes, shifted], 'disk': 'd03_storage'},
+            'v0001': {'size': 10.0 * nodes, 'redundancy': 1, 'segments': [self.nodes], 'disk': 'd03_storage'}
+        }
+        for i in range(volumes):
+            segments = self.nodes[i % nodes:] + self.nodes[:i % nodes]
+            self.volumes['v%04i' % (i + 2)] = {
+                'size': 20.0 * nodes,
+                'redundancy': 1 + i % 2,
+                'segments': [segments, segments[1:] + segments[:1]][:1 + i % 2],
+                'disk': 'd03_storage'
+            }
+        self.volumes['r0000'] = {'size': 1000.0, 'redundancy': 1, 'segments': [self.nodes], 'disk': 'd04_archive'}
+
+        #incremental backups, every fifth one is a full (level 0) backup
+        self.backups = {}
+        now = time.time()
+        for i in range(1, backups + 1):
+            base = (i - 1) // 5 * 5 + 1
+            self.backups[i] = {
+                'id': i,
+                'volume': ['r0000'],
+                'usable': True,
+                'dependencies': list(range(base, i)),
+                'timestamp': time.strftime('%Y-%m-%d %H:%M', time.localtime(now - (backups - i) * 3600)),
+                'expire date': time.strftime('%Y-%m-%d %H:%M', time.localtime(now + (7 + base) * 86400))
+            }
+
+        self.logEntries = [{
+                'priority': ['Information', 'Warning', 'Error'][i % 3],
+                'message': 'message %i of node %s' % (i, self.nodes[i % nodes])
+            } for i in range(logEntries)]
+
+class FakeExaoperation(object):
+    """dispatches the XMLRPC methods used by the check plugins and counts all calls"""
+    def __init__(self, layout, latency = 0.0, multicall = True):
+        self.layout = layout
+        self.latency = latency
+        self.multicall = multicall
+        self.request = local()
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.requests = 0
+            self.connections = 0
+
+    def statistics(self):
+        with self.lock:
+            return {'calls': sum(self.calls.values()), 'methods': dict(self.calls), 'requests': self.requests, 'connections': self.connections}
+
+    def count(self, counter, methodName = None):
+        with self.lock:
+            if methodName is None:
+                setattr(self, counter, getattr(self, counter) + 1)
+            else:
+                self.calls[methodName] = self.calls.get(methodName, 0) + 1
+
+    def _dispatch(self, methodName, params):
+        if methodName == 'system.multicall' and self.multicall:
+            time.sleep(self.latency)
+            results = []
+            for call in params[0]:
+                try:
+                    results.append([self.call(call['methodName'], call['params'])])
+                except Fault as e:
+                    results.append({'faultCode': e.faultCode, 'faultString': e.faultString})
+            return results
+        time.sleep(self.latency)
+        return self.call(methodName, params)
+
+    def call(self, methodName, params):
+        self.count('calls', methodName)
+        layout = self.layout
+        urlPath = self.request.path.split('/cluster1', 1)[-1].strip('/')
+
+        if methodName == 'getNodeList':
+            return layout.nodes
+        elif methodName == 'getNodeState':
+            return {'status': 'Suspended' if params[0] in layout.failedNodes else 'Running'}
+        elif methodName == 'getServiceState':
+            return [[service, 'OK'] for service in ['Loggingd', 'Lockd', 'Storaged', 'DWAd', 'Authentication']]
+        elif methodName == 'getDatabaseList':
+            return [layout.databaseName]
+        elif methodName == 'getDatabaseInfo':
+            return {
+                'nodes': {'active': layout.nodes, 'reserve': [], 'failed': []},
+                'usage persistent': 30.0 * len(layout.nodes),
+                'usage temporary': 2.0 * len(layout.nodes),
+                'persistent volume': 'v0000',
+                'temporary volume': 'v0001',
+                'state': 'running'
+            }
+        elif methodName == 'getDatabaseState':
+            return 'running'
+        elif methodName == 'getDatabaseConnectionString':
+            return layout.connectionString
+        elif methodName == 'getVolumeList':
+            return sorted(layout.volumes)
+        elif methodName == 'getVolumeInfo':
+            if params[0] not in layout.volumes:
+                raise Fault(1, 'Unexpected Zope exception: NotFound: Object %s' % params[0])
+            return layout.volumes[params[0]]
+        elif methodName == 'getDiskStates':
+            return [
+                {'name': 'd00_os', 'size': '50', 'free': '20'},
+                {'name': 'd03_storage', 'size': '1000.0', 'free': '400.0'},
+                {'name': 'd04_archive', 'size': '500.0', 'free': '100.0'}
+            ]
+        elif methodName == 'getBackupList':
+            return [((backupId, 'r0000'), 'r0000', '') for backupId in sorted(layout.backups)]
+        elif methodName == 'getBackupInfo':
+            backupId = params[0][0] if isinstance(params[0], list) else params[0]
+            return layout.backups[backupId]
+        elif methodName == 'logEntriesTagged':
+            return [0, len(layout.logEntries), layout.logEntries]
+        raise Fault(1, 'method "%s" is not supported on /%s' % (methodName, urlPath))
+
+class FakeRequestHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    rpc_paths = ()
+
+    def setup(self):
+        self.server.instance.count('connections')
+        SimpleXMLRPCRequestHandler.setup(self)
+
+    def do_POST(self):
+        self.server.instance.count('requests')
+        self.server.instance.request.path = self.path
+        return SimpleXMLRPCRequestHandler.do_POST(self)
+
+class FakeServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+    request_queue_size = 128 #the plugins open many connections at once
+
+def createCertificate(directory):
+    """creates a self signed certificate for the HTTPS server, returns (certificate, key) file names"""
+    certificate, key = join(directory, 'cert.pem'), join(directory, 'key.pem')
+    check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+            '-keyout', key, '-out', certificate], stdout=DEVNULL, stderr=DEVNULL)
+    return certificate, key
+
+def startServer(fakeExaoperation, certificate, key, port = 0):
+    """starts the fake EXAoperation on 127.0.0.1 in a background thread, returns the server;
+    the license server address is "127.0.0.1:<server.server_address[1]>\""""
+    from threading import Thread
+    server = FakeServer(('127.0.0.1', port), FakeRequestHandler, allow_none=True, logRequests=False)
+    server.register_instance(fakeExaoperation)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certificate, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    from getopt import getopt
+    from tempfile import mkdtemp
+    port, nodes, volumes, backups, logEntries, latency, multicall = 8443, 8, 4, 30, 20, 0.0, True
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVP:n:v:b:l:L:m')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+Fake EXAoperation XMLRPC server (version %s)
+  Options:
+    -h                      shows this help
+    -V                      shows the version
+    -P <port>               HTTPS port on 127.0.0.1 (default: %i)
+    -n <nodes>              number of cluster nodes (default: %i)
+    -v <volumes>            number of additional data volumes (default: %i)
+    -b <backups>            length of the backup list (default: %i)
+    -l <log entries>        log messages returned per logservice request (default: %i)
+    -L <latency in sec>     delay of every request (default: %.2f)
+    -m                      disable system.multicall
+""" % (pluginVersion, port, nodes, volumes, backups, logEntries, latency))
+            exit(0)
+
+        elif parameter == '-V':
+            print("Fake EXAoperation XMLRPC server (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-P':
+            port = int(value)
+        elif parameter == '-n':
+            nodes = int(value)
+        elif parameter == '-v':
+            volumes = int(value)
+        elif parameter == '-b':
+            backups = int(value)
+        elif parameter == '-l':
+            logEntries = int(value)
+        elif parameter == '-L':
+            latency = float(value)
+        elif parameter == '-m':
+            multicall = False
+
+    certificate, key = createCertificate(mkdtemp())
+    server = startServer(FakeExaoperation(ClusterLayout(nodes, volumes, backups, logEntries), latency, multicall), certificate, key, port)
+    print('fake EXAoperation listening on https://127.0.0.1:%i' % server.server_address[1])
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# adaptive check intervals for exasol_batch.py: stable checks far below their thresholds are run
+# less often, checks with a changed state or values approaching a threshold on every batch run
+import json, re
+from os                 import replace, remove
+from os.path            import dirname, join
+from tempfile           import mkstemp
+from cachedirectory     import cacheDirectory
+
+scheduleVersion         = 1
+minInterval             = 120.0 #seconds, check_interval of the exasol_batch service
+maxInterval             = 1800.0 #seconds, must be lower than the freshness_threshold of the services
+relaxedRatio            = 0.5 #values below this share of their warning threshold allow longer intervals
+closeRatio              = 0.8 #values above this share of their warning threshold are checked on every run
+thresholdPattern        = re.compile(r"('[^']+'|[^\s;=|']+)=([-+]?(?:\d+\.?\d*|\.\d+))[a-zA-Z%/]*;([-+]?(?:\d+\.?\d*|\.\d+))")
+
+scheduleFile            = join(cacheDirectory, 'exasol_batch_schedule.json')
+
+def thresholdValues(output):
+    """returns {label: (value, warning threshold)} of the performance data with a warning threshold"""
+    lines = output.strip().split('\n')
+    perfdata = ' '.join(line.split('|', 1)[1] for line in lines if '|' in line)
+    return dict((label.strip("'"), (float(value), float(warning))) for label, value, warning in thresholdPattern.findall(perfdata))
+
+def headroom(values, returnCode):
+    """returns the highest share of its warning threshold a value has reached (1.0 = threshold)
+
+    The direction of a threshold is taken from the state: a value above its warning threshold in
+    an OK result belongs to a lower limit (e.g. hours_to_full of check_db_diskspace)."""
+    ratios = []
+    for value, warning in values.values():
+        if warning <= 0.0 or value < 0.0:
+            continue
+        if value > warning and returnCode == 0:
+            ratios.append(warning / value if value > 0.0 else 1.0)
+        else:
+            ratios.append(value / warning)
+    return max(ratios) if ratios else None
+
+def approaching(values, previousValues, elapsed, horizon):
+    """True if a value moves towards its warning threshold fast enough to reach it within horizon"""
+    for label, (value, warning) in values.items():
+        if label not in previousValues or elapsed <= 0.0:
+            continue
+        rate = (value - previousValues[label][0]) / elapsed
+        distance = warning - value
+        if rate != 0.0 and 0.0 <= distance / rate <= horizon:
+            return True
+    return False
+
+class AdaptiveSchedule(object):
+    """next run and interval of every check, stored between the runs of exasol_batch.py"""
+    def __init__(self, fileName = None):
+        self.fileName = fileName or scheduleFile
+        self.checks = {}
+        try:
+            with open(self.fileName, 'r') as f:
+                schedule = json.load(f)
+            if schedule.get('version') == scheduleVersion:
+                self.checks = schedule['checks']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    @staticmethod
+    def key(check):
+        return '%s;%s' % (check[0], check[1])
+
+    def due(self, checks, now):
+        """returns the checks which have to run in this batch run; a check is due if its next run
+        is closer to now than to the following batch run"""
+        return [check for check in checks if self.checks.get(self.key(check), {}).get('nextRun', 0.0) - now < minInterval / 2.0]
+
+    def update(self, check, returnCode, output, started):
+        """adjusts the interval of a check by its result, returns the new interval"""
+        previous = self.checks.get(self.key(check))
+        values = thresholdValues(output)
+        interval = minInterval
+        if previous is not None and returnCode == 0 and previous['returnCode'] == 0:
+            ratio = headroom(values, returnCode)
+            longer = min(previous['interval'] * 2.0, maxInterval)
+            if ratio is None or ratio >= closeRatio or approaching(values, previous['values'], started - previous['started'], 2.0 * longer):
+                interval = minInterval
+            elif ratio < relaxedRatio:
+                interval = longer
+            else:
+                interval = max(previous['interval'], minInterval)
+        self.checks[self.key(check)] = {
+            'returnCode': returnCode,
+            'interval':   interval,
+            'started':    started,
+            'nextRun':    started + interval,
+            'values':     values
+        }
+        return interval
+
+    def save(self, checks):
+        """writes the schedule of the configured checks, removed services are dropped"""
+        keys = set(self.key(check) for check in checks)
+        schedule = {'version': scheduleVersion, 'checks': dict((key, value) for key, value in self.checks.items() if key in keys)}
+        fd, tempFile = mkstemp(dir = dirname(self.fileName) or '.', prefix = 'exasol_batch_')
+        try:
+            with open(fd, 'w') as f:
+                json.dump(schedule, f, separators=(',',':'))
+            replace(tempFile, self.fileName)
+        except Exception:
+            remove(tempFile)
+            raise
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# asyncio XMLRPC client for EXAoperation, runs many requests concurrently without threads
+import asyncio
+from base64             import b64encode
+from time               import time
+from xmlrpc.client      import dumps, loads, Fault, ProtocolError
+from exaoperation       import SslContext, multicallSupport, cacheTimes, maxStaleAge
+from plugintrace        import timed, count
+
+class AsyncXmlRpcClient(object):
+    """keep-alive HTTPS connections to one license server
+
+    At most maxConnections requests are sent at the same time, finished connections are reused by
+    the next request. The client has to be created and used inside a running event loop.
+    """
+    def __init__(self, userName, password, hostName, maxConnections = 8, timeout = 30):
+        host, separator, port = hostName.rpartition(':')
+        if not separator or not port.isdigit() or ']' in port:
+            host, port = hostName, '443'
+        self.host = host.strip('[]')
+        self.port = int(port)
+        self.userName = userName
+        self.hostName = hostName
+        self.authorization = 'Basic ' + b64encode(('%s:%s' % (userName, password)).encode('utf-8')).decode('ascii')
+        self.maxConnections = maxConnections
+        self.timeout = timeout
+        self.semaphore = None
+        self.connections = []
+
+    def close(self):
+        for reader, writer in self.connections:
+            writer.close()
+        self.connections = []
+
+    async def response(self, reader):
+        """reads one HTTP response, returns (status, reason, headers, content)"""
+        statusLine = await reader.readline()
+        if not statusLine:
+            raise ConnectionResetError('connection closed by EXAoperation')
+        version, status, reason = (statusLine.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in [b'\r\n', b'\n', b'']:
+                break
+            key, value = line.decode('latin-1').split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in [b'\r\n', b'\n', b'']:
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b''.join(chunks)
+        else:
+            content = await reader.read()
+            headers['connection'] = 'close'
+        if version == 'HTTP/1.0' and headers.get('connection', '').lower() != 'keep-alive':
+            headers['connection'] = 'close'
+        return int(status), reason, headers, content
+
+    async def request(self, urlPath, body):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.maxConnections)
+        header = ('POST /cluster1%s HTTP/1.1\r\nHost: %s\r\nAuthorization: %s\r\nUser-Agent: exasol-monitoring\r\n'
+                  'Content-Type: text/xml\r\nContent-Length: %i\r\n\r\n' % (urlPath or '/', self.hostName, self.authorization, len(body)))
+
+        async with self.semaphore:
+            while True:
+                reused = len(self.connections) > 0
+                if reused:
+                    reader, writer = self.connections.pop()
+                else:
+                    with timed('tls', self.host):
+                        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=SslContext()), self.timeout)
+                try:
+                    writer.write(header.encode('latin-1') + body)
+                    status, reason, headers, content = await asyncio.wait_for(self.response(reader), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused: #the server has closed an idle keep-alive connection, try a new one
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                break
+
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+            else:
+                self.connections.append((reader, writer))
+
+        if status != 200:
+            raise ProtocolError('%s/cluster1%s' % (self.hostName, urlPath), status, reason, headers)
+        return content
+
+    async def call(self, urlPath, methodName, *arguments):
+        """calls methodName on urlPath, faults are raised as xmlrpc.client.Fault"""
+        with timed('rpc', '%s:%s' % (urlPath or '/', methodName)):
+            content = await self.request(urlPath, dumps(tuple(arguments), methodName).encode('utf-8'))
+        return loads(content)[0][0]
+
+    async def batch(self, urlPath, methodName, argumentList):
+        """calls methodName once for every argument tuple of argumentList, like exaoperation.XmlRpcBatch
+        with one system.multicall request or concurrent requests"""
+        argumentList = [tuple(arguments) for arguments in argumentList]
+        if multicallSupport.get(self.hostName, True) and len(argumentList) > 1:
+            try:
+                results = await self.call(urlPath, 'system.multicall',
+                        [{'methodName': methodName, 'params': list(arguments)} for arguments in argumentList])
+            except (Fault, ProtocolError) as e:
+                if isinstance(e, ProtocolError) and e.errcode == 401:
+                    raise
+                multicallSupport[self.hostName] = False
+            else:
+                multicallSupport[self.hostName] = True
+                for result in results:
+                    if isinstance(result, dict):
+                        raise Fault(result['faultCode'], result['faultString'])
+                return [result[0] for result in results]
+
+        return list(await asyncio.gather(*[self.call(urlPath, methodName, *arguments) for arguments in argumentList]))
+
+    async def cached(self, urlPath, methodName, *arguments):
+        """like exaoperation.XmlRpcCached: responses of the methods in cacheTimes are taken from the
+        response cache, an expired response is used if EXAoperation fails to answer"""
+        from responsecache import ResponseCacheFile
+        cache = ResponseCacheFile(self.hostName, self.userName)
+        key = cache.key(urlPath, methodName, arguments)
+        cached = cache.get(key) if methodName in cacheTimes else None
+        if cached is not None and time() - cached[1] < cacheTimes[methodName]:
+            count('cache_hits')
+            return cached[0]
+        if methodName in cacheTimes:
+            count('cache_misses')
+
+        try:
+            result = await self.call(urlPath, methodName, *arguments)
+        except Exception:
+            if cached is not None and time() - cached[1] < cacheTimes[methodName] + maxStaleAge:
+                return cached[0]
+            raise
+        if methodName in cacheTimes:
+            cache.update({key: result})
+        return result
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# long output of the transaction conflicts of check_db_performance.py; the rows are aggregated by
+# the database, one per blocking session: (session, waiting sessions, max. seconds waited, session it
+# waits for itself or None, conflicts, max. duration, number of blocking sessions)
+
+def blockerGraph(rows):
+    """long output of the top blocking sessions: the root blockers (not waiting themselves) with all
+    sessions waiting for them directly or indirectly, then the blockers waiting for another session"""
+    blockers = dict((row[0], row) for row in rows)
+    fanOut = dict((row[0], int(row[1])) for row in rows)
+    for row in rows: #add the waiting sessions of a blocker to the blockers it waits for
+        blockedBy, visited = row[3], set([row[0]])
+        while blockedBy in blockers and blockedBy not in visited:
+            fanOut[blockedBy] += int(row[1])
+            visited.add(blockedBy)
+            blockedBy = blockers[blockedBy][3]
+
+    lines = []
+    for row in sorted(rows, key=lambda row: (row[3] is not None, -fanOut[row[0]])):
+        if row[3] is None:
+            lines.append('transaction conflict: session %s blocks %i sessions (%i directly) - max duration: %i seconds' % (
+                    row[0], fanOut[row[0]], int(row[1]), int(row[2] or 0)))
+        else:
+            lines.append('transaction conflict: session %s waiting for %s blocks %i sessions (%i directly) - max duration: %i seconds' % (
+                    row[0], row[3], fanOut[row[0]], int(row[1]), int(row[2] or 0)))
+    if int(rows[0][6]) > len(rows):
+        lines.append('%i more blocking sessions' % (int(rows[0][6]) - len(rows)))
+    return ''.join(line + '\n' for line in lines)
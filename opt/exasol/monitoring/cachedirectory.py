@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# directory of the files the plugins and their helpers keep between runs (indexes, snapshots, histories)
+from os.path            import isdir
+
+cacheDirectory          = r'/var/cache/nagios'
+if not isdir(cacheDirectory):
+    from tempfile import gettempdir
+    cacheDirectory = gettempdir()
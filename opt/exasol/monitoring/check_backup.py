@@ -1,12 +1,11 @@
 #!/usr/bin/python3
-import ssl, json, time
-from os.path            import isfile, getctime
-from os                 import sep, remove, name
-from sys                import exit, argv, version_info, stdout, stderr, maxsize
+import time
+from os.path            import isfile
+from os                 import sep, replace, getpid
+from sys                import exit, argv, maxsize
 from getopt             import getopt
-from datetime           import datetime
-from urllib.parse       import quote_plus
-from xmlrpc.client      import ServerProxy
+from checkentry         import traceOptions, traceHelp, startCheck
+from cachedirectory     import cacheDirectory
 
 pluginVersion               = "18.10"
 databaseName                = None
@@ -15,9 +14,12 @@ userName                    = None
 password                    = None
 opts, args                  = None, None
 backupAge                   = 7 #days
+indexVersion                = 2 #entries are keyed by backup id and archive volume
+indexRefresh                = 86400 #seconds (expire dates of backups can be changed)
+indexFields                 = ['id', 'volume', 'usable', 'dependencies', 'timestamp', 'expire date']
 
 try:
-    opts, args = getopt(argv[1:], 'hVw:c:H:d:u:p:b:')
+    opts, args = getopt(argv[1:], 'hVw:c:H:d:u:p:b:' + traceOptions)
 
 except:
     print("Unknown parameter(s): %s" % argv[1:])
@@ -40,7 +42,8 @@ EXAoperation XMLRPC database disk usage monitor (version %s)
     -u <user login>         EXAoperation login user
     -p <password>           EXAoperation login password
     -b <backup age in days> (optional) maximum age of the last valid backup
-""" % (pluginVersion))
+%s
+""" % (pluginVersion, traceHelp))
         exit(0)
     
     elif parameter == '-V':
@@ -66,13 +69,15 @@ if not (databaseName and hostName and userName and password):
     print('Please define at least the following parameters: -d -H -u -p')
     exit(4)
 
+startCheck(opts)
+
+import json
+from datetime           import datetime
+from urllib.parse       import quote_plus
+from exaoperation       import XmlRpcSession
 
 def XmlRpcCall(urlPath = ''):
-    url = 'https://%s:%s@%s/cluster1%s' % (quote_plus(userName), quote_plus(password), hostName, urlPath)
-    sslcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-    sslcontext.verify_mode = ssl.CERT_NONE
-    sslcontext.check_hostname = False
-    return ServerProxy(url, context=sslcontext)
+    return XmlRpcSession(userName, password, hostName, urlPath)
 
 
 def stringToTimestamp(data):
@@ -82,6 +87,48 @@ def stringToTimestamp(data):
     else: #empty string = no expiration
         return maxsize
 
+def readIndex():
+    if isfile(indexFile):
+        try:
+            with open(indexFile, 'r') as f:
+                index = json.load(f)
+            if index['version'] == indexVersion:
+                return index
+        except (ValueError, KeyError, TypeError):
+            pass
+    return {'version': indexVersion, 'backups': {}}
+
+def writeIndex(index):
+    tempFile = '%s.%i' % (indexFile, getpid())
+    with open(tempFile, 'w') as f:
+        json.dump(index, f, separators=(',',':'))
+    replace(tempFile, indexFile)
+
+def listedBackup(backup):
+    """returns (id, volume) of an entry of getBackupList, its id may already contain the volume"""
+    if isinstance(backup[0], (list, tuple)):
+        return tuple(backup[0][:2])
+    return (backup[0], backup[1])
+
+def backupKey(backupId, volume):
+    return json.dumps([backupId, volume]) #backup ids are not unique on systems with multiple archive volumes
+
+def getBackupInfo(backupId, volume):
+    """returns the backup metadata from the local index, only unknown backups are fetched from EXAoperation"""
+    global indexChanged
+    key = backupKey(backupId, volume)
+    usedKeys.add(key)
+    entry = index['backups'].get(key)
+    if entry is None or time.time() - entry['fetched'] > indexRefresh:
+        backupInfo = database.getBackupInfo((backupId, volume))
+        entry = {'info': dict((field, backupInfo[field]) for field in indexFields), 'fetched': time.time()}
+        if backupInfo['usable'] == True: #unusable backups may be still running, fetch them again next time
+            index['backups'][key] = entry
+            indexChanged = True
+    return entry['info']
+
+indexFile = '%s%scheck_backup_%s_%s.index' % (cacheDirectory, sep, databaseName, hostName)
+
 try:
     cluster = XmlRpcCall('/')
     storage = XmlRpcCall('/storage')
@@ -90,18 +137,30 @@ try:
     backupList = database.getBackupList()
     backups = []
     latestBackupInfo = None
+    index = readIndex()
+    indexChanged = False
+    usedKeys = set()
 
     #fill up backups list with latest backup data (if available)
     for backup in reversed(backupList):
-        backupInfo = database.getBackupInfo(backup[0]) #backup ids are not unique on systems with multiple archive volumes
+        backupInfo = getBackupInfo(*listedBackup(backup))
         if backupInfo['usable'] == True:
             latestBackupInfo = backupInfo
-            volume = backupInfo['volume'][0]
+            volume = listedBackup(backup)[1] #dependencies are on the same archive volume
             for backupId in latestBackupInfo['dependencies']:
-                backups.append(database.getBackupInfo((backupId, volume))) #together with volume id it's unique again
+                backups.append(getBackupInfo(backupId, volume))
             backups.append(backupInfo)
             break
 
+    #forget backups which are not listed anymore
+    listedKeys = usedKeys | set(backupKey(*listedBackup(backup)) for backup in backupList)
+    for key in list(index['backups'].keys()):
+        if key not in listedKeys:
+            del index['backups'][key]
+            indexChanged = True
+    if indexChanged:
+        writeIndex(index)
+
     if len(backups) == 0:
         print('CRITICAL - No usable backup available')
         exit(2)
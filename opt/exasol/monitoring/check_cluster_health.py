@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+from sys                import exit, argv
+from getopt             import getopt
+from checkentry         import traceOptions, traceHelp, startCheck
+
+pluginVersion           = "19.7"
+hostName                = None
+userName                = None
+password                = None
+maxParallelCalls        = 8
+nagiosHostName          = None #submit passive results for this Nagios host instead of printing them
+commandFile             = '/var/lib/nagios/rw/nagios.cmd'
+serviceDescriptions     = ['Service States', 'Node States']
+stateNames              = ['OK', 'WARNING', 'CRITICAL', 'UNKNOWN']
+statePrecedence         = [0, 2, 3, 1] #rank of each state: CRITICAL > WARNING > UNKNOWN > OK
+opts, args              = None, None
+
+try:
+    opts, args = getopt(argv[1:], 'hVH:u:p:n:r:e:s:' + traceOptions)
+
+except:
+    print("Unknown parameter(s): %s" % argv[1:])
+    opts = []
+    opts.append(['-h', None])
+
+for opt in opts:
+    parameter = opt[0]
+    value     = opt[1]
+
+    if parameter == '-h':
+        print("""
+EXAoperation XMLRPC cluster health monitor (version %s)
+  Checks the service states (check_services.py) and node states (check_nodes.py) of a cluster
+  with one burst of concurrent requests.
+
+  Options:
+    -h                      shows this help
+    -V                      shows the plugin version
+    -H <license server>     domain of IP of your license server
+    -u <user login>         EXAoperation login user
+    -p <password>           EXAoperation login password
+    -n <parallel calls>     (optional) maximum number of parallel requests (default: %i)
+    -r <nagios host name>   (optional) submit both results as passive checks of this host
+    -e <command file>       (optional) Nagios external command file (default: %s)
+    -s <services,nodes>     (optional) service descriptions of the passive checks (default: %s)
+%s
+""" % (pluginVersion, maxParallelCalls, commandFile, ','.join(serviceDescriptions), traceHelp))
+        exit(0)
+
+    elif parameter == '-V':
+        print("EXAoperation XMLRPC cluster health monitor (version %s)" % pluginVersion)
+        exit(0)
+
+    elif parameter == '-H':
+        hostName = value.strip()
+
+    elif parameter == '-u':
+        userName = value.strip()
+
+    elif parameter == '-p':
+        password = value.strip()
+
+    elif parameter == '-n':
+        validator = False
+        if value.strip().isdigit() and int(value) > 0:
+            maxParallelCalls = int(value)
+            validator = True
+        if not validator:
+            print('number of parallel calls must be a positive integer number')
+            exit(4)
+
+    elif parameter == '-r':
+        nagiosHostName = value.strip()
+
+    elif parameter == '-e':
+        commandFile = value.strip()
+
+    elif parameter == '-s':
+        serviceDescriptions = [description.strip() for description in value.split(',')]
+        if len(serviceDescriptions) != 2:
+            print('please define two service descriptions: <services>,<nodes>')
+            exit(4)
+
+if not (hostName and userName and password):
+    print('Please define at least the following parameters: -H -u -p')
+    exit(4)
+
+startCheck(opts)
+
+import asyncio, time
+from asyncxmlrpc        import AsyncXmlRpcClient
+from exaoperation       import releaseSessions
+from topology           import Topology
+from plugintrace        import inheritTrace
+
+def errorResult(e):
+    message = str(e).replace('%s:%s@%s' % (userName, password, hostName), hostName)
+    if 'unauthorized' in message.lower():
+        return 3, 'no access to EXAoperation: username or password wrong'
+    return 3, 'UNKNOWN - internal error %s | ' % message.replace('|', '!').replace('\n', ';')
+
+async def serviceResult(client):
+    """same result as check_services.py"""
+    try:
+        serviceState = await client.call('/', 'getServiceState')
+        criticalServiceOutput = ''.join('%s - %s; ' % (service[0], service[1]) for service in serviceState if service[1] != 'OK')
+        if criticalServiceOutput:
+            return 2, 'CRITICAL - some service are not OK: %s' % criticalServiceOutput
+        return 0, 'OK - all node services are OK'
+    except Exception as e:
+        return errorResult(e)
+
+def topologyNodes():
+    """node list of the topology snapshot, the same nodes check_nodes.py reports"""
+    try:
+        return Topology(userName, password, hostName, maxParallelCalls)['nodes']
+    finally:
+        releaseSessions()
+
+async def nodeResult(client):
+    """same result as check_nodes.py"""
+    try:
+        nodeList = await asyncio.get_event_loop().run_in_executor(None, inheritTrace(topologyNodes))
+        nodeStates = await client.batch('/', 'getNodeState', [(node,) for node in nodeList])
+        notRunningNodes = [(node, nodeInfo['status']) for node, nodeInfo in zip(nodeList, nodeStates) if nodeInfo['status'] != 'Running']
+        if len(notRunningNodes) > 0:
+            return 2, 'CRITICAL - %i nodes online, %i nodes in other state |%s' % (
+                len(nodeList) - len(notRunningNodes),
+                len(notRunningNodes),
+                ''.join('\n%s: %s' % notRunningNode for notRunningNode in notRunningNodes)
+            )
+        return 0, 'OK - %i nodes online' % len(nodeList)
+    except Exception as e:
+        return errorResult(e)
+
+async def probe():
+    client = AsyncXmlRpcClient(userName, password, hostName, maxParallelCalls)
+    try:
+        return await asyncio.gather(serviceResult(client), nodeResult(client))
+    finally:
+        client.close()
+
+started = time.time()
+loop = asyncio.new_event_loop()
+try:
+    results = loop.run_until_complete(probe())
+finally:
+    loop.close()
+finished = time.time()
+
+if nagiosHostName:
+    from nagioscommand import submitToCommandFile
+    try:
+        submitToCommandFile([(nagiosHostName, description, returnCode, output, started, finished)
+                for description, (returnCode, output) in zip(serviceDescriptions, results)], commandFile)
+    except Exception as e:
+        print('UNKNOWN - passive results could not be submitted: %s | ' % str(e).replace('|', '!'))
+        exit(3)
+    print('OK - %s: %s, %s: %s' % (serviceDescriptions[0], stateNames[results[0][0]], serviceDescriptions[1], stateNames[results[1][0]]))
+    exit(0)
+
+#one result with the summaries of both checks, their full output follows as long output
+def summary(output):
+    return output.split('\n')[0].split(' - ', 1)[-1].rstrip(' |')
+
+returnCode = max((returnCode for returnCode, output in results), key=lambda returnCode: statePrecedence[returnCode])
+print('%s - %s: %s, %s: %s |\n%s' % (
+    stateNames[returnCode],
+    serviceDescriptions[0], summary(results[0][1]),
+    serviceDescriptions[1], summary(results[1][1]),
+    '\n'.join(output.replace('|', '').rstrip() for returnCode, output in results)
+))
+exit(returnCode)
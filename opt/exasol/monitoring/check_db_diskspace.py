@@ -1,33 +1,27 @@
 #!/usr/bin/python3
-import ssl, json, time
-from os.path            import isfile, isdir, getctime
-from os                 import sep, remove
-from sys                import exit, argv, version_info, stdout, stderr
+from sys                import exit, argv
 from getopt             import getopt
-from urllib.parse       import quote_plus
-from xmlrpc.client      import ServerProxy
+from checkentry         import traceOptions, traceHelp, startCheck
 
 
 pluginVersion               = "18.12"
 tempUsageWarningTreshold    = 60.0 #percent
 tempUsageCriticalTreshold   = 80.0 #percent
-cacheDuration               = 3600 #seconds
+maxParallelCalls            = 8
 warningTreshold             = 80 #seconds
 criticalTreshold            = 90 #seconds
+forecastWarningTreshold     = None #hours until the database is full
+forecastCriticalTreshold    = None #hours until the database is full
+forecastWindow              = 24.0 #hours of usage history used for the forecast
+headroomPercentiles         = [10, 50, 90] #percentiles of the free space per node in the performance data
 databaseName                = None
 hostName                    = None
 userName                    = None
 password                    = None
 opts, args                  = None, None
-cacheDirectory              = None
-
-cacheDirectory          = r'/var/cache/nagios'
-if not isdir(cacheDirectory):
-    from tempfile import gettempdir
-    cacheDirectory = gettempdir()
 
 try:
-    opts, args = getopt(argv[1:], 'hVw:c:H:d:u:p:')
+    opts, args = getopt(argv[1:], 'hVw:c:H:d:u:p:n:W:C:t:' + traceOptions)
 
 except:
     print("Unknown parameter(s): %s" % argv[1:])
@@ -51,7 +45,12 @@ EXAoperation XMLRPC database disk usage monitor (version %s)
     -p <password>           EXAoperation login password
     -w <0..100>             warning treshold for disk image usage of you db instance (optional)
     -c <0..100>             critical treshold for disk usage of your db instance (optional)
-""" % (pluginVersion))
+    -n <parallel calls>     maximum number of parallel EXAoperation requests (optional, default: %i)
+    -W <hours>              warning if the usage trend fills the disk within this time (optional)
+    -C <hours>              critical if the usage trend fills the disk within this time (optional)
+    -t <hours>              usage history used for the trend (optional, default: %.0f)
+%s
+""" % (pluginVersion, maxParallelCalls, forecastWindow, traceHelp))
         exit(0)
     
     elif parameter == '-V':
@@ -92,20 +91,46 @@ EXAoperation XMLRPC database disk usage monitor (version %s)
             print('critical treshold must be an integer number between 0 and 100')
             exit(4)
 
+    elif parameter == '-n':
+        validator = False
+        if value.strip().isdigit() and int(value) > 0:
+            maxParallelCalls = int(value)
+            validator = True
+        if not validator:
+            print('number of parallel calls must be a positive integer number')
+            exit(4)
+
+    elif parameter in ['-W', '-C', '-t']:
+        try:
+            hours = float(value)
+        except ValueError:
+            hours = -1.0
+        if hours <= 0.0:
+            print('forecast tresholds and window must be positive numbers of hours')
+            exit(4)
+        if parameter == '-W':
+            forecastWarningTreshold = hours
+        elif parameter == '-C':
+            forecastCriticalTreshold = hours
+        else:
+            forecastWindow = hours
+
 if not (databaseName and hostName and userName and password):
     print('Please define at least the following parameters: -d -H -u -p')
     exit(4)
 
+startCheck(opts)
+
+from time               import time
+from urllib.parse       import quote_plus
+from exaoperation       import XmlRpcSession
+from topology           import Topology
+from usagehistory       import UsageHistoryFile, linearForecast
+from volumespace        import segmentNodes, freeSpace, smallest, percentiles
+
 def XmlRpcCall(urlPath = ''):
-    url = 'https://%s:%s@%s/cluster1%s' % (quote_plus(userName), quote_plus(password), hostName, urlPath)
-    sslcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-    sslcontext.verify_mode = ssl.CERT_NONE
-    sslcontext.check_hostname = False
-    return ServerProxy(url, context=sslcontext)
-
-cacheFile = '%s%scheck_db_size_%s_%s.cache' % (cacheDirectory, sep, databaseName, hostName)
-cluster = XmlRpcCall('/')
-storage = XmlRpcCall('/storage')
+    return XmlRpcSession(userName, password, hostName, urlPath)
+
 database = XmlRpcCall('/db_' + quote_plus(databaseName))
 
 try:
@@ -121,83 +146,70 @@ try:
         print('CRITICAL - database instance is not running.')
         exit(2)
 
+    #volumes, segment placement and partition sizes rarely change, they are taken from the topology
+    #snapshot of the cluster; it is built again if a volume was created or deleted since
+    clusterVolumes = sorted(XmlRpcCall('/storage').getVolumeList())
+    topology = Topology(userName, password, hostName, maxParallelCalls)
+    if topology['volume list'] != clusterVolumes or not (databaseVolume in topology['volumes'] and databaseTempVolume in topology['volumes']):
+        topology = Topology(userName, password, hostName, maxParallelCalls, refresh=True)
+    volumeInfos = topology['volumes']
+    volumeList = sorted(volumeInfos)
+
     #get volume and segment infos on the database instance
-    databaseSegments = []
-    databaseVolumeInfo = storage.getVolumeInfo(databaseVolume)
+    databaseVolumeInfo = volumeInfos[databaseVolume]
     storagePartition = databaseVolumeInfo['disk']
-
-    for redundancyLayer in range(0, databaseVolumeInfo['redundancy']):
-        databaseSegments += databaseVolumeInfo['segments'][redundancyLayer]
-
-    databaseTempVolumeInfo = storage.getVolumeInfo(databaseTempVolume) #redundancy of temporary volumes is always 1
-    databaseTempSegments = databaseTempVolumeInfo['segments'][0]
+    databaseSegments = segmentNodes(databaseVolumeInfo)
+    databaseTempSegments = segmentNodes(volumeInfos[databaseTempVolume], 1) #redundancy of temporary volumes is always 1
 
     #calculate database segment sizes
     databaseSegmentUsage =      (databaseUsage      / float(len(databaseSegments)))     * databaseVolumeInfo['redundancy']
     databaseTempSegmentUsage =  (databaseTempUsage  / float(len(databaseTempSegments)))
 
-    #get partitioning informations from all nodes and store the available sizes in a key table
-    #and use a simple caching system for this expensive function (more nodes => more calls!)
+    #available sizes of the storage partition on all nodes of the database volume
     storagePartitionSizes = {}
-    if isfile(cacheFile) and time.time() - getctime(cacheFile) < cacheDuration:
-        with open(cacheFile, 'r') as f:
-            storagePartitionSizes = json.load(f)
-    else:
-        for node in sorted(set(databaseSegments)):
-            nodeXmlRpc = XmlRpcCall('/' + node)
-            partitions = nodeXmlRpc.getDiskStates()
-            for partition in partitions:
-                if partition['name'] == storagePartition:
-                    size = float(partition['size'])
-                    storagePartitionSizes[node] = size
-        with open(cacheFile, 'w') as f:
-            json.dump(storagePartitionSizes, f,  separators=(',',':'))
-
-    #get informations about all volumes and subtract sizes from all nodes used by the database
-    for volume in storage.getVolumeList():
+    for node in set(databaseSegments):
+        partitions = topology['partitions'].get(node, {})
+        if storagePartition in partitions:
+            storagePartitionSizes[node] = partitions[storagePartition]
+
+    #segments of all volumes with their size: the other data volumes take their full size on every
+    #node, the database volumes their actual usage; all are subtracted in one pass per node
+    segments = [(databaseSegments, databaseSegmentUsage), (databaseTempSegments, databaseTempSegmentUsage)]
+    for volume in volumeList:
         if volume.startswith('v') and volume not in [databaseVolume, databaseTempVolume]:
-            volumeInfo = storage.getVolumeInfo(volume)
-            volumeSizePerNode = (volumeInfo['size'] / float(len(volumeInfo['segments'][0])))
-            
-            allSegments = []
-            for redundancyLayer in range(0, volumeInfo['redundancy']):
-                allSegments += volumeInfo['segments'][redundancyLayer]
-
-            for node in allSegments:
-                if node in storagePartitionSizes.keys():
-                    storagePartitionSizes[node] -= volumeSizePerNode
-
-        #subtract actual database segement size from partitions
-        elif volume == databaseVolume:
-            for node in databaseSegments:
-                storagePartitionSizes[node] -= databaseSegmentUsage
-
-        elif volume == databaseTempVolume:
-            for node in databaseTempSegments:
-                storagePartitionSizes[node] -= databaseTempSegmentUsage
-
-
-    minPartitionSize = None
-    minPartitionNode = ''
-    for node in storagePartitionSizes:
-        if not minPartitionSize or storagePartitionSizes[node] < minPartitionSize:
-            minPartitionSize = storagePartitionSizes[node]
-            minPartitionNode = node
+            volumeInfo = volumeInfos[volume]
+            segments.append((segmentNodes(volumeInfo), volumeInfo['size'] / float(len(volumeInfo['segments'][0]))))
+    nodes, nodeFreeSpace, nodeDatabaseSegments = freeSpace(storagePartitionSizes, segments)
 
+    minPartitionNode = smallest(nodeFreeSpace)
+    minPartitionSize = nodeFreeSpace[minPartitionNode]
+    nodeFreePercentiles = percentiles(nodeFreeSpace, headroomPercentiles)
 
-    usedSegmentSpace =  ((databaseSegmentUsage * databaseSegments.count(minPartitionNode)) + #valid redundancy even for streched storage
-                        databaseTempSegmentUsage)                                            #temp is always red=1
+    usedSegmentSpace =  ((databaseSegmentUsage * nodeDatabaseSegments[minPartitionNode]) + #valid redundancy even for streched storage
+                        databaseTempSegmentUsage)                                                               #temp is always red=1
 
     spaceUsage = 100.0 * usedSegmentSpace / (usedSegmentSpace + minPartitionSize) 
 
+    #local history of the free space, the linear trend over the window tells when the disk is full
+    now = time()
+    databaseFreeSpace = minPartitionSize * len(databaseNodes)
+    try:
+        history = UsageHistoryFile(hostName, databaseName).add(now, databaseFreeSpace)
+    except OSError: #no writable cache directory, no forecast
+        history = []
+    secondsToFull = linearForecast([sample for sample in history if sample[0] >= now - forecastWindow * 3600], 0.0)
+    hoursToFull = secondsToFull / 3600.0 if secondsToFull is not None else None
+
     output = 'Disk space usage of %s = %3.1f%%, Usage in GiB = %.1fGiB, Free space = %.1fGiB' % (
             databaseName, 
             spaceUsage, 
             usedSegmentSpace * len(databaseNodes), 
-            minPartitionSize * len(databaseNodes)
+            databaseFreeSpace
     )
+    if hoursToFull is not None:
+        output += ', Full in %.1fh' % hoursToFull
 
-    performaceData = "usage_percent=%.1f%%;%.1f;%.1f usage=%.1fGiB free=%.1fGiB temp=%.1fGiB temp_usage_ratio=%.1f%%;%.1f;%.1f" % (
+    performaceData = "usage_percent=%.1f%%;%.1f;%.1f usage=%.1fGiB free=%.1fGiB temp=%.1fGiB temp_usage_ratio=%.1f%%;%.1f;%.1f hours_to_full=%s;%s;%s" % (
             spaceUsage,
             warningTreshold,
             criticalTreshold,
@@ -206,15 +218,28 @@ try:
             databaseTempUsage,
             (float(databaseTempUsage + 0.1) / float(databaseUsage + 0.1)) * 100,
             tempUsageWarningTreshold,
-            tempUsageCriticalTreshold
+            tempUsageCriticalTreshold,
+            '%.1f' % hoursToFull if hoursToFull is not None else 'U',
+            '%.1f:' % forecastWarningTreshold if forecastWarningTreshold is not None else '',
+            '%.1f:' % forecastCriticalTreshold if forecastCriticalTreshold is not None else ''
     )
-
-    if (spaceUsage >= warningTreshold):
-        print('WARNING - %s|%s' % (output, performaceData))
-        exit(1)
-    elif (spaceUsage >= criticalTreshold):
+    #distribution of the free space per node, a low minimum with a high median means skewed volumes
+    performaceData += ' node_free_min=%.1fGiB' % minPartitionSize
+    for percent, nodeFree in zip(headroomPercentiles, nodeFreePercentiles):
+        performaceData += ' node_free_p%i=%.1fGiB' % (percent, nodeFree)
+
+    def reached(hoursTreshold):
+        #lower limit like the range "N:" of the performance data, alerts below N hours
+        return hoursTreshold is not None and hoursToFull is not None and hoursToFull < hoursTreshold
+
+    #critical is tested first: the plugin used to test the warning threshold first, so a usage
+    #above the critical threshold was reported as WARNING and the critical threshold was never reached
+    if (spaceUsage >= criticalTreshold) or reached(forecastCriticalTreshold):
         print('CRITICAL - %s|%s' % (output, performaceData))
         exit(2)
+    elif (spaceUsage >= warningTreshold) or reached(forecastWarningTreshold):
+        print('WARNING - %s|%s' % (output, performaceData))
+        exit(1)
     else:
         print('OK - %s|%s' % (output, performaceData))
     exit(0)
@@ -1,20 +1,10 @@
 #!/usr/bin/python3
-import ssl, json, time, re, importlib.util, signal
-#from signal             import signal, alarm, SIGALRM
-from os.path            import isfile, getctime, isdir, join
-from os                 import sep, getcwd
-from sys                import exit, path, argv, version_info, stdout, stderr
-from urllib.parse       import quote_plus
+import signal
+from os.path            import join
+from sys                import exit, argv
 from getopt             import getopt
-from xmlrpc.client      import ServerProxy
-from time               import time
-
-if not importlib.util.find_spec('ExasolDatabaseConnector'):
-    print('Python module "ExasolDatabaseConnector" not installed. Please install this module using pip:')
-    print('\tpython3 -m pip install ExasolDatabaseConnector')
-    exit(4)
-
-from ExasolDatabaseConnector import Database
+from checkentry         import traceOptions, traceHelp, startCheck
+from cachedirectory     import cacheDirectory
 
 pluginVersion           = '19.7'
 databaseName            = None
@@ -29,17 +19,18 @@ opts, args              = None, None
 pluginTimeout           = 60 #seconds
 maxInterval             = 300 #seconds (interval between checks)
 minInterval             = 90 #seconds
+lateRowGrace            = 60 #seconds before the watermark fetched again, rows can be written with an older MEASURE_TIME
+windowVersion           = 1
+monitorColumns          = ['LOAD', 'CPU', 'TEMP_DB_RAM', 'HDD_READ', 'HDD_WRITE', 'NET', 'SWAP']
+usageColumns            = ['USERS', 'QUERIES']
 transactionConflictWarnDuration = 3600 #seconds
+topBlockers             = 10 #blocking sessions in the long output
 trackSchemata           = False
 schemaWarnThreshold     = 0
-
-cacheDirectory          = r'/var/cache/nagios'
-if not isdir(cacheDirectory):
-    from tempfile import gettempdir
-    cacheDirectory = gettempdir()
+singleQuery             = False
 
 try:
-    opts, args = getopt(argv[1:], 'hVH:d:u:p:l:a:c:o:s:t:C:')
+    opts, args = getopt(argv[1:], 'hVH:d:u:p:l:a:c:o:s:t:C:bn:' + traceOptions)
 
 except:
     print("Unknown parameter(s): %s" % argv[1:])
@@ -64,12 +55,17 @@ EXAoperation XMLRPC backup run check (version %s)
     -a <dbuser passwd>      DB instance login password
     -s <threshold>          (optional) monitor schemata, treshold = max. usage in percent
     -c <timeout in sec>     (optional) time until a transaction conflict creates a warning
+    -n <sessions>           (optional) blocking sessions listed in the long output (default: %i)
     -t <timeout in sec>     (optional) plugin timeout (only capable on posix compliant machines)
+    -b                      (optional) fetch all statistics with one combined SQL statement
+%s
 
   Instead of using ExaOperation the database can be addressed using a connection string (no -u -d -p necessary then):
-    -C <connection string>  (alternative) connection string of the database to be monitored
+    -C <connection string>  (alternative) connection string of the database to be monitored, all nodes
+                            of it (e.g. 10.0.0.11..74:8563) are probed at once and the first one
+                            answering is used, the next run tries it first
 
-""" % (pluginVersion))
+""" % (pluginVersion, topBlockers, traceHelp))
         exit(0)
     
     elif parameter == '-V':
@@ -97,6 +93,12 @@ EXAoperation XMLRPC backup run check (version %s)
     elif parameter == '-c':
         transactionConflictWarnDuration = int(value.strip())
 
+    elif parameter == '-n':
+        if not (value.strip().isdigit() and int(value) > 0):
+            print('number of blocking sessions must be a positive integer number')
+            exit(4)
+        topBlockers = int(value.strip())
+
     elif parameter == '-s':
         schemaWarnThreshold = int(value.strip())
         trackSchemata = True
@@ -104,7 +106,11 @@ EXAoperation XMLRPC backup run check (version %s)
     elif parameter == '-t':
         pluginTimeout = int(value.strip())
 
+    elif parameter == '-b':
+        singleQuery = True
+
     elif parameter == '-C':
+        import re
         if re.match('^\s*([0-9.,:]+\:\d+)\s*$', value):
             connectionString = value.strip()
         else:
@@ -124,6 +130,24 @@ if connectionString and (userName or password or databaseName):
     print('The -C option cannot be combined together with -H -u -d -p')
     exit(4)
 
+import importlib.util
+if not importlib.util.find_spec('ExasolDatabaseConnector'):
+    print('Python module "ExasolDatabaseConnector" not installed. Please install this module using pip:')
+    print('\tpython3 -m pip install ExasolDatabaseConnector')
+    exit(4)
+
+startCheck(opts)
+
+import json
+from datetime           import datetime
+from os                 import replace, remove
+from tempfile           import mkstemp
+from time               import time
+from urllib.parse       import quote_plus
+from exaoperation       import XmlRpcSession, XmlRpcCached, invalidateCached
+from exadatabase        import DatabaseSession, releaseDatabaseSession
+from blockergraph       import blockerGraph
+
 def pluginTimedOut(sig, frame):
     print('CRITICAL - Database did not respond within %i seconds' % (pluginTimeout))
     exit(2)
@@ -134,49 +158,184 @@ if importlib.util.find_spec('signal') and hasattr(signal, "alarm"):
 	signal.alarm(pluginTimeout)
 
 def XmlRpcCall(urlPath = ''):
-    url = 'https://%s:%s@%s/cluster1%s' % (quote_plus(userName), quote_plus(password), hostName, urlPath)
-    sslcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-    sslcontext.verify_mode = ssl.CERT_NONE
-    sslcontext.check_hostname = False
-    return ServerProxy(url, context=sslcontext)
+    return XmlRpcSession(userName, password, hostName, urlPath)
+
+def loadWindows(fileName):
+    """returns the watermarks and recent rows of the statistics tables stored by the previous run"""
+    try:
+        with open(fileName, 'r') as f:
+            windows = json.load(f)
+        if windows.get('version') == windowVersion:
+            return windows
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'version': windowVersion}
+
+def saveWindows(fileName, windows):
+    """replaces the window file atomically, parallel runs never see a partially written file"""
+    fd, tempFile = mkstemp(dir = cacheDirectory, prefix = 'check_db_perf_')
+    try:
+        with open(fd, 'w') as f:
+            json.dump(windows, f, separators=(',',':'))
+        replace(tempFile, fileName)
+    except Exception:
+        remove(tempFile)
+        raise
+
+def measureTime(row):
+    return datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S.%f')
+
+def deltaSqlCommand(tableName, columns, window):
+    """selects the rows newer than the watermark of the window minus lateRowGrace (the statistics
+    are written with the MEASURE_TIME of the interval they describe, a row can become visible after
+    a newer one), at most maxInterval seconds; updateWindow drops the rows fetched before"""
+    lowerBound = 'ADD_SECONDS(NOW(), -%i)' % maxInterval
+    if window.get('watermark'):
+        #the watermark is formatted again, only a valid timestamp gets into the statement
+        watermark = measureTime([window['watermark']]).strftime('%Y-%m-%d %H:%M:%S.%f')[:23]
+        lowerBound = "GREATEST(ADD_SECONDS(TO_TIMESTAMP('%s', 'YYYY-MM-DD HH24:MI:SS.FF3'), -%i), %s)" % (watermark, lateRowGrace, lowerBound)
+    return """select  TO_CHAR(MEASURE_TIME, 'YYYY-MM-DD HH24:MI:SS.FF3') MEASURE_TIME, %s
+                    from EXA_STATISTICS.%s
+                    where MEASURE_TIME > %s and MEASURE_TIME <= NOW()
+                    """ % (', '.join(columns), tableName, lowerBound)
+
+def updateWindow(window, rows):
+    """adds the new rows to the sliding window of a statistics table, returns the medians of the rows
+    since the previous run, but of at least minInterval and at most maxInterval seconds"""
+    knownRows = set(row[0] for row in window.get('rows', [])) #MEASURE_TIME is the key of the statistics tables
+    rows = [[row[0]] + [float(value) if value is not None else None for value in row[1:]] for row in rows if row[0] not in knownRows]
+    if len(rows) > 0:
+        window['fetched'] = time()
+    elif time() - window.get('fetched', 0) > maxInterval: #no new statistics, the old rows are outdated
+        window['rows'] = []
+    rows = sorted(window.get('rows', []) + rows, key=lambda row: row[0])
+    if len(rows) == 0:
+        return None
+
+    newest = measureTime(rows[-1])
+    span = maxInterval
+    if window.get('watermark'):
+        span = min(max((newest - measureTime([window['watermark']])).total_seconds(), minInterval), maxInterval)
+    window['rows'] = [row for row in rows if (newest - measureTime(row)).total_seconds() < maxInterval]
+    window['watermark'] = rows[-1][0]
+    recentRows = [row for row in rows if (newest - measureTime(row)).total_seconds() < span]
+    return [median([row[i] for row in recentRows]) for i in range(1, len(rows[0]))]
+
+def median(values):
+    values = sorted(value for value in values if value is not None)
+    if len(values) == 0:
+        return None
+    return values[len(values) // 2] if len(values) % 2 else (values[len(values) // 2 - 1] + values[len(values) // 2]) / 2.0
 
 try:
     returnCode = 0
     longDescription = '\n'
-    interval = maxInterval
-    intervalFileName = join(cacheDirectory, 'check_db_perf_%s_%s.interval' % (hostName, databaseName))
-    if isfile(intervalFileName):
-        with open(intervalFileName, 'r+') as f:
-            intervalNew = int(time() - float(f.read()))
-            interval = intervalNew if intervalNew <= interval else interval #limit max interval duration to inital value
-            interval = interval if interval >= minInterval else minInterval #prevent empty results if there is no entry
-            f.seek(0, 0)
-            f.truncate()
-            f.write(str(time()))
+    #only the statistics rows since the previous run are fetched, the medians are calculated here
+    windowFileName = join(cacheDirectory, 'check_db_perf_%s_%s.window' % (
+            quote_plus(hostName or connectionString), quote_plus(databaseName or '')))
+    windows = loadWindows(windowFileName)
+    monitorWindow = windows.setdefault('monitor', {})
+    usageWindow = windows.setdefault('usage', {})
+
+    #the connection string is cached, the database state is only checked if the database is not reachable with it
+    db = None
+    if not connectionString:
+        databasePath = '/db_' + quote_plus(databaseName)
+        connectionString = XmlRpcCached(userName, password, hostName, databasePath, 'getDatabaseConnectionString')
+        try:
+            db = DatabaseSession(connectionString, databaseUser, databasePassword)
+        except Exception:
+            invalidateCached(userName, hostName, databasePath, 'getDatabaseConnectionString')
+            if not XmlRpcCall(databasePath).getDatabaseState() == 'running':
+                print('CRITICAL - database instance is not running.')
+                exit(2)
+            connectionString = XmlRpcCached(userName, password, hostName, databasePath, 'getDatabaseConnectionString')
+
+    if db is None:
+        db = DatabaseSession(connectionString, databaseUser, databasePassword)
+
+    monitorSqlCommand = deltaSqlCommand('EXA_MONITOR_LAST_DAY', monitorColumns, monitorWindow)
+    usageSqlCommand = deltaSqlCommand('EXA_USAGE_LAST_DAY', usageColumns, usageWindow)
+
+    #the conflicts are aggregated by the database: one row per blocking session (the root blockers
+    #first, then the ones with most waiting sessions) with the session it is waiting for itself and
+    #the totals of all conflicts
+    waitingSqlCommand = """select SESSION_ID,
+                                cast(regexp_substr(ACTIVITY, '\\d+(?=\\s*$)') as DECIMAL(20,0)) as BLOCKER,
+                                cast(regexp_substr(DURATION, '\\d+(?=:\\d+:\\d+\\s*$)') as DECIMAL(18,0)) * 3600 +
+                                cast(regexp_substr(DURATION, '\\d+(?=:\\d+\\s*$)') as DECIMAL(18,0)) * 60 +
+                                cast(regexp_substr(DURATION, '\\d+(?=\\s*$)') as DECIMAL(18,0)) as WAITED
+                        from EXA_DBA_SESSIONS where substr(ACTIVITY, 0, 19) = 'Waiting for session'"""
+    conflictSqlCommand = """select G.BLOCKER, G.WAITING, G.MAX_WAITED, B.BLOCKER as BLOCKED_BY,
+                                sum(G.WAITING) over () as CONFLICTS, max(G.MAX_WAITED) over () as MAX_DURATION, count(*) over () as BLOCKERS
+                        from (select BLOCKER, count(*) as WAITING, max(WAITED) as MAX_WAITED from (%s) group by BLOCKER) G
+                        left outer join (%s) B on B.SESSION_ID = G.BLOCKER
+                        order by case when B.BLOCKER is null then 0 else 1 end, G.WAITING desc, G.MAX_WAITED desc
+                        limit %i""" % (waitingSqlCommand, waitingSqlCommand, topBlockers)
+
+    #tracking of schema size will only work in Exasol 6.0 and newer
+    volumeSqlCommand = """select 	(min(HDD_FREE) + sum(VOLUME_SIZE * REDUNDANCY * (100 - "USAGE") / 100.0)) / max(REDUNDANCY) as AVAIL_SPACE,
+		                sum(VOLUME_SIZE * REDUNDANCY * "USAGE"/100.0) / max(REDUNDANCY) as USED_SPACE
+                        from (
+                                select 
+                                        sum(HDD_FREE)       as HDD_FREE, 
+                                        sum(VOLUME_SIZE)    as VOLUME_SIZE, 
+                                        max(USE)            as "USAGE",
+                                        REDUNDANCY,
+                                        TABLESPACE, 
+                                        VOLUME_ID
+                                from SYS.EXA_VOLUME_USAGE
+                                group by VOLUME_ID, TABLESPACE, REDUNDANCY
+                        ) """ #it's a quite complex logic, see SOL-366 for details
+
+    schemaSqlCommand = """select OBJECT_NAME, (MEM_OBJECT_SIZE/1024.0/1024.0/1024.0) AS USAGE_GIB 
+			from SYS.EXA_DBA_OBJECT_SIZES
+                        where OBJECT_TYPE = 'SCHEMA'
+                        order by MEM_OBJECT_SIZE desc
+                        limit 1"""
+
+    if singleQuery:
+        #all statistics in one statement: one row per kind, the columns of the other kinds are NULL
+        #(kind, MEASURE_TIME, monitor columns, usage columns, [volume and schema columns,] conflict columns)
+        emptyMonitor = ['cast(NULL as DOUBLE)'] * len(monitorColumns)
+        emptyUsage = ['cast(NULL as DOUBLE)'] * len(usageColumns)
+        emptySchema = ['cast(NULL as DOUBLE)'] * 2 + ['cast(NULL as VARCHAR(128))', 'cast(NULL as DOUBLE)'] if trackSchemata else []
+        emptyConflict = ['cast(NULL as DECIMAL(20,0))', 'cast(NULL as DECIMAL(18,0))', 'cast(NULL as DECIMAL(18,0))', 'cast(NULL as DECIMAL(20,0))',
+                'cast(NULL as DECIMAL(18,0))', 'cast(NULL as DECIMAL(18,0))', 'cast(NULL as DECIMAL(18,0))']
+        emptyTime = ['cast(NULL as VARCHAR(23))']
+        #the tags are VARCHAR, CHAR literals of different lengths would be padded to the longest one
+        selects = [
+            "select cast('MONITOR' as VARCHAR(8)), %s from (%s) M" % (', '.join(['M.MEASURE_TIME'] + ['M.' + column for column in monitorColumns] + emptyUsage + emptySchema + emptyConflict), monitorSqlCommand),
+            "select cast('USAGE' as VARCHAR(8)), %s from (%s) U" % (', '.join(['U.MEASURE_TIME'] + emptyMonitor + ['U.' + column for column in usageColumns] + emptySchema + emptyConflict), usageSqlCommand),
+            "select cast('CONFLICT' as VARCHAR(8)), %s from (%s) C" % (', '.join(emptyTime + emptyMonitor + emptyUsage + emptySchema + ['C.*']), conflictSqlCommand)
+        ]
+        if trackSchemata:
+            selects.append("select cast('SCHEMA' as VARCHAR(8)), %s from (%s) V left outer join (%s) O on 1 = 1" % (
+                    ', '.join(emptyTime + emptyMonitor + emptyUsage + ['V.*', 'O.*'] + emptyConflict), volumeSqlCommand, schemaSqlCommand))
+        rows = db.execute('\n union all\n'.join(selects) + ';')
+        usageStart = 2 + len(monitorColumns)
+        schemaStart = usageStart + len(usageColumns)
+        monitorRows = [row[1:usageStart] for row in rows if row[0] == 'MONITOR']
+        usageRows = [row[1:2] + row[usageStart:schemaStart] for row in rows if row[0] == 'USAGE']
+        conflictResult = [row[-7:] for row in rows if row[0] == 'CONFLICT']
+        if trackSchemata:
+            schemaRow = [row for row in rows if row[0] == 'SCHEMA'][0]
+            volumeResult = schemaRow[schemaStart:schemaStart + 2]
+            schemaResult = schemaRow[schemaStart + 2:schemaStart + 4]
     else:
-        with open(intervalFileName, 'w') as f:
-            f.write(str(time()))
+        monitorRows = db.execute(monitorSqlCommand + ';')
+        usageRows = db.execute(usageSqlCommand + ';')
+        conflictResult = db.execute(conflictSqlCommand + ';')
+        if trackSchemata:
+            volumeResult = db.execute(volumeSqlCommand + '; ')[0]
+            schemaResult = db.execute(schemaSqlCommand + ';')[0]
+
+    monitorResult = updateWindow(monitorWindow, [list(row) for row in monitorRows]) or [None]
+    usageResult = updateWindow(usageWindow, [list(row) for row in usageRows]) or [None]
+    saveWindows(windowFileName, windows)
 
-    if not connectionString:
-        database = XmlRpcCall('/db_' + quote_plus(databaseName))
-        if not database.getDatabaseState() == 'running':
-            print('CRITICAL - database instance is not running.')
-            exit(2)
-        connectionString = database.getDatabaseConnectionString()
-    
-    db = Database(connectionString, databaseUser, databasePassword, autocommit = True)
-    sqlCommand = """select  MEDIAN(LOAD) LOAD, 
-                            MEDIAN(CPU) CPU, 
-                            MEDIAN(TEMP_DB_RAM) TEMP_DB_RAM, 
-                            MEDIAN(HDD_READ) HDD_READ, 
-                            MEDIAN(HDD_WRITE) HDD_WRITE,
-                            MEDIAN(NET) NET, 
-                            MEDIAN(SWAP) SWAP
-                    from EXA_STATISTICS.EXA_MONITOR_LAST_DAY
-                    where MEASURE_TIME between ADD_SECONDS(NOW(), -%i) and NOW();
-                    """ % (interval)
-    result = db.execute(sqlCommand)[0] #fetch a single line
     output = ''
+    result = monitorResult
     if not None in result:
         output += 'load=%.1f;cpu=%.1f%%;tmp_dbram=%.1fGiB;hdd_read=%.1fMBps;hdd_write=%.1fMBps;net=%.1fMBps;swap=%.1fMBps;' % (
 	    float(result[0]),                   #LOAD
@@ -188,65 +347,31 @@ try:
 	    float(result[6])                    #SWAP
 	)
 
-    sqlCommand = """select  MEDIAN(USERS) USERS,
-                            MEDIAN(QUERIES) QUERIES
-                    from EXA_STATISTICS.EXA_USAGE_LAST_DAY
-                    where MEASURE_TIME between ADD_SECONDS(NOW(), -%s) and NOW();
-                """ % (interval)
-    result = db.execute(sqlCommand)[0]
+    result = usageResult
     if not None in result:
         output += 'users=%i;queries=%i;' % (
                 int(result[0]),			#USERS
                 int(result[1])			#QUERIES
         )
 
-    sqlCommand = "select SESSION_ID, ACTIVITY, DURATION from EXA_DBA_SESSIONS where substr(ACTIVITY, 0, 19) = 'Waiting for session';"
-    result = db.execute(sqlCommand)
-    conflictedSessionPattern = re.compile('session\s+(\d+)\s*$')
-    durationPattern = re.compile('\s*(\d+):(\d+):(\d+)\s*$')
     numberOfConflicts = 0
     maxDuration = 0
     transactionConflictWarning = False
-    if result != None and not None in result:
-        numberOfConflicts = len(result)
-        for row in result:
-            sessionId = str(row[0])
-            conflictedSessionId = None
-            conflictedSessionIdMatch = conflictedSessionPattern.search(row[1])
-            if conflictedSessionIdMatch:
-                conflictedSessionId = conflictedSessionIdMatch.group(1)
-            duration = None
-            durationMatch = durationPattern.search(row[2])
-            if durationMatch:
-                duration = int(durationMatch.group(3)) + (int(durationMatch.group(2)) * 60) + (int(durationMatch.group(1)) * 3600)
-            if maxDuration < duration: maxDuration = duration
-            longDescription += 'transaction conflict between %s and %s - duration: %s seconds\n' % (sessionId, conflictedSessionId, duration)
-
-        output += 'number_of_tacs=%i;duration_tac_max=%is;' % (
-                numberOfConflicts,
-                maxDuration
-        )
-        transactionConflictWarning = maxDuration > transactionConflictWarnDuration
-    else:
-        output += 'number_of_tacs=0;duration_tac_max=0s;'
+    if conflictResult:
+        numberOfConflicts = int(conflictResult[0][4])
+        maxDuration = int(conflictResult[0][5] or 0)
+        longDescription += blockerGraph(conflictResult)
+    output += 'number_of_tacs=%i;duration_tac_max=%is;blocking_sessions=%i;' % (
+            numberOfConflicts,
+            maxDuration,
+            int(conflictResult[0][6]) if conflictResult else 0
+    )
+    transactionConflictWarning = maxDuration > transactionConflictWarnDuration
 
     #if tracking of schema size is activated, this will only work in Exasol 6.0 and newer
     schemaUsageWarning = None
     if trackSchemata:
-        sqlCommand = """select 	(min(HDD_FREE) + sum(VOLUME_SIZE * REDUNDANCY * (100 - "USAGE") / 100.0)) / max(REDUNDANCY) as AVAIL_SPACE,
-		                sum(VOLUME_SIZE * REDUNDANCY * "USAGE"/100.0) / max(REDUNDANCY) as USED_SPACE
-                        from (
-                                select 
-                                        sum(HDD_FREE)       as HDD_FREE, 
-                                        sum(VOLUME_SIZE)    as VOLUME_SIZE, 
-                                        max(USE)            as "USAGE",
-                                        REDUNDANCY,
-                                        TABLESPACE, 
-                                        VOLUME_ID
-                                from SYS.EXA_VOLUME_USAGE
-                                group by VOLUME_ID, TABLESPACE, REDUNDANCY
-                        ); """ #it's a quite complex logic, see SOL-366 for details
-        result = db.execute(sqlCommand)[0]
+        result = volumeResult
         availSpace = None
         usedSpace = None
         usagePercent = 0
@@ -255,12 +380,7 @@ try:
         if not None in result:
             availSpace = float(result[0] ) # AVAIL_SPACE / get the available space (it's calculated in the same redundancy as the DB instance
             usedSpace = float(result[1]) # USED_SPACE
-        sqlCommand = """select OBJECT_NAME, (MEM_OBJECT_SIZE/1024.0/1024.0/1024.0) AS USAGE_GIB 
-			from SYS.EXA_DBA_OBJECT_SIZES
-                        where OBJECT_TYPE = 'SCHEMA'
-                        order by MEM_OBJECT_SIZE desc
-                        limit 1;"""
-        result = db.execute(sqlCommand)[0]
+        result = schemaResult
         if not None in result:
             usageGiB = float(result[1]) #USAGE_GIB
             usagePercent = 100.0 * usageGiB / (availSpace + usedSpace)
@@ -284,7 +404,7 @@ try:
     if returnCode == 0:
         output = 'OK - performance data transferred' + output
 
-    db.close()
+    releaseDatabaseSession(db, connectionString, databaseUser, databasePassword)
     print(output)
     exit(returnCode)
 
@@ -1,12 +1,10 @@
 #!/usr/bin/python3
-import ssl, json
-from os.path            import isfile, isdir
-from os                 import sep, name
-from sys                import exit, argv, version_info, stdout, stderr
+from os.path            import isfile
+from os                 import sep
+from sys                import exit, argv
 from getopt             import getopt
-from xmlrpc.client      import ServerProxy
-from urllib.parse       import quote_plus
-from uuid               import uuid4
+from checkentry         import traceOptions, traceHelp, startCheck
+from cachedirectory     import cacheDirectory
 
 pluginVersion           = "18.12"
 hostName                = None
@@ -14,18 +12,15 @@ userName                = None
 password                = None
 logserviceId            = None
 opts, args              = None, None
-cacheDirectory          = None
 uuidFile                = None
 uuidString              = None
 blacklistFile           = '/opt/exasol/monitoring/check_logservice.blacklist'
-
-cacheDirectory          = r'/var/cache/nagios'
-if not isdir(cacheDirectory):
-    from tempfile import gettempdir
-    cacheDirectory = gettempdir()
+maxMessages             = 100
+pageSize                = None #catch-up mode: entries processed per run, the rest is kept for the next runs
+compactionSize          = 1048576 #bytes of processed entries after which the backlog file is rewritten
 
 try:
-    opts, args = getopt(argv[1:], 'hVH:i:u:p:b:')
+    opts, args = getopt(argv[1:], 'hVH:i:u:p:b:m:P:' + traceOptions)
 
 except:
     print("Unknown parameter(s): %s" % argv[1:])
@@ -46,8 +41,12 @@ EXAoperation XMLRPC log service monitor (version %s)
     -i <logservice id>      interger id of the used logservice
     -u <user login>         EXAoperation login user
     -p <password>           EXAoperation login password
-    -b <blacklist file>     Blacklist all unwanted logservice lines
-""" % (pluginVersion))
+    -b <blacklist file>     Blacklist all unwanted logservice lines (lines starting with "regex:" are regular expressions)
+    -m <max messages>       (optional) maximum number of messages in the output (default: %i)
+    -P <entries per run>    (optional) catch-up mode: a large backlog of messages is processed in pages
+                            of this size over the next runs instead of all at once
+%s
+""" % (pluginVersion, maxMessages, traceHelp))
         exit(0)
     
     elif parameter == '-V':
@@ -69,47 +68,217 @@ EXAoperation XMLRPC log service monitor (version %s)
     elif parameter == '-b':
         blacklistFile = value.strip()
 
+    elif parameter == '-m':
+        if not (value.strip().isdigit() and int(value) > 0):
+            print('number of messages must be a positive integer number')
+            exit(4)
+        maxMessages = int(value)
+
+    elif parameter == '-P':
+        if not (value.strip().isdigit() and int(value) > 0):
+            print('number of entries per run must be a positive integer number')
+            exit(4)
+        pageSize = int(value)
+
 if not (hostName and userName and password and logserviceId != None):
     print('Please define at least the following parameters: -H -u -p -i')
     exit(4)
 
+startCheck(opts)
+
+import json
+from exaoperation       import XmlRpcSession, XmlRpcStream
+from logblacklist       import Blacklist
+
 def XmlRpcCall(urlPath = ''):
-    url = 'https://%s:%s@%s/cluster1%s' % (quote_plus(userName), quote_plus(password), hostName, urlPath)
-    sslcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-    sslcontext.verify_mode = ssl.CERT_NONE
-    sslcontext.check_hostname = False
-    return ServerProxy(url, context=sslcontext)
+    return XmlRpcSession(userName, password, hostName, urlPath)
+
+priorityStates          = {'Warning': 1, 'Error': 2} #bits of logPriority
+
+def emptyCheckpoint():
+    return {'offset': 0, 'size': 0, 'pending': {'Warning': 0, 'Error': 0}, 'state': 0}
+
+def loadCheckpoint(fileName):
+    """returns the position in the backlog file, the number of entries per priority behind it, the
+    size of the backlog file it belongs to and the state of all entries since the backlog was started"""
+    try:
+        with open(fileName, 'r') as f:
+            checkpoint = json.load(f)
+        if isinstance(checkpoint.get('offset'), int) and isinstance(checkpoint.get('pending'), dict):
+            return checkpoint
+    except (OSError, ValueError, AttributeError):
+        pass
+    return emptyCheckpoint()
+
+def saveCheckpoint(fileName, checkpoint):
+    from os import replace
+    with open(fileName + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    replace(fileName + '.tmp', fileName)
+
+def countBacklog(fileName, offset):
+    """returns the entries per priority behind offset and the size of the backlog file; a line
+    written partly by an interrupted run is cut off"""
+    pending = {'Warning': 0, 'Error': 0}
+    with open(fileName, 'rb+') as f:
+        f.seek(offset)
+        size = offset
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            priority = json.loads(line.decode('utf-8'))[0]
+            pending[priority] = pending.get(priority, 0) + 1
+            size += len(line)
+        f.truncate(size)
+    return pending, size
+
+def compactBacklog(backlogFile, checkpointFile, checkpoint):
+    """rewrites the backlog file without the processed entries; the checkpoint is saved before
+    the file is replaced, an interruption in between repeats entries instead of losing them"""
+    from os import replace
+    from shutil import copyfileobj
+    with open(backlogFile, 'rb') as f, open(backlogFile + '.tmp', 'wb') as compacted:
+        f.seek(checkpoint['offset'])
+        copyfileobj(f, compacted)
+    checkpoint['size'] -= checkpoint['offset']
+    checkpoint['offset'] = 0
+    saveCheckpoint(checkpointFile, checkpoint)
+    replace(backlogFile + '.tmp', backlogFile)
+
+class Backlog(object):
+    """catch-up mode: the new entries are appended to the backlog file (one JSON line per entry)
+    while the answer of the logservice is received and one page of it is reported per run; the
+    checkpoint (offset, pending entries per priority, state) is kept next to the uuid file, so
+    memory and output of a run don't grow with the backlog"""
+    def __init__(self, backlogFile, checkpointFile):
+        from os.path import getsize
+        self.backlogFile = backlogFile
+        self.checkpointFile = checkpointFile
+        self.checkpoint = emptyCheckpoint()
+        self.page = [] #new entries, kept in memory as long as there is no backlog file
+        self.file = None
+        if isfile(backlogFile):
+            self.checkpoint = loadCheckpoint(checkpointFile)
+            if self.checkpoint.get('size') != getsize(backlogFile):
+                #missing, corrupt or not saved after the last append: the counts are taken from the file
+                if self.checkpoint['offset'] > getsize(backlogFile):
+                    self.checkpoint['offset'] = 0
+                self.checkpoint['pending'], self.checkpoint['size'] = countBacklog(backlogFile, self.checkpoint['offset'])
+                self.checkpoint['state'] = 0
+            state = self.checkpoint.get('state', 0)
+            for priority, entries in self.checkpoint['pending'].items():
+                if entries > 0:
+                    state |= priorityStates.get(priority, 0)
+            self.checkpoint['state'] = state
+            self.file = open(backlogFile, 'a', encoding='utf-8')
+
+    def append(self, priority, message):
+        self.checkpoint['state'] |= priorityStates[priority]
+        if self.file is None and len(self.page) < pageSize:
+            self.page.append((priority, message))
+            return
+        if self.file is None: #more new entries than one page
+            self.file = open(self.backlogFile, 'a', encoding='utf-8')
+            for pagePriority, pageMessage in self.page:
+                self.write(pagePriority, pageMessage)
+            self.page = []
+        self.write(priority, message)
+
+    def write(self, priority, message):
+        self.file.write(json.dumps([priority, message]) + '\n')
+        self.checkpoint['pending'][priority] = self.checkpoint['pending'].get(priority, 0) + 1
+
+    def nextPage(self):
+        """returns the next page of entries and the state of all entries reported since the backlog
+        was started (the worst state stays until the backlog is worked off)"""
+        from os import remove
+        checkpoint = self.checkpoint
+        if self.file is None:
+            return self.page, checkpoint['state'] #no backlog, nothing is written
+        with self.file:
+            checkpoint['size'] = self.file.tell()
+        self.file = None
+
+        page = []
+        with open(self.backlogFile, 'rb') as f:
+            f.seek(checkpoint['offset'])
+            while len(page) < pageSize:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break
+                priority, message = json.loads(line.decode('utf-8'))
+                page.append((priority, message))
+                checkpoint['pending'][priority] -= 1
+            checkpoint['offset'] = f.tell()
+            atEnd = f.read(1) == b''
+
+        if atEnd:
+            remove(self.backlogFile)
+            self.checkpoint = emptyCheckpoint()
+        elif checkpoint['offset'] >= compactionSize:
+            compactBacklog(self.backlogFile, self.checkpointFile, checkpoint)
+        else:
+            saveCheckpoint(self.checkpointFile, checkpoint)
+        return page, checkpoint['state']
+
+    def pending(self):
+        return self.checkpoint['pending']
 
 try:
-    blacklistArray = []
-    if isfile(blacklistFile):
-        with open(blacklistFile) as f:
-            line = f.readline().strip()
-            while (line):
-                blacklistArray.append(line)
-                line = f.readline().strip()
+    blacklist = Blacklist(blacklistFile)
 
     uuidFile = '%s%scheck_logservice_%s_%s.uuid' % (cacheDirectory, sep, logserviceId, hostName) 
     if isfile(uuidFile):
         with open(uuidFile) as f:
             uuidString = f.read().strip()
     else:
+        from uuid import uuid4
         with open(uuidFile, 'w') as f:
             uuidString = uuid4().hex
             f.write(uuidString)
 
-    cluster = XmlRpcCall('/')
-    logservice = XmlRpcCall('/logservice%i' % logserviceId)
     logserviceUserId = 'check_logservice_%s_%s_%s_%i' % (uuidString, hostName, userName, logserviceId)
-    logEntries = logservice.logEntriesTagged(logserviceUserId)
-    logMessages = ''
+    backlog = None
+    if pageSize:
+        statePrefix = '%s%scheck_logservice_%s_%s' % (cacheDirectory, sep, logserviceId, hostName)
+        backlog = Backlog(statePrefix + '.backlog', statePrefix + '.checkpoint')
+
+    logMessages = []
     logPriority = 0
-    for logEntry in logEntries[2]:
-        logEntryPriority = logEntry['priority']
-        if logEntryPriority in ['Warning','Error'] and not any(item in logEntry['message'] for item in blacklistArray):
-            logMessages += '\n%s' % logEntry['message'].replace('|', '!')
-            if logEntryPriority == 'Warning': logPriority |= 1
-            elif logEntryPriority == 'Error': logPriority |= 2
+    logCounts = {'Warning': 0, 'Error': 0}
+
+    def addEntry(priority, message):
+        logCounts[priority] += 1
+        if len(logMessages) < maxMessages:
+            logMessages.append(message.replace('|', '!'))
+
+    def receiveEntry(logEntry):
+        """called for every entry while the answer is received, the entries are never all in memory"""
+        if logEntry['priority'] in priorityStates and not (blacklist and blacklist.search(logEntry['message'])):
+            if backlog:
+                backlog.append(logEntry['priority'], logEntry['message'])
+            else:
+                addEntry(logEntry['priority'], logEntry['message'])
+
+    XmlRpcStream(userName, password, hostName, '/logservice%i' % logserviceId, 'logEntriesTagged', (logserviceUserId,), receiveEntry)
+    pending = None
+    if not backlog:
+        for priority, state in priorityStates.items():
+            if logCounts[priority] > 0:
+                logPriority |= state
+    else:
+        page, logPriority = backlog.nextPage()
+        for logEntryPriority, logEntryMessage in page:
+            addEntry(logEntryPriority, logEntryMessage)
+        pending = backlog.pending()
+
+    skippedMessages = logCounts['Warning'] + logCounts['Error'] - len(logMessages)
+    logMessages = ''.join('\n%s' % message for message in logMessages)
+    if skippedMessages > 0:
+        logMessages += '\n... %i more messages (%i errors, %i warnings in total)' % (skippedMessages, logCounts['Error'], logCounts['Warning'])
+    if pending and sum(pending.values()) > 0:
+        logMessages += '\n... %i messages (%i errors, %i warnings) left in the backlog for the next runs' % (
+                sum(pending.values()), pending.get('Error', 0), pending.get('Warning', 0))
 
     if logPriority > 0:
         if logPriority & 2:
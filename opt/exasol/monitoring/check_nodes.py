@@ -1,20 +1,17 @@
 #!/usr/bin/python3
-import ssl, json, time
-from os.path            import isfile, getctime
-from os                 import sep
-from sys                import exit, argv, version_info, stdout, stderr
+from sys                import exit, argv
 from getopt             import getopt
-from xmlrpc.client      import ServerProxy
-from urllib.parse       import quote_plus
+from checkentry         import traceOptions, traceHelp, startCheck
 
 pluginVersion           = "18.10"
 hostName                = None
 userName                = None
 password                = None
+maxParallelCalls        = 8
 opts, args              = None, None
 
 try:
-    opts, args = getopt(argv[1:], 'hVH:u:p:')
+    opts, args = getopt(argv[1:], 'hVH:u:p:n:' + traceOptions)
 
 except:
     print("Unknown parameter(s): %s" % argv[1:])
@@ -34,7 +31,9 @@ EXAoperation XMLRPC nodes monitor (version %s)
     -H <license server>     domain of IP of your license server
     -u <user login>         EXAoperation login user
     -p <password>           EXAoperation login password
-""" % (pluginVersion))
+    -n <parallel calls>     (optional) maximum number of parallel node state requests (default: %i)
+%s
+""" % (pluginVersion, maxParallelCalls, traceHelp))
         exit(0)
     
     elif parameter == '-V':
@@ -50,26 +49,37 @@ EXAoperation XMLRPC nodes monitor (version %s)
     elif parameter == '-p':
         password = value.strip()
 
+    elif parameter == '-n':
+        validator = False
+        if value.strip().isdigit() and int(value) > 0:
+            maxParallelCalls = int(value)
+            validator = True
+        if not validator:
+            print('number of parallel calls must be a positive integer number')
+            exit(4)
+
 if not (hostName and userName and password):
     print('Please define at least the following parameters: -H -u -p')
     exit(4)
 
+startCheck(opts)
+
+from exaoperation       import XmlRpcSession, XmlRpcBatch
+from topology           import Topology
+
 def XmlRpcCall(urlPath = ''):
-    url = 'https://%s:%s@%s/cluster1%s' % (quote_plus(userName), quote_plus(password), hostName, urlPath)
-    sslcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-    sslcontext.verify_mode = ssl.CERT_NONE
-    sslcontext.check_hostname = False
-    return ServerProxy(url, context=sslcontext)
+    return XmlRpcSession(userName, password, hostName, urlPath)
 
 try:
     cluster = XmlRpcCall('/')
     storage = XmlRpcCall('/storage')
 
     notRunningNodes = {}
-    nodeList = cluster.getNodeList()
+    nodeList = Topology(userName, password, hostName, maxParallelCalls)['nodes']
     nodeStatesOutput = ''
-    for node in nodeList:
-        nodeState = cluster.getNodeState(node)['status']
+    nodeStates = XmlRpcBatch(userName, password, hostName, '/', 'getNodeState', [(node,) for node in nodeList], maxParallelCalls)
+    for node, nodeInfo in zip(nodeList, nodeStates):
+        nodeState = nodeInfo['status']
         if nodeState != 'Running':
             notRunningNodes[node] = nodeState
             nodeStatesOutput += '\n%s: %s' % (node, nodeState)
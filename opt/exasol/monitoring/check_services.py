@@ -1,17 +1,13 @@
 #!/usr/bin/python3
-import ssl, json, time
-from os.path            import isfile, getctime
-from sys                import exit, argv, version_info, stdout, stderr
-from pipes              import quote
+from sys                import exit, argv
 from getopt             import getopt
-from xmlrpc.client      import ServerProxy
-from urllib.parse       import quote_plus
+from checkentry         import traceOptions, traceHelp, startCheck
 
 pluginVersion = "18.10"
 
 opts, args = None, None
 try:
-    opts, args = getopt(argv[1:], 'hVH:u:p:')
+    opts, args = getopt(argv[1:], 'hVH:u:p:' + traceOptions)
 
 except:
     print("Unknown parameter(s): %s" % argv[1:])
@@ -35,7 +31,8 @@ EXAoperation XMLRPC services monitor (version %s)
     -H <license server>     domain of IP of your license server
     -u <user login>         EXAoperation login user
     -p <password>           EXAoperation login password
-""" % (pluginVersion))
+%s
+""" % (pluginVersion, traceHelp))
         exit(0)
     
     elif parameter == '-V':
@@ -58,12 +55,12 @@ if not (hostName and userName and password):
     print('Please define at least the following parameters: -H -u -p')
     exit(4)
 
+startCheck(opts)
+
+from exaoperation       import XmlRpcSession
+
 def XmlRpcCall(urlPath = ''):
-    url = 'https://%s:%s@%s/cluster1%s' % (quote_plus(userName), quote_plus(password), hostName, urlPath)
-    sslcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-    sslcontext.verify_mode = ssl.CERT_NONE
-    sslcontext.check_hostname = False
-    return ServerProxy(url, context=sslcontext)
+    return XmlRpcSession(userName, password, hostName, urlPath)
 
 try:
     cluster = XmlRpcCall('/')
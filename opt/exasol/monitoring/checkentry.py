@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# shared entry of the check plugins: called once the options are valid, the plugins import their
+# expensive modules (XMLRPC and TLS, json, the caches, the database connector) only afterwards, so
+# -h, -V and invalid options never load them
+
+traceOptions            = 'TJ:' #getopt letters of the trace options every plugin accepts
+traceHelp               = """    -T                      (optional) append the timings of the check phases as performance data
+    -J <trace file>         (optional) write the timings of all requests as JSON trace"""
+
+def startCheck(opts):
+    """called by every plugin once its options are valid: hands the check over to exasol-monitord if
+    it is running (prints its result and exits), starts the plugin trace if -T or -J is given"""
+    from exasol_monitord import delegateToDaemon
+    delegateToDaemon()
+
+    traceTimings, traceFile = False, None
+    for parameter, value in opts:
+        if parameter == '-T':
+            traceTimings = True
+        elif parameter == '-J':
+            traceFile = value.strip()
+    if traceTimings or traceFile:
+        from plugintrace import startTrace
+        startTrace(traceTimings, traceFile)
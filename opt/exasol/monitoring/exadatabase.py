@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# shared database connection handling for the check plugins
+import re
+from os                 import getpid, replace
+from os.path            import join
+from selectors          import DefaultSelector, EVENT_WRITE
+from socket             import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_ERROR
+from threading          import Lock
+from time               import time
+from urllib.parse       import quote_plus
+from plugintrace        import timed, currentTrace
+from cachedirectory     import cacheDirectory
+
+maxIdleConnections      = 2 #idle connections kept per connection string and user
+maxIdleTime             = 300 #seconds
+databaseTimeout         = 30 #seconds a WebSocket request may block (ODBC: CONNECTTIMEOUT and QUERYTIMEOUT of the connector)
+probeTimeout            = 5.0 #seconds to wait for a node of the connection string to accept a connection
+preferredHeadStart      = 0.2 #seconds the last working node is probed alone before all other nodes
+ipRangePattern          = re.compile(r'^(\d+\.\d+\.\d+\.)(\d+)\.\.(\d+)$')
+
+idleConnections         = {}
+idleConnectionsLock     = Lock()
+
+def keepsConnections():
+    """connections are only kept open if the checks are executed by a long running process"""
+    import exasol_monitord
+    return exasol_monitord.daemonMode
+
+def DatabaseSession(connectionString, userName, password):
+    """returns an open database connection; inside exasol-monitord an idle connection of a
+    previous check is reused, so the database does not see a new login on every check"""
+    key = (connectionString, userName, password)
+    with idleConnectionsLock:
+        connections = idleConnections.get(key, [])
+        while len(connections) > 0:
+            db, released = connections.pop()
+            if time() - released < maxIdleTime:
+                return db
+            closeQuietly(db)
+
+    #connection strings with several nodes: the fastest reachable node is used, the connector itself
+    #tries the nodes one after another and waits for the timeout of every unreachable one
+    from ExasolDatabaseConnector import Database
+    setDatabaseTimeout()
+    nodes, node = expandConnectionString(connectionString), None
+    with timed('sql', 'login'):
+        if len(nodes) > 1:
+            node = probeNodes(nodes, lastWorkingNode(connectionString))
+            if node is None:
+                raise RuntimeError('database offline, no node of %s accepts connections' % connectionString)
+        db = Database(node or connectionString, userName, password, autocommit = True)
+    if node is not None:
+        rememberNode(connectionString, node)
+    return TracedDatabase(db) if currentTrace() else db
+
+def setDatabaseTimeout():
+    """the WebSocket connections of EXASOL-DB-API have no timeout, the default timeout of the
+    websocket module applies to all connections created afterwards"""
+    try:
+        import websocket
+    except ImportError: #ODBC only
+        return
+    if websocket.getdefaulttimeout() is None:
+        websocket.setdefaulttimeout(databaseTimeout)
+
+def expandConnectionString(connectionString):
+    """returns ["ip:port"] of all nodes of a connection string like "10.0.0.11..74:8563" or
+    "10.0.0.11,10.0.0.20..22:8563", an empty list if it cannot be expanded"""
+    hosts, port = connectionString.strip().rsplit(':', 1) if ':' in connectionString else (connectionString, None)
+    nodes = []
+    for host in hosts.split(','):
+        host, hostPort = host.strip().split(':', 1) if ':' in host else (host.strip(), port)
+        match = ipRangePattern.match(host)
+        if not (hostPort and hostPort.strip().isdigit()):
+            return []
+        elif match:
+            nodes += ['%s%i:%s' % (match.group(1), i, hostPort.strip()) for i in range(int(match.group(2)), int(match.group(3)) + 1)]
+        elif host:
+            nodes.append('%s:%s' % (host, hostPort.strip()))
+    return nodes
+
+def probeNodes(nodes, preferred = None):
+    """connects to the ports of all nodes at the same time, returns the first node which accepts the
+    connection within probeTimeout or None; the preferred node gets a head start, so a healthy
+    cluster only sees one probe"""
+    selector = DefaultSelector()
+    waiting = [node for node in nodes if node != preferred]
+    if preferred not in nodes:
+        preferred = None
+
+    def connect(node):
+        host, port = node.rsplit(':', 1)
+        probe = socket(AF_INET, SOCK_STREAM)
+        try:
+            probe.setblocking(False)
+            probe.connect_ex((host, int(port)))
+            selector.register(probe, EVENT_WRITE, node)
+        except (OSError, ValueError): #e.g. not an IPv4 address
+            probe.close()
+
+    try:
+        started = time()
+        if preferred is not None:
+            connect(preferred)
+        while True:
+            now = time()
+            if waiting and (preferred is None or now - started >= preferredHeadStart or not selector.get_map()):
+                for node in waiting:
+                    connect(node)
+                waiting = []
+            if not selector.get_map() or now - started >= probeTimeout:
+                return None
+            until = started + (preferredHeadStart if waiting else probeTimeout)
+            for key, events in selector.select(max(until - now, 0.0)):
+                selector.unregister(key.fileobj)
+                connected = key.fileobj.getsockopt(SOL_SOCKET, SO_ERROR) == 0
+                key.fileobj.close()
+                if connected:
+                    return key.data
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+
+def nodeFileName(connectionString):
+    return join(cacheDirectory, 'exasol_dbnode_%s' % quote_plus(connectionString))
+
+def lastWorkingNode(connectionString):
+    try:
+        with open(nodeFileName(connectionString), 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def rememberNode(connectionString, node):
+    """stores the node of the last successful login, it is probed first by the next check"""
+    if lastWorkingNode(connectionString) == node:
+        return
+    fileName = nodeFileName(connectionString)
+    tempFile = '%s.%i' % (fileName, getpid())
+    try:
+        with open(tempFile, 'w') as f:
+            f.write(node)
+        replace(tempFile, fileName)
+    except OSError: #no writable cache directory, all nodes are probed every time
+        pass
+
+class TracedDatabase(object):
+    """database connection which records every statement in the plugin trace"""
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, sqlText):
+        with timed('sql', ' '.join(sqlText.split())[:100]):
+            return self.db.execute(sqlText)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+def releaseDatabaseSession(db, connectionString, userName, password):
+    """closes the connection or keeps it for the next check inside exasol-monitord"""
+    if isinstance(db, TracedDatabase):
+        db = db.db
+    if not keepsConnections():
+        db.close()
+        return
+
+    key = (connectionString, userName, password)
+    with idleConnectionsLock:
+        connections = idleConnections.setdefault(key, [])
+        if len(connections) < maxIdleConnections:
+            connections.append((db, time()))
+            return
+    db.close()
+
+def closeQuietly(db):
+    try:
+        db.close()
+    except Exception:
+        pass
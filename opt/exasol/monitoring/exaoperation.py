@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# shared EXAoperation XMLRPC helpers for the check plugins
+import ssl
+from http.client        import HTTPConnection, HTTPSConnection
+from threading          import Lock, Thread, local
+from time               import time
+from urllib.parse       import quote_plus
+from xmlrpc.client      import ServerProxy, SafeTransport, MultiCall, Fault, ProtocolError, Unmarshaller, ExpatParser
+from plugintrace        import timed, count, inheritTrace
+
+maxIdleSessions         = 4 #idle transports (persistent connections) kept per license server
+requestTimeout          = 30 #seconds a connection to EXAoperation may block, a hung request must not block a thread forever
+
+sslContext              = None
+sslContextLock          = Lock()
+tlsSessions             = {} #license server => last TLS session, used to resume new connections
+idleSessions            = {}
+idleSessionsLock        = Lock()
+usedSessions            = local()
+multicallSupport        = {} #license server => system.multicall available
+
+cacheTimes              = { #seconds a cached response is used without asking EXAoperation again
+    'getNodeList':                  600,
+    'getDatabaseList':              600,
+    'getVolumeInfo':                3600,
+    'getDiskStates':                3600,
+    'getDatabaseConnectionString':  86400
+}
+topologyMethods         = ['getNodeList', 'getDatabaseList', 'getVolumeInfo', 'getDiskStates'] #invalidated when the topology is rebuilt
+maxStaleAge             = 86400 #seconds an expired response may still be used if EXAoperation does not answer
+revalidateTimeout       = 10 #seconds to wait for a refresh before an expired response is used
+
+def SslContext():
+    """one context per process, TLS sessions can only be resumed by the context which created them"""
+    global sslContext
+    with sslContextLock: #checks started in parallel threads must not create a context each
+        if sslContext is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
+            context.verify_mode = ssl.CERT_NONE
+            context.check_hostname = False
+            sslContext = context
+    return sslContext
+
+class ResumingHTTPSConnection(HTTPSConnection):
+    """HTTPS connection which resumes the last TLS session of its license server, so a reconnect
+    or a parallel connection does not need a full handshake"""
+    def connect(self):
+        with timed('tls', self.host):
+            HTTPConnection.connect(self)
+            session = tlsSessions.get(self.host)
+            if hasattr(ssl, 'SSLSession'): #python >= 3.6
+                self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host, session=session)
+                tlsSessions[self.host] = self.sock.session
+            else:
+                self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host)
+
+class XmlRpcTransport(SafeTransport):
+    """one persistent HTTP/1.1 connection to a license server, shared by the proxies of all its
+    url paths (/, /storage, /db_X, /<node>)"""
+    def __init__(self):
+        SafeTransport.__init__(self, context=SslContext())
+        self.handleItem = None #see XmlRpcStream
+
+    def getparser(self):
+        if self.handleItem is None:
+            return SafeTransport.getparser(self)
+        unmarshaller = StreamingUnmarshaller(self.handleItem, self._use_datetime, self._use_builtin_types)
+        return ExpatParser(unmarshaller), unmarshaller
+
+    def make_connection(self, host):
+        if self._connection and host == self._connection[0]:
+            return self._connection[1]
+        connectionHost, self._extra_headers, x509 = self.get_host_info(host)
+        self._connection = host, ResumingHTTPSConnection(connectionHost, timeout=requestTimeout, context=self.context)
+        return self._connection[1]
+
+    def request(self, host, handler, request_body, verbose = False):
+        with timed('rpc', lambda: methodName(handler, request_body)):
+            return SafeTransport.request(self, host, handler, request_body, verbose)
+
+def methodName(handler, requestBody):
+    """returns "<url path>:<method name>" of a XMLRPC request for the plugin trace"""
+    start = requestBody.find(b'<methodName>') + len(b'<methodName>')
+    return '%s:%s' % (handler.split('/cluster1', 1)[-1] or '/', requestBody[start:requestBody.find(b'</methodName>', start)].decode('utf-8', 'replace'))
+
+def XmlRpcSession(userName, password, hostName, urlPath = ''):
+    """returns a XMLRPC proxy for an EXAoperation url path
+
+    All proxies of one license server used by a thread share one transport, so a check run does
+    all its requests over a single keep-alive connection. In long running processes
+    (exasol_monitord.py) the transports are handed back by releaseSessions() after each check and
+    reused by the next one, so their connections are kept open between checks.
+    """
+    url = 'https://%s:%s@%s/cluster1%s' % (quote_plus(userName), quote_plus(password), hostName, urlPath)
+    key = (userName, password, hostName)
+    proxies = getattr(usedSessions, 'proxies', None)
+    if proxies is None:
+        proxies = usedSessions.proxies = {}
+        usedSessions.transports = {}
+
+    if url not in proxies:
+        transports = usedSessions.transports
+        if key not in transports:
+            transport = None
+            with idleSessionsLock:
+                if idleSessions.get(key):
+                    transport = idleSessions[key].pop()
+            transports[key] = transport or XmlRpcTransport()
+        proxies[url] = ServerProxy(url, transport=transports[key])
+    return proxies[url]
+
+class StreamingUnmarshaller(Unmarshaller):
+    """hands the structs of the list in the result list (e.g. the entries of logEntriesTagged,
+    [first, last, [entries]]) to a function while the response is received, instead of keeping them"""
+    def __init__(self, handleItem, useDatetime = False, useBuiltinTypes = False):
+        Unmarshaller.__init__(self, useDatetime, useBuiltinTypes)
+        self.handleItem = handleItem
+
+    def endStruct(self, data):
+        Unmarshaller.end_struct(self, data)
+        if len(self._marks) == 2: #struct inside the list inside the result list
+            self.handleItem(self._stack.pop())
+
+    dispatch = dict(Unmarshaller.dispatch)
+    dispatch['struct'] = endStruct
+
+def XmlRpcStream(userName, password, hostName, urlPath, methodName, arguments, handleItem):
+    """calls a method returning a list of structs inside its result list and passes each struct to
+    handleItem as soon as it is parsed, so a large answer is never held in memory; returns the
+    result with an empty list in place of the structs"""
+    proxy = XmlRpcSession(userName, password, hostName, urlPath)
+    transport = usedSessions.transports[(userName, password, hostName)]
+    transport.handleItem = handleItem
+    try:
+        return getattr(proxy, methodName)(*arguments)
+    finally:
+        transport.handleItem = None
+
+def releaseSessions():
+    """hands all transports used by the current thread back to the idle pool"""
+    transports = getattr(usedSessions, 'transports', None) or {}
+    usedSessions.proxies = None
+    usedSessions.transports = {}
+    with idleSessionsLock:
+        for key, transport in transports.items():
+            idle = idleSessions.setdefault(key, [])
+            if len(idle) < maxIdleSessions:
+                idle.append(transport)
+            else:
+                transport.close()
+
+def XmlRpcBatch(userName, password, hostName, urlPath, methodName, argumentList, maxWorkers = 8):
+    """calls methodName on urlPath once for every argument tuple of argumentList
+
+    Uses a single system.multicall request if the server supports it, otherwise up to maxWorkers
+    parallel requests. The results are returned in the order of argumentList; the first failing
+    call raises its exception like a serial loop would do.
+    """
+    argumentList = [tuple(arguments) for arguments in argumentList]
+    if len(argumentList) == 0:
+        return []
+
+    if multicallSupport.get(hostName, True) and len(argumentList) > 1:
+        multicall = MultiCall(XmlRpcSession(userName, password, hostName, urlPath))
+        for arguments in argumentList:
+            getattr(multicall, methodName)(*arguments)
+        try:
+            results = multicall()
+        except (Fault, ProtocolError) as e:
+            if isinstance(e, ProtocolError) and e.errcode == 401:
+                raise
+            multicallSupport[hostName] = False
+        else:
+            multicallSupport[hostName] = True
+            return list(results)
+
+    return XmlRpcParallel(userName, password, hostName, [(urlPath, methodName, arguments) for arguments in argumentList], maxWorkers)
+
+def XmlRpcParallel(userName, password, hostName, calls, maxWorkers = 8):
+    """runs a list of (urlPath, methodName, arguments) calls with up to maxWorkers parallel
+    requests and returns their results in the same order"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def call(urlPath, methodName, arguments):
+        try:
+            return getattr(XmlRpcSession(userName, password, hostName, urlPath), methodName)(*arguments)
+        finally:
+            releaseSessions()
+
+    if len(calls) <= 1 or maxWorkers <= 1:
+        return [getattr(XmlRpcSession(userName, password, hostName, urlPath), methodName)(*arguments)
+                for urlPath, methodName, arguments in calls]
+
+    with ThreadPoolExecutor(max_workers=min(maxWorkers, len(calls))) as executor:
+        futures = [executor.submit(inheritTrace(call), urlPath, methodName, tuple(arguments)) for urlPath, methodName, arguments in calls]
+        return [future.result() for future in futures]
+
+def XmlRpcCachedParallel(userName, password, hostName, calls, maxWorkers = 8, fetch = None):
+    """like XmlRpcParallel, but calls of the methods in cacheTimes are answered from the response
+    cache (see responsecache.py)
+
+    Missing responses are fetched and stored. Expired responses are refreshed in the background;
+    if the refresh does not finish within revalidateTimeout seconds or fails, the expired responses
+    are returned, so a slow EXAoperation results in slightly stale data instead of a check timeout.
+    """
+    from responsecache import ResponseCacheFile
+    cache = ResponseCacheFile(hostName, userName)
+    calls = [(urlPath, methodName, tuple(arguments)) for urlPath, methodName, arguments in calls]
+    fetch = fetch or (lambda calls: XmlRpcParallel(userName, password, hostName, calls, maxWorkers))
+
+    results = [None] * len(calls)
+    missing, expired = [], []
+    now = time()
+    for index, (urlPath, methodName, arguments) in enumerate(calls):
+        cached = cache.get(cache.key(urlPath, methodName, arguments)) if methodName in cacheTimes else None
+        if cached is None or now - cached[1] >= cacheTimes[methodName] + maxStaleAge:
+            missing.append(index)
+            continue
+        results[index] = cached[0]
+        if now - cached[1] >= cacheTimes[methodName]:
+            expired.append(index)
+
+    count('cache_hits', len(calls) - len(missing) - len(expired))
+    count('cache_misses', len([index for index in missing + expired if calls[index][1] in cacheTimes]))
+    if len(missing) + len(expired) == 0:
+        return results
+
+    refresh = missing + expired
+    refreshed = {}
+    def run():
+        try:
+            refreshed['results'] = fetch([calls[index] for index in refresh])
+            cache.update(dict((cache.key(*calls[index]), result)
+                    for index, result in zip(refresh, refreshed['results']) if calls[index][1] in cacheTimes))
+        except Exception as e:
+            refreshed['error'] = e
+        finally:
+            releaseSessions()
+
+    worker = Thread(target=inheritTrace(run), daemon=True)
+    worker.start()
+    worker.join(None if len(missing) > 0 else revalidateTimeout)
+    if 'results' in refreshed:
+        for index, result in zip(refresh, refreshed['results']):
+            results[index] = result
+    elif len(missing) > 0:
+        raise refreshed['error']
+    return results
+
+def XmlRpcCachedBatch(userName, password, hostName, urlPath, methodName, argumentList, maxWorkers = 8):
+    """cached version of XmlRpcBatch"""
+    return XmlRpcCachedParallel(userName, password, hostName, [(urlPath, methodName, arguments) for arguments in argumentList], maxWorkers,
+            lambda calls: XmlRpcBatch(userName, password, hostName, urlPath, methodName, [arguments for path, method, arguments in calls], maxWorkers))
+
+def XmlRpcCached(userName, password, hostName, urlPath, methodName, arguments = ()):
+    """cached version of a single call"""
+    return XmlRpcCachedParallel(userName, password, hostName, [(urlPath, methodName, arguments)])[0]
+
+def invalidateCached(userName, hostName, urlPath, methodName, arguments = ()):
+    """removes a response from the cache, e.g. if a cached connection string does not work anymore"""
+    from responsecache import ResponseCacheFile
+    cache = ResponseCacheFile(hostName, userName)
+    cache.update(removed=[cache.key(urlPath, methodName, arguments)])
+
+def invalidateCachedMethods(userName, hostName, methodNames):
+    """removes the responses of all calls of the given methods from the cache"""
+    from responsecache import ResponseCacheFile
+    cache = ResponseCacheFile(hostName, userName)
+    cache.update(removed=[key for key in cache.keys() if cache.methodName(key) in methodNames])
@@ -0,0 +1,287 @@
+#!/usr/bin/python3
+# runs all Exasol checks of the generated cluster configurations (nagios-addcluster) concurrently
+# in one process and submits the results to Nagios as passive check results
+import re, shlex, time
+from glob               import glob
+from os                 import open as openFile, fdopen, O_CREAT, O_EXCL, O_WRONLY
+from os.path            import basename, dirname, join, realpath
+from sys                import exit, argv
+from getopt             import getopt
+from exasol_monitord    import runCheck, startWorkers, checkDirectory
+from nagioscommand      import escapeOutput, submitToCommandFile
+import adaptiveschedule
+
+pluginVersion           = "19.7"
+configFiles             = '/etc/nagios/conf.d/exa_*.cfg'
+definitionFiles         = '/etc/nagios/conf.d/exasol_definitions.cfg'
+commandFile             = '/var/lib/nagios/rw/nagios.cmd'
+checkResultPath         = None
+maxParallelChecks       = 16
+checkTimeout            = 50 #seconds
+batchDeadline           = 50 #seconds for all checks, below service_check_timeout (60) so Nagios does not kill the batch
+printResults            = False
+adaptiveSchedule        = False #run stable checks less often, see adaptiveschedule.py
+
+macroPattern            = re.compile(r'\$(\w+)\$')
+definePattern           = re.compile(r'^define\s+(\w+)\s*\{\s*$')
+stateNames              = ['OK', 'WARNING', 'CRITICAL', 'UNKNOWN']
+
+def readObjects(fileNames):
+    """parses Nagios object definitions, returns {object type: [attribute dicts]}"""
+    objects = {}
+    for fileName in fileNames:
+        with open(fileName, 'r') as f:
+            current = None
+            for line in f:
+                line = re.split(r'(?<!\\);', line)[0].replace('\\;', ';').strip()
+                if line == '' or line.startswith('#'):
+                    continue
+                match = definePattern.match(line)
+                if match:
+                    current = {}
+                    objects.setdefault(match.group(1), []).append(current)
+                elif line == '}':
+                    current = None
+                elif current is not None:
+                    items = line.split(None, 1)
+                    key = items[0].lower() if items[0].startswith('_') else items[0]
+                    current[key] = items[1].strip() if len(items) > 1 else ''
+    return objects
+
+def resolveObjects(definitions):
+    """applies template inheritance ("use"), returns the registered objects only"""
+    templates = dict((definition['name'], definition) for definition in definitions if 'name' in definition)
+    resolved = {}
+
+    def resolve(definition):
+        if id(definition) not in resolved:
+            attributes = {}
+            for templateName in reversed(definition.get('use', '').split(',')):
+                if templateName.strip() in templates:
+                    attributes.update(resolve(templates[templateName.strip()]))
+            attributes.update(definition)
+            attributes.pop('register', None)
+            resolved[id(definition)] = attributes
+        return resolved[id(definition)]
+
+    return [resolve(definition) for definition in definitions if definition.get('register', '1') != '0']
+
+def expandMacros(commandLine, host, service):
+    def macro(match):
+        name = match.group(1)
+        if name == 'HOSTADDRESS':
+            return host.get('address', host['host_name'])
+        elif name == 'HOSTNAME':
+            return host['host_name']
+        elif name == 'SERVICEDESC':
+            return service.get('service_description', '')
+        elif name.startswith('_HOST'):
+            return host.get('_' + name[5:].lower(), '')
+        elif name.startswith('_SERVICE'):
+            return service.get('_' + name[8:].lower(), '')
+        return match.group(0)
+    return macroPattern.sub(macro, commandLine)
+
+def collectChecks(passiveOnly = True):
+    """returns a list of (host name, service description, check script, arguments) of all passive
+    services (active_checks_enabled 0, e.g. the exasol_passive template) which are checked by one
+    of the Exasol plugins; services which Nagios still checks actively are not run twice, unless
+    passiveOnly is False (e.g. the exporter, which only reads the results)"""
+    objects = readObjects(sorted(glob(definitionFiles)) + sorted(glob(configFiles)))
+    commands = dict((command['command_name'], command['command_line']) for command in objects.get('command', []) if 'command_name' in command)
+    hosts = dict((host['host_name'], host) for host in resolveObjects(objects.get('host', [])) if 'host_name' in host)
+    checks = []
+    for service in resolveObjects(objects.get('service', [])):
+        commandName = service.get('check_command', '').split('!')[0]
+        if commandName not in commands or (passiveOnly and service.get('active_checks_enabled', '1') != '0'):
+            continue
+        for hostName in service.get('host_name', '').split(','):
+            hostName = hostName.strip()
+            if hostName not in hosts:
+                continue
+            arguments = shlex.split(expandMacros(commands[commandName], hosts[hostName], service))
+            if len(arguments) > 0 and realpath(dirname(arguments[0])) == checkDirectory and basename(arguments[0]).startswith('check_'):
+                checks.append((hostName, service.get('service_description', ''), basename(arguments[0]), arguments[1:]))
+    return checks
+
+def createCheckResultFile():
+    """Nagios only reads files named "c" + 6 characters from the check result path"""
+    from random import choice
+    from string import ascii_letters, digits
+    while True:
+        fileName = join(checkResultPath, 'c' + ''.join(choice(ascii_letters + digits) for i in range(6)))
+        try:
+            return fileName, fdopen(openFile(fileName, O_CREAT | O_EXCL | O_WRONLY, 0o660), 'w')
+        except FileExistsError:
+            pass
+
+def submitToCheckResultPath(results):
+    fileName, f = createCheckResultFile()
+    with f:
+        f.write('### Active Check Result File ###\nfile_time=%i\n\n' % time.time())
+        for hostName, serviceDescription, returnCode, output, started, finished in results:
+            f.write("""### Nagios Service Check Result ###
+# Time: %s
+host_name=%s
+service_description=%s
+check_type=1
+check_options=0
+scheduled_check=0
+reschedule_check=0
+latency=0.0
+start_time=%.6f
+finish_time=%.6f
+early_timeout=0
+exited_ok=1
+return_code=%i
+output=%s
+
+""" % (time.ctime(finished), hostName, serviceDescription, started, finished, returnCode, escapeOutput(output)))
+    open(fileName + '.ok', 'w').close()
+
+def positiveOption(value, description):
+    """returns the value of a numeric option; the batch runs as Nagios service, so an invalid value
+    is reported as UNKNOWN result (return code 3) like the failures of the other plugins"""
+    try:
+        number = int(value.strip())
+        if number > 0:
+            return number
+    except ValueError:
+        pass
+    print('UNKNOWN - %s must be a positive integer number (see -h): %s' % (description, value.strip()))
+    exit(3)
+
+def runChecks(checks, deadline):
+    """runs the checks in parallel worker processes, returns a result per check or None for the
+    checks which could not be started before the deadline; no check runs longer than the deadline"""
+    from concurrent.futures import ThreadPoolExecutor
+    startWorkers(maxParallelChecks)
+
+    def run(check):
+        hostName, serviceDescription, checkName, arguments = check
+        started = time.time()
+        if deadline - started < 1.0:
+            return None
+        returnCode, output = runCheck(checkName, arguments, min(checkTimeout, deadline - started))
+        return hostName, serviceDescription, returnCode, output, started, time.time()
+
+    with ThreadPoolExecutor(max_workers=maxParallelChecks) as executor:
+        return list(executor.map(run, checks))
+
+if __name__ == '__main__':
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVc:D:e:r:n:t:d:oa:i:')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+Exasol batch checks (version %s)
+  Runs all Exasol checks of the cluster configurations in one process and submits the results as
+  passive checks. Only services with the "exasol_passive" template (active_checks_enabled 0) are
+  run; schedule this plugin with the "exasol_batch" service. Checks which cannot be started
+  before the deadline are left for the next run.
+
+  Options:
+    -h                      shows this help
+    -V                      shows the plugin version
+    -c <config files>       cluster configuration files (default: %s)
+    -D <definitions>        command and template definitions (default: %s)
+    -e <command file>       Nagios external command file (default: %s)
+    -r <check result path>  (optional) write check result files instead of external commands
+    -n <parallel checks>    (optional) maximum number of parallel checks (default: %i)
+    -t <timeout in sec>     (optional) timeout per check (default: %i)
+    -d <deadline in sec>    (optional) time for all checks, must be lower than the service_check_timeout
+                            of Nagios (default: %i)
+    -o                      (optional) print the results instead of submitting them
+    -a <max interval sec>   (optional) adaptive intervals: checks with values far below their warning
+                            thresholds are run less often, up to this interval; use the
+                            "exasol_passive_adaptive" template for their services
+    -i <min interval sec>   (optional) check interval of this service, used by -a (default: %i)
+""" % (pluginVersion, configFiles, definitionFiles, commandFile, maxParallelChecks, checkTimeout, batchDeadline, adaptiveschedule.minInterval))
+            exit(0)
+
+        elif parameter == '-V':
+            print("Exasol batch checks (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-c':
+            configFiles = value.strip()
+
+        elif parameter == '-D':
+            definitionFiles = value.strip()
+
+        elif parameter == '-e':
+            commandFile = value.strip()
+
+        elif parameter == '-r':
+            checkResultPath = value.strip()
+
+        elif parameter == '-n':
+            maxParallelChecks = positiveOption(value, 'number of parallel checks')
+
+        elif parameter == '-t':
+            checkTimeout = positiveOption(value, 'timeout')
+
+        elif parameter == '-d':
+            batchDeadline = positiveOption(value, 'deadline')
+
+        elif parameter == '-o':
+            printResults = True
+
+        elif parameter == '-a':
+            adaptiveSchedule = True
+            adaptiveschedule.maxInterval = float(positiveOption(value, 'maximum interval'))
+
+        elif parameter == '-i':
+            adaptiveschedule.minInterval = float(positiveOption(value, 'minimum interval'))
+
+    deadline = time.time() + batchDeadline
+    try:
+        checks = collectChecks()
+        if adaptiveSchedule:
+            schedule = adaptiveschedule.AdaptiveSchedule()
+            allChecks, checks = checks, schedule.due(checks, time.time())
+        results = runChecks(checks, deadline)
+        notStarted = results.count(None)
+        if adaptiveSchedule:
+            for check, result in zip(checks, results):
+                if result is not None: #checks which were not started stay due
+                    schedule.update(check, result[2], result[3], result[4])
+            schedule.save(allChecks)
+        results = [result for result in results if result is not None]
+
+        if printResults:
+            for hostName, serviceDescription, returnCode, output, started, finished in results:
+                print('%s;%s;%i;%s' % (hostName, serviceDescription, returnCode, escapeOutput(output)))
+        elif checkResultPath:
+            submitToCheckResultPath(results)
+        else:
+            submitToCommandFile(results, commandFile)
+
+        states = [0, 0, 0, 0]
+        for result in results:
+            states[result[2] if 0 <= result[2] <= 3 else 3] += 1
+        print('%s - %i check results submitted (%s)%s%s | checks=%i;%s not_started=%i;' % (
+            'WARNING' if notStarted > 0 else 'OK',
+            len(results),
+            ', '.join('%i %s' % (states[i], stateNames[i]) for i in range(4)),
+            ', %i checks skipped' % (len(allChecks) - len(checks)) if adaptiveSchedule else '',
+            ', %i checks not started within %i seconds' % (notStarted, batchDeadline) if notStarted > 0 else '',
+            len(results),
+            ' skipped=%i;' % (len(allChecks) - len(checks)) if adaptiveSchedule else '',
+            notStarted
+        ))
+        exit(1 if notStarted > 0 else 0)
+
+    except Exception as e:
+        print('UNKNOWN - internal error %s | ' % str(e).replace('|', '!').replace('\n', ';'))
+        exit(3)
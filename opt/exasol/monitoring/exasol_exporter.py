@@ -0,0 +1,277 @@
+#!/usr/bin/python3
+# exasol-exporter: serves the states and performance data of the Exasol checks to Prometheus; the
+# results are read from the status file of Nagios, the exporter never runs a check itself: Nagios
+# schedules the checks and enforces their timeout, exasol_check_up shows checks without a recent result
+import re, time
+from os.path            import basename, getmtime
+from sys                import exit, argv, stderr
+from threading          import Thread, Lock
+from getopt             import getopt
+import exasol_batch
+import perfdatastore
+
+pluginVersion           = "19.7"
+listenAddress           = ''
+listenPort              = 9658
+statusFile              = '/var/cache/nagios/status.dat' #status_file of nagios.cfg
+refreshInterval         = 10 #seconds between two reads of the status file (status_update_interval)
+staleIntervals          = 3 #check intervals without a new result after which the result of a check is stale
+defaultStaleAge         = 900 #seconds, for services without check_interval (passive checks)
+exportedChecks          = ['check_services.py', 'check_nodes.py', 'check_db_diskspace.py', 'check_db_performance.py', 'check_backup.py']
+
+unitConversions         = {
+    '%':        ('percent', 1.0),
+    's':        ('seconds', 1.0),
+    'ms':       ('seconds', 0.001),
+    'B':        ('bytes', 1.0),
+    'KB':       ('bytes', 1024.0),
+    'MB':       ('bytes', 1024.0 ** 2),
+    'GB':       ('bytes', 1024.0 ** 3),
+    'GiB':      ('bytes', 1024.0 ** 3),
+    'MBps':     ('bytes_per_second', 1000.0 ** 2)
+}
+
+def metricName(*parts):
+    return re.sub(r'_+', '_', re.sub(r'[^a-zA-Z0-9_]', '_', '_'.join(parts))).strip('_').lower()
+
+def labelValue(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def readServiceStatus(fileName):
+    """returns {(host name, service description): {field: value}} of the servicestatus blocks of
+    the Nagios status file"""
+    status, block = {}, None
+    with open(fileName, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line == 'servicestatus {':
+                block = {}
+            elif line == '}' and block is not None:
+                status[(block.get('host_name'), block.get('service_description'))] = block
+                block = None
+            elif block is not None and '=' in line:
+                key, value = line.split('=', 1)
+                block[key] = value
+    return status
+
+class Collector(object):
+    """one check of a Nagios service, its metrics are taken from the last result Nagios stored"""
+    def __init__(self, hostName, serviceDescription, checkName, arguments):
+        self.hostName = hostName
+        self.serviceDescription = serviceDescription
+        self.checkName = checkName
+        self.arguments = arguments
+        self.labels = {'cluster': hostName, 'service': serviceDescription}
+        if '-d' in arguments[:-1]:
+            self.labels['database'] = arguments[arguments.index('-d') + 1]
+        self.metrics = None #rendered exposition lines of the last result
+        self.lastCheck = None
+        self.staleAge = defaultStaleAge
+
+    def labelString(self):
+        return '{%s}' % ','.join('%s="%s"' % (key, labelValue(value)) for key, value in sorted(self.labels.items()))
+
+    def update(self, status):
+        """takes the servicestatus block of the service, a service Nagios has not checked yet has
+        no metrics"""
+        if status is None or status.get('has_been_checked') != '1':
+            self.metrics = None
+            self.lastCheck = None
+            return
+        self.lastCheck = int(status.get('last_check', 0))
+        checkInterval = float(status.get('check_interval', 0) or 0) * 60 #interval_length of nagios.cfg
+        self.staleAge = staleIntervals * checkInterval if checkInterval > 0 else defaultStaleAge
+
+        prefix = metricName('exasol', basename(self.checkName)[len('check_'):-len('.py')])
+        lines = [
+            ('exasol_check_state', self.labelString(), int(status.get('current_state', 3))),
+            ('exasol_check_duration_seconds', self.labelString(), float(status.get('check_execution_time', 0.0))),
+            ('exasol_check_last_run_timestamp_seconds', self.labelString(), int(status.get('last_check', 0)))
+        ]
+        for label, value, unit in perfdatastore.parsePerfdata(status.get('performance_data', '')):
+            name, factor = metricName(prefix, label), 1.0
+            if unit in unitConversions:
+                suffix, factor = unitConversions[unit]
+                if not name.endswith('_' + suffix):
+                    name = metricName(name, suffix)
+            lines.append((name, self.labelString(), value * factor))
+        self.metrics = lines
+
+    def health(self, now):
+        """exasol_check_up is 1 if Nagios stored a result of the check within staleIntervals check
+        intervals, 0 if there is none or it is outdated (e.g. a hung or no longer scheduled check)"""
+        lines = [('exasol_check_up', self.labelString(), 1 if self.lastCheck is not None and now - self.lastCheck <= self.staleAge else 0)]
+        if self.lastCheck is not None:
+            lines.append(('exasol_check_result_age_seconds', self.labelString(), max(now - self.lastCheck, 0)))
+        return lines
+
+class Exporter(object):
+    """reads the status file in a background thread whenever Nagios has replaced it and keeps the
+    rendered metrics of all collectors"""
+    def __init__(self, collectors):
+        self.collectors = collectors
+        self.lock = Lock()
+        self.body = b''
+        self.statusTime = None #modification time of the status file which was read last
+        self.statusRead = None #the last attempt to read the status file succeeded
+        self.render()
+
+    def render(self):
+        """builds the response of all scrapes until the next refresh"""
+        now = time.time()
+        lines = [line for collector in self.collectors if collector.metrics for line in collector.metrics]
+        lines += [line for collector in self.collectors for line in collector.health(now)]
+        types = {
+            'exasol_check_state': 'Nagios return code of the last check run (0 OK, 1 WARNING, 2 CRITICAL, 3 UNKNOWN)',
+            'exasol_check_duration_seconds': 'execution time of the last check run',
+            'exasol_check_last_run_timestamp_seconds': 'time of the last check run',
+            'exasol_check_up': '1 if Nagios has a recent result of the check, 0 if it is missing or stale',
+            'exasol_check_result_age_seconds': 'age of the last check result at the last refresh of the exporter'
+        }
+        body = []
+        for name in sorted(set(line[0] for line in lines)):
+            body.append('# HELP %s %s' % (name, types.get(name, 'performance data of the Exasol check plugins')))
+            body.append('# TYPE %s gauge' % name)
+            body += ['%s%s %r' % (line[0], line[1], float(line[2])) for line in lines if line[0] == name]
+        body += [
+            '# HELP exasol_exporter_collectors number of exported checks',
+            '# TYPE exasol_exporter_collectors gauge',
+            'exasol_exporter_collectors %i' % len(self.collectors),
+            '# HELP exasol_exporter_status_read_success 1 if the last read of the Nagios status file succeeded',
+            '# TYPE exasol_exporter_status_read_success gauge',
+            'exasol_exporter_status_read_success %i' % (1 if self.statusRead else 0),
+            '# HELP exasol_exporter_status_file_timestamp_seconds modification time of the Nagios status file read last',
+            '# TYPE exasol_exporter_status_file_timestamp_seconds gauge',
+            'exasol_exporter_status_file_timestamp_seconds %r' % float(self.statusTime or 0)
+        ]
+        body = ('\n'.join(body) + '\n').encode('utf-8')
+        with self.lock:
+            self.body = body
+
+    def collect(self):
+        """updates all collectors if the status file has changed since it was read last, the
+        health of the collectors is rendered again on every refresh"""
+        try:
+            modified = getmtime(statusFile)
+            if modified != self.statusTime:
+                status = readServiceStatus(statusFile)
+                for collector in self.collectors:
+                    collector.update(status.get((collector.hostName, collector.serviceDescription)))
+                self.statusTime = modified
+            self.statusRead = True
+        except OSError as e: #Nagios not started yet, the last metrics are kept
+            if self.statusRead is not False: #reported once until it can be read again
+                print('exasol-exporter: %s cannot be read: %s' % (statusFile, e), file=stderr)
+            self.statusRead = False
+        self.render()
+
+    def schedule(self):
+        while True:
+            self.collect()
+            time.sleep(refreshInterval)
+
+    def serve(self, address, port):
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from socketserver import ThreadingMixIn
+        exporter = self
+
+        class ThreadingHTTPServer(ThreadingMixIn, HTTPServer): #http.server has it only since python 3.7
+            daemon_threads = True
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                with exporter.lock:
+                    body = exporter.body
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *arguments):
+                pass
+
+        Thread(target=self.schedule, daemon=True).start()
+        server = ThreadingHTTPServer((address, port), MetricsRequestHandler)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+if __name__ == '__main__':
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVc:D:S:l:i:C:')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+Exasol Prometheus exporter exasol-exporter (version %s)
+  Serves the states and performance data of the Exasol checks of the cluster configurations
+  (nagios-addcluster) on http://<address>:<port>/metrics. The results of the last check runs are
+  read from the status file of Nagios, so the exporter adds no load on EXAoperation and the
+  databases; it does not run the checks itself, exasol_check_up is 0 for checks without a result
+  within %i check intervals.
+
+  Options:
+    -h                      shows this help
+    -V                      shows the exporter version
+    -c <config files>       cluster configuration files (default: %s)
+    -D <definitions>        command and template definitions (default: %s)
+    -S <status file>        (optional) status_file of Nagios (default: %s)
+    -l <[address:]port>     (optional) listen address (default: %i)
+    -i <interval in sec>    (optional) time between two reads of the status file (default: %i)
+    -C <checks,...>         (optional) exported checks (default: %s)
+""" % (pluginVersion, staleIntervals, exasol_batch.configFiles, exasol_batch.definitionFiles, statusFile, listenPort, refreshInterval,
+       ','.join(exportedChecks)))
+            exit(0)
+
+        elif parameter == '-V':
+            print("Exasol Prometheus exporter exasol-exporter (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-c':
+            exasol_batch.configFiles = value.strip()
+
+        elif parameter == '-D':
+            exasol_batch.definitionFiles = value.strip()
+
+        elif parameter == '-S':
+            statusFile = value.strip()
+
+        elif parameter == '-l':
+            address, separator, port = value.strip().rpartition(':')
+            if not port.isdigit():
+                print('listen address must be [address:]port')
+                exit(4)
+            listenAddress, listenPort = address.strip('[]'), int(port)
+
+        elif parameter == '-i':
+            if not (value.strip().isdigit() and int(value) > 0):
+                print('interval must be a positive integer number')
+                exit(4)
+            refreshInterval = int(value)
+
+        elif parameter == '-C':
+            exportedChecks = [basename(checkName.strip()) for checkName in value.split(',')]
+
+    #active and passive services, their results are read from the status file
+    collectors = [Collector(*check) for check in exasol_batch.collectChecks(passiveOnly=False) if check[2] in exportedChecks]
+    try:
+        Exporter(collectors).serve(listenAddress, listenPort)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print('exasol-exporter stopped: %s' % e, file=stderr)
+        exit(1)
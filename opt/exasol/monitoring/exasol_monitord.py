@@ -0,0 +1,334 @@
+#!/usr/bin/python3
+# exasol-monitord: keeps a pool of warm python worker processes with open EXAoperation sessions and
+# runs the check plugins on behalf of their thin command line clients (see delegateToDaemon)
+from os                 import environ
+from os.path            import exists, dirname, realpath, basename, join, isfile, getmtime
+from sys                import argv, exit, modules, stderr
+from time               import time
+
+pluginVersion           = "19.7"
+socketPath              = environ.get('EXASOL_MONITORD_SOCKET', '/var/run/nagios/exasol-monitord.sock')
+clientTimeout           = 60 #seconds
+checkTimeout            = 60 #seconds (same as service_check_timeout)
+maxWorkers              = 8 #worker processes, each runs one check at a time
+maxWorkerChecks         = 1000 #checks per worker process before it is replaced
+checkDirectory          = dirname(realpath(__file__))
+checkPattern            = r'^check_\w+\.py$'
+daemonMode              = False #True if checks are executed by a long running worker process
+processStarted          = time()
+
+workerPool              = None
+compiledChecks          = {}
+
+def delegateToDaemon():
+    """runs the calling check plugin inside exasol-monitord if the daemon is reachable
+
+    Prints the daemon result and exits. Returns without doing anything if the daemon is not
+    running, so the plugin runs standalone as before.
+    """
+    if daemonMode or not exists(socketPath):
+        return
+    import socket
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(clientTimeout)
+    try:
+        connection.connect(socketPath)
+    except OSError: #stale socket, daemon is not running
+        connection.close()
+        return
+
+    try:
+        #request: check name and arguments separated by NUL bytes, answer: "<return code>\n<output>"
+        connection.sendall('\0'.join([basename(argv[0])] + argv[1:]).encode('utf-8', 'surrogateescape'))
+        connection.shutdown(socket.SHUT_WR)
+        response = []
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            response.append(data)
+        returnCode, separator, output = b''.join(response).decode('utf-8', 'replace').partition('\n')
+        returnCode = int(returnCode)
+    except Exception as e:
+        print('UNKNOWN - exasol-monitord did not answer (%s) | ' % str(e).replace('|', '!'))
+        exit(3)
+    finally:
+        connection.close()
+
+    print(output, end='')
+    exit(returnCode)
+
+def sendMessage(connection, data):
+    connection.sendall(len(data).to_bytes(4, 'big') + data)
+
+def receiveMessage(connection, deadline = None):
+    """returns the next length prefixed message or None if the other side closed the connection;
+    raises socket.timeout if the message is not complete before the deadline"""
+    data, length = b'', None
+    while length is None or len(data) < length + 4:
+        if deadline is not None:
+            connection.settimeout(max(deadline - time(), 0.001))
+        received = connection.recv(65536)
+        if not received:
+            return None
+        data += received
+        if length is None and len(data) >= 4:
+            length = int.from_bytes(data[:4], 'big')
+    return data[4:]
+
+def compiledCheck(checkPath):
+    mtime = getmtime(checkPath)
+    if checkPath not in compiledChecks or compiledChecks[checkPath][0] != mtime:
+        with open(checkPath, 'r') as f:
+            compiledChecks[checkPath] = (mtime, compile(f.read(), checkPath, 'exec'))
+    return compiledChecks[checkPath][1]
+
+def exitCode(function, *arguments):
+    """calls a plugin function, returns the return code of its exit() call"""
+    try:
+        function(*arguments)
+        return 0
+    except SystemExit as e:
+        returnCode = e.code
+    except Exception as e:
+        print('UNKNOWN - internal error %s | ' % str(e).replace('|', '!').replace('\n', ';'))
+        return 3
+
+    if returnCode is None:
+        return 0
+    elif not isinstance(returnCode, int):
+        print(returnCode)
+        return 1
+    return returnCode
+
+def executeCheck(checkPath, arguments):
+    """runs a check plugin in the main thread of this worker process, returns (return code, output)
+
+    The plugins are plain scripts using print(), sys.argv, sys.exit() and signal.alarm(); a worker
+    runs one check at a time, so they get the real modules and the output of the helper modules
+    ends up in the check output as well.
+    """
+    import signal, sys
+    from io import StringIO
+    from exaoperation import releaseSessions
+    from plugintrace import beginRun, finishTrace
+
+    output = StringIO()
+    realArgv, realStdout = sys.argv, sys.stdout
+    sys.argv, sys.stdout = [checkPath] + list(arguments), output
+    beginRun()
+    try:
+        returnCode = exitCode(exec, compiledCheck(checkPath), {'__name__': '__main__', '__file__': checkPath})
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        finishTrace(print)
+    finally:
+        sys.argv, sys.stdout = realArgv, realStdout
+        releaseSessions()
+    return returnCode, output.getvalue()
+
+def serveWorker(fileDescriptor):
+    """main loop of a worker process: runs the checks requested by the daemon over its socket until
+    the daemon closes it"""
+    import socket
+    global daemonMode
+    daemonMode = True
+    modules.setdefault('exasol_monitord', modules[__name__])
+    connection = socket.socket(fileno=fileDescriptor)
+    while True:
+        request = receiveMessage(connection)
+        if request is None:
+            break
+        request = request.decode('utf-8', 'surrogateescape').split('\0')
+        returnCode, output = executeCheck(join(checkDirectory, request[0]), request[1:])
+        sendMessage(connection, ('%i\n%s' % (returnCode, output)).encode('utf-8', 'replace'))
+
+class Worker(object):
+    """a worker process (exasol_monitord.py -w) and the socket the daemon talks to it over"""
+    def __init__(self):
+        import socket
+        from subprocess import Popen, DEVNULL
+        from sys import executable
+        self.connection, workerSide = socket.socketpair()
+        try:
+            self.process = Popen([executable, realpath(__file__), '-w', str(workerSide.fileno())], pass_fds=(workerSide.fileno(),),
+                                 stdin=DEVNULL, stdout=DEVNULL, cwd=checkDirectory)
+        except:
+            self.connection.close()
+            raise
+        finally:
+            workerSide.close()
+        self.checks = 0
+
+    def stop(self):
+        """kills the process, a check which did not finish in time cannot leave anything behind"""
+        self.connection.close()
+        self.process.kill()
+        self.process.wait()
+
+class WorkerPool(object):
+    """starts up to size worker processes on demand and hands each check to an idle one"""
+    def __init__(self, size):
+        from threading import Condition
+        self.size = size
+        self.idle = []
+        self.running = 0 #started and not yet stopped workers
+        self.condition = Condition()
+
+    def acquire(self, deadline):
+        with self.condition:
+            while len(self.idle) == 0 and self.running >= self.size:
+                if deadline - time() <= 0:
+                    return None
+                self.condition.wait(deadline - time())
+            if len(self.idle) > 0:
+                return self.idle.pop()
+            self.running += 1
+        try:
+            return Worker()
+        except:
+            self.release(None, False)
+            raise
+
+    def release(self, worker, reusable):
+        with self.condition:
+            if reusable:
+                self.idle.append(worker)
+            else:
+                self.running -= 1
+            self.condition.notify()
+        if worker is not None and not reusable:
+            worker.stop()
+
+    def run(self, checkName, arguments, timeout):
+        import socket
+        deadline = time() + timeout
+        worker = self.acquire(deadline)
+        if worker is None:
+            return 3, 'UNKNOWN - no exasol-monitord worker became free within %i seconds | \n' % timeout
+        reusable = False
+        try:
+            sendMessage(worker.connection, '\0'.join([checkName] + list(arguments)).encode('utf-8', 'surrogateescape'))
+            response = receiveMessage(worker.connection, deadline)
+            if response is None:
+                return 3, 'UNKNOWN - exasol-monitord worker stopped during the check | \n'
+            worker.checks += 1
+            reusable = worker.checks < maxWorkerChecks
+            returnCode, separator, output = response.decode('utf-8', 'replace').partition('\n')
+            return int(returnCode), output
+        except socket.timeout:
+            return 3, 'UNKNOWN - check did not finish within %i seconds | \n' % timeout
+        except OSError as e:
+            return 3, 'UNKNOWN - exasol-monitord worker failed (%s) | \n' % str(e).replace('|', '!')
+        finally:
+            self.release(worker, reusable)
+
+    def stop(self):
+        with self.condition:
+            workers, self.idle = self.idle, []
+            self.running -= len(workers)
+        for worker in workers:
+            worker.stop()
+
+def startWorkers(size):
+    """sets the number of worker processes runCheck() uses (the number of checks run in parallel)"""
+    global workerPool
+    import atexit
+    if workerPool is not None:
+        workerPool.stop()
+    else:
+        atexit.register(lambda: workerPool.stop())
+    workerPool = WorkerPool(size)
+
+def runCheck(checkName, arguments, timeout = checkTimeout):
+    """runs a check plugin of this directory in a worker process, returns (return code, output);
+    the worker is killed if the check does not finish within the timeout"""
+    import re
+    checkPath = join(checkDirectory, checkName)
+    if not re.match(checkPattern, checkName) or not isfile(checkPath):
+        return 3, 'UNKNOWN - unknown check "%s"\n' % checkName
+    if workerPool is None:
+        startWorkers(maxWorkers)
+    return workerPool.run(checkName, arguments, timeout)
+
+def serve(path):
+    from os import remove, chmod
+    from socketserver import ThreadingUnixStreamServer, StreamRequestHandler
+
+    class CheckRequestHandler(StreamRequestHandler):
+        def handle(self):
+            try:
+                request = self.rfile.read().decode('utf-8', 'surrogateescape').split('\0')
+                returnCode, output = runCheck(request[0], request[1:])
+            except Exception as e:
+                returnCode, output = 3, 'UNKNOWN - invalid request to exasol-monitord (%s) | \n' % str(e).replace('|', '!')
+            self.wfile.write(('%i\n%s' % (returnCode, output)).encode('utf-8', 'replace'))
+
+    if exists(path):
+        remove(path)
+    server = ThreadingUnixStreamServer(path, CheckRequestHandler)
+    server.daemon_threads = True
+    chmod(path, 0o660)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        remove(path)
+
+if __name__ == '__main__':
+    from getopt import getopt
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVs:n:w:')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+EXAoperation check daemon exasol-monitord (version %s)
+  Options:
+    -h                      shows this help
+    -V                      shows the daemon version
+    -s <socket path>        unix socket for the check plugins (default: %s)
+    -n <worker processes>   (optional) maximum number of checks run in parallel (default: %i)
+""" % (pluginVersion, socketPath, maxWorkers))
+            exit(0)
+
+        elif parameter == '-V':
+            print("EXAoperation check daemon exasol-monitord (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-s':
+            socketPath = value.strip()
+
+        elif parameter == '-n':
+            if not (value.strip().isdigit() and int(value) > 0):
+                print('number of worker processes must be a positive integer number')
+                exit(4)
+            maxWorkers = int(value)
+
+        elif parameter == '-w': #internal: file descriptor of the socket of a worker process
+            try:
+                serveWorker(int(value))
+            except KeyboardInterrupt:
+                pass
+            exit(0)
+
+    try:
+        serve(socketPath)
+    except KeyboardInterrupt:
+        exit(0)
+    except Exception as e:
+        print('exasol-monitord stopped: %s' % e, file=stderr)
+        exit(1)
+    finally:
+        if workerPool is not None:
+            workerPool.stop()
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+# exasol-perfdata: stores the performance data of the Exasol checks from the Nagios bulk perfdata
+# file in a columnar store (perfdatastore.py) and queries it
+from sys                import exit, argv
+from getopt             import getopt
+from glob               import glob, escape
+from os                 import link, rename, remove, getpid
+from os.path            import exists
+from time               import time, gmtime, strftime
+import perfdatastore
+
+pluginVersion           = "19.7"
+perfdataFile            = None
+spoolFile               = None #hand the perfdata file over to PNP4Nagios (npcd) afterwards
+commandPrefix           = 'exasol_' #check commands of the stored services
+hostName                = None
+serviceDescription      = None
+metricName              = None
+queryDay                = None
+listSeries              = False
+compactJournals         = False
+
+def spoolPerfdataFile(perfdataFile, spoolFile):
+    """hands the perfdata file to npcd first, so a kill by perfdata_timeout never keeps it from
+    PNP4Nagios; returns the work files to store, a hardlink of the spooled file and the work files
+    left by a killed run"""
+    workFiles = sorted(glob(escape(perfdataFile) + '.exasol.*'))
+    if not exists(perfdataFile):
+        return workFiles
+    workFile = '%s.exasol.%i' % (perfdataFile, getpid())
+    if not spoolFile:
+        rename(perfdataFile, workFile)
+        return workFiles + [workFile]
+    rename(perfdataFile, spoolFile) #Nagios appends to a new file from now on
+    try:
+        link(spoolFile, workFile)
+    except OSError: #already processed by npcd or another file system, not stored
+        return workFiles
+    return workFiles + [workFile]
+
+def readPerfdataFile(fileName):
+    """returns [(time, host, service, label, value, unit)] of the lines in the format of
+    service_perfdata_file_template (DATATYPE::SERVICEPERFDATA<TAB>TIMET::...)"""
+    samples = []
+    with open(fileName, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            fields = dict(field.split('::', 1) for field in line.rstrip('\n').split('\t') if '::' in field)
+            if fields.get('DATATYPE') != 'SERVICEPERFDATA' or not fields.get('SERVICECHECKCOMMAND', '').startswith(commandPrefix):
+                continue
+            if not fields.get('TIMET', '').isdigit():
+                continue
+            for label, value, unit in perfdatastore.parsePerfdata(fields.get('SERVICEPERFDATA', '')):
+                samples.append((int(fields['TIMET']), fields.get('HOSTNAME', ''), fields.get('SERVICEDESC', ''), label, value, unit))
+    return samples
+
+if __name__ == '__main__':
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVS:f:m:c:CH:s:M:d:L')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+Exasol performance data store exasol-perfdata (version %s)
+  Stores the performance data of the Exasol checks as compact binary samples, one journal per
+  day which is compacted into a segment with an index by series after the day. Run it as
+  service_perfdata_file_processing_command (see commands.cfg), it passes the file on to npcd
+  before reading it. The journals are compacted by a separate daily run with -C (cron).
+
+  Options:
+    -h                      shows this help
+    -V                      shows the version
+    -S <directory>          (optional) store directory (default: %s)
+
+  Storing:
+    -f <perfdata file>      Nagios service_perfdata_file
+    -m <spool file>         (optional) rename the perfdata file to this name first (PNP4Nagios)
+    -c <command prefix>     (optional) check commands of the stored services (default: %s)
+    -C                      compacts the journals of the previous days into segments
+
+  Querying (tab separated output):
+    -L                      lists the series (host, service, metric, unit)
+    -H <host name>          (optional) samples of this host
+    -s <service>            (optional) samples of this service
+    -M <metric>             (optional) samples of this metric (performance data label)
+    -d <YYYYMMDD>           (optional) day of the samples in UTC (default: today)
+""" % (pluginVersion, perfdatastore.storeDirectory, commandPrefix))
+            exit(0)
+
+        elif parameter == '-V':
+            print("Exasol performance data store exasol-perfdata (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-S':
+            perfdatastore.storeDirectory = value.strip()
+
+        elif parameter == '-f':
+            perfdataFile = value.strip()
+
+        elif parameter == '-m':
+            spoolFile = value.strip()
+
+        elif parameter == '-c':
+            commandPrefix = value.strip()
+
+        elif parameter == '-C':
+            compactJournals = True
+
+        elif parameter == '-H':
+            hostName = value.strip()
+
+        elif parameter == '-s':
+            serviceDescription = value.strip()
+
+        elif parameter == '-M':
+            metricName = value.strip()
+
+        elif parameter == '-d':
+            if not (len(value.strip()) == 8 and value.strip().isdigit()):
+                print('day must be given as YYYYMMDD')
+                exit(4)
+            queryDay = value.strip()
+
+        elif parameter == '-L':
+            listSeries = True
+
+    if perfdataFile:
+        for workFile in spoolPerfdataFile(perfdataFile, spoolFile):
+            perfdatastore.PerfdataStore().ingest(readPerfdataFile(workFile))
+            remove(workFile)
+        exit(0)
+
+    if compactJournals:
+        for day in perfdatastore.PerfdataStore().compactJournals():
+            print('%s compacted' % day)
+        exit(0)
+
+    store = perfdatastore.PerfdataStore()
+    series = store.series(hostName, serviceDescription, metricName)
+    if listSeries:
+        for seriesId, host, service, label, unit in series:
+            print('%s\t%s\t%s\t%s' % (host, service, label, unit))
+        exit(0)
+
+    names = dict((seriesId, (host, service, label, unit)) for seriesId, host, service, label, unit in series)
+    for seriesId, samples in sorted(store.samples(names.keys(), queryDay or strftime('%Y%m%d', gmtime(time()))).items()):
+        host, service, label, unit = names[seriesId]
+        for timestamp, value in samples:
+            print('%i\t%s\t%s\t%s\t%r%s' % (timestamp, host, service, label, value, unit))
@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+# snmptrapd trap handler: looks up the trap OID in the compiled trap index (trapindex.py) and
+# submits the formatted trap as passive result of the agent's Nagios host
+from sys                import exit, argv, stdin
+from getopt             import getopt
+from time               import time
+import trapindex
+
+pluginVersion           = "19.7"
+indexFile               = trapindex.indexFile
+commandFile             = '/var/lib/nagios/rw/nagios.cmd'
+serviceDescription      = 'SNMP Traps'
+outputFile              = None #print the passive result to this file instead of submitting it
+trapOidNames            = ['.1.3.6.1.6.3.1.1.4.1.0', 'SNMPv2-MIB::snmpTrapOID.0', 'snmpTrapOID.0']
+trapAddressNames        = ['.1.3.6.1.6.3.18.1.3.0', 'SNMP-COMMUNITY-MIB::snmpTrapAddress.0', 'snmpTrapAddress.0']
+appendedOidPrefixes     = ['.1.3.6.1.6.3.18.1.', '.1.3.6.1.6.3.1.1.4.', 'SNMP-COMMUNITY-MIB::', 'SNMPv2-MIB::snmpTrap']
+severityStates          = {'INFORMATIONAL': 0, 'NORMAL': 0, 'MINOR': 1, 'MAJOR': 2, 'CRITICAL': 2}
+stateNames              = ['OK', 'WARNING', 'CRITICAL', 'UNKNOWN']
+
+def readTrap(lines):
+    """parses the snmptrapd traphandle input (host name, transport address, one "OID value" line per
+    variable), returns (agent address, trap OID, [values of the trap variables])"""
+    address = lines[1].strip() if len(lines) > 1 else ''
+    if '[' in address: #UDP: [10.0.0.1]:1029->[10.0.0.2]:162
+        address = address.split('[', 1)[1].split(']', 1)[0]
+    trapOid, values = None, []
+    for line in lines[2:]:
+        items = line.strip().split(None, 1)
+        if not items:
+            continue
+        value = items[1] if len(items) > 1 else ''
+        if ': ' in value and value.split(': ', 1)[0].replace('-', '').isalnum(): #STRING: "...", INTEGER: 5
+            value = value.split(': ', 1)[1]
+        if len(value) > 1 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        if items[0] in trapOidNames:
+            trapOid = value
+        elif items[0] in trapAddressNames: #agent address of SNMPv1 traps, the transport may be a proxy
+            address = value
+        elif trapOid is not None and not any(items[0].startswith(prefix) for prefix in appendedOidPrefixes):
+            values.append(value)
+    return address, trapOid, values
+
+def formatTrap(trapFormat, values):
+    """replaces $1..$n by the trap variables like SNMPTT, $* by all of them"""
+    result, position = [], 0
+    while True:
+        found = trapFormat.find('$', position)
+        if found < 0 or found + 1 >= len(trapFormat):
+            result.append(trapFormat[position:])
+            break
+        result.append(trapFormat[position:found])
+        end = found + 1
+        while end < len(trapFormat) and trapFormat[end].isdigit():
+            end += 1
+        if end > found + 1:
+            number = int(trapFormat[found + 1:end])
+            result.append(values[number - 1] if 0 < number <= len(values) else '')
+        elif trapFormat[end] == '*':
+            result.append(' '.join(values))
+            end += 1
+        else:
+            result.append('$')
+        position = end
+    return ''.join(result).replace('\\n', ' ')
+
+if __name__ == '__main__':
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVi:e:s:o:')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+Exasol SNMP trap handler (version %s)
+  Submits the ServerView traps received by snmptrapd as passive results of the agent's Nagios
+  host. The trap definitions must be compiled with trapindex.py first, e.g. in snmptrapd.conf:
+
+    traphandle default /opt/exasol/monitoring/exasol_traphandler.py
+
+  Unknown traps are submitted with state UNKNOWN, traps of unknown agents to a host named by
+  the agent address.
+
+  Options:
+    -h                      shows this help
+    -V                      shows the handler version
+    -i <index file>         (optional) compiled trap index (default: %s)
+    -e <command file>       (optional) Nagios external command file (default: %s)
+    -s <service>            (optional) service description of the passive check (default: %s)
+    -o <file>               (optional) append the results to this file instead ("-" for stdout)
+""" % (pluginVersion, indexFile, commandFile, serviceDescription))
+            exit(0)
+
+        elif parameter == '-V':
+            print("Exasol SNMP trap handler (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-i':
+            indexFile = value.strip()
+
+        elif parameter == '-e':
+            commandFile = value.strip()
+
+        elif parameter == '-s':
+            serviceDescription = value.strip()
+
+        elif parameter == '-o':
+            outputFile = value.strip()
+
+    received = time()
+    address, trapOid, values = readTrap(stdin.read().split('\n'))
+    if not trapOid:
+        exit(0)
+
+    try:
+        index = trapindex.TrapIndex(indexFile)
+    except (OSError, ValueError) as e:
+        print('trap index %s could not be read: %s' % (indexFile, e))
+        exit(3)
+    hostName = index.hostName(address) or address
+    trap = index.trap(trapOid)
+    index.close()
+
+    if trap is None:
+        returnCode, output = 3, 'unknown trap %s: %s' % (trapOid, ' '.join(values))
+    else:
+        trapName, severity, trapFormat = trap
+        returnCode = severityStates.get(severity.upper(), 3)
+        output = '%s: %s' % (trapName, formatTrap(trapFormat, values))
+    output = '%s - %s' % (stateNames[returnCode], output.replace('|', '!'))
+
+    if outputFile:
+        from nagioscommand import escapeOutput
+        result = '%s;%s;%i;%s' % (hostName, serviceDescription, returnCode, escapeOutput(output))
+        if outputFile == '-':
+            print(result)
+        else:
+            with open(outputFile, 'a') as f:
+                f.write(result + '\n')
+        exit(0)
+
+    from nagioscommand import submitToCommandFile
+    try:
+        submitToCommandFile([(hostName, serviceDescription, returnCode, output, received, received)], commandFile)
+    except OSError as e:
+        print('passive result could not be submitted: %s' % e)
+        exit(3)
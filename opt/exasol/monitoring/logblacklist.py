@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# compiled blacklist for the log service plugin
+import re
+from os.path            import isfile, getmtime
+from threading          import Lock
+
+regexPrefix             = 'regex:'
+
+compiledBlacklists      = {}
+compiledBlacklistsLock  = Lock()
+
+def literalPattern(words):
+    """builds one regular expression out of a trie of all words, so every message is scanned
+    once for all entries instead of once per entry"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != '']
+        if len(alternatives) == 0:
+            return ''
+        pattern = alternatives[0] if len(alternatives) == 1 else '(?:%s)' % '|'.join(alternatives)
+        if '' in node:
+            pattern = '(?:%s)?' % pattern
+        return pattern
+
+    return build(trie)
+
+def compileBlacklist(lines):
+    words = []
+    patterns = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith(regexPrefix):
+            patterns.append('(?:%s)' % line[len(regexPrefix):])
+        elif line != '':
+            words.append(line)
+    if len(words) > 0:
+        patterns.insert(0, literalPattern(words))
+    if len(patterns) == 0:
+        return None
+    return re.compile('|'.join(patterns))
+
+def Blacklist(fileName):
+    """returns the compiled blacklist of a file (a regular expression, use .search(message)) or None if
+    the file does not exist or is empty
+
+    Lines are plain substrings of unwanted messages, lines starting with "regex:" are regular
+    expressions. The compiled form is kept until the modification time of the file changes.
+    """
+    if not isfile(fileName):
+        return None
+    mtime = getmtime(fileName)
+    with compiledBlacklistsLock:
+        if fileName not in compiledBlacklists or compiledBlacklists[fileName][0] != mtime:
+            with open(fileName, 'r') as f:
+                compiledBlacklists[fileName] = (mtime, compileBlacklist(f))
+        return compiledBlacklists[fileName][1]
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+# passive check results for Nagios, shared by exasol_batch.py, check_cluster_health.py and
+# exasol_traphandler.py (kept apart from exasol_batch, so they don't import its check runner)
+
+def escapeOutput(output):
+    """the output of a passive result is a single line, line breaks are escaped like Nagios does"""
+    return output.strip().replace('\\', '\\\\').replace('\n', '\\n')
+
+def submitToCommandFile(results, fileName):
+    """writes (host, service, return code, output, started, finished) results as
+    PROCESS_SERVICE_CHECK_RESULT commands to the Nagios external command file"""
+    with open(fileName, 'a') as f:
+        for hostName, serviceDescription, returnCode, output, started, finished in results:
+            f.write('[%i] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%i;%s\n' % (
+                finished, hostName, serviceDescription, returnCode, escapeOutput(output)
+            ))
+            f.flush()
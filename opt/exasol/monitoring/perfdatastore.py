@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# columnar store of the performance data of the Exasol checks, fed by exasol_perfdata.py
+import re, struct
+from array              import array
+from bisect             import bisect_left
+from fcntl              import flock, LOCK_EX, LOCK_UN
+from os                 import open as openFile, close, write, pread, listdir, makedirs, replace, remove, getpid, O_WRONLY, O_APPEND, O_CREAT, O_RDONLY
+from os.path            import exists, join
+from time               import gmtime, strftime, time
+
+storeDirectory          = '/var/lib/nagios/exasol-perfdata'
+journalRecord           = struct.Struct('=IId') #series id, time, value
+segmentMagic            = b'EXP1'
+segmentHeader           = struct.Struct('=4sII') #magic, number of series, reserved
+segmentIndexEntry       = struct.Struct('=IQI') #series id, offset of the times after the index, number of samples
+
+perfdataPattern         = re.compile(r"('[^']+'|[^\s;=|']+)=([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)([a-zA-Z%/]*)")
+
+def parsePerfdata(perfdata):
+    """returns [(label, value, unit)] of a performance data string; ";" also separates values
+    (check_db_performance), threshold and range fields don't match"""
+    return [(label.strip("'"), float(value), unit) for label, value, unit in perfdataPattern.findall(perfdata)]
+
+def dayOf(timestamp):
+    return strftime('%Y%m%d', gmtime(timestamp))
+
+class PerfdataStore(object):
+    """one directory per store:
+
+    series.idx          "id<TAB>host<TAB>service<TAB>label<TAB>unit" of every series, the index by
+                        host and metric; ids are never reused
+    <day>.jnl           samples of the current day, appended in batches (16 bytes per sample)
+    <day>.seg           samples of a closed day, sorted by series with an index of the series; the
+                        samples of one series are two contiguous arrays (times, values)
+
+    Journals of the previous days are compacted into segments by compactJournals (daily from cron,
+    not by the ingest which runs under the perfdata timeout of Nagios), so a query for one metric
+    reads the segment index and two slices instead of the whole day.
+    """
+    def __init__(self, directory = None):
+        self.directory = directory or storeDirectory
+        self.dictionary = {} #(host, service, label) => id
+        self.units = {}
+        self.names = {} #id => (host, service, label)
+        self.loadDictionary()
+
+    def path(self, fileName):
+        return join(self.directory, fileName)
+
+    def loadDictionary(self):
+        if not exists(self.path('series.idx')):
+            return
+        with open(self.path('series.idx'), 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) == 5 and fields[0].isdigit():
+                    key = tuple(fields[1:4])
+                    self.dictionary[key] = int(fields[0])
+                    self.names[int(fields[0])] = key
+                    self.units[int(fields[0])] = fields[4]
+
+    def seriesId(self, key, unit, newSeries):
+        if key not in self.dictionary:
+            seriesId = len(self.names)
+            self.dictionary[key] = seriesId
+            self.names[seriesId] = key
+            self.units[seriesId] = unit
+            newSeries.append('%i\t%s\t%s\t%s\t%s\n' % ((seriesId,) + key + (unit,)))
+        return self.dictionary[key]
+
+    def locked(self, function, *arguments):
+        """runs function under the lock of the store"""
+        makedirs(self.directory, exist_ok=True)
+        lock = openFile(self.path('.lock'), O_WRONLY | O_CREAT, 0o644)
+        try:
+            flock(lock, LOCK_EX)
+            return function(*arguments)
+        finally:
+            flock(lock, LOCK_UN)
+            close(lock)
+
+    def ingest(self, samples):
+        """appends [(time, host, service, label, value, unit)] to the journals, one write per day"""
+        return self.locked(self.appendSamples, samples)
+
+    def appendSamples(self, samples):
+        self.loadDictionary() #another process may have added series
+        newSeries, journals = [], {}
+        for timestamp, hostName, serviceDescription, label, value, unit in samples:
+            seriesId = self.seriesId((hostName, serviceDescription, label), unit, newSeries)
+            journals.setdefault(dayOf(timestamp), bytearray()).extend(journalRecord.pack(seriesId, int(timestamp), value))
+        if newSeries: #the dictionary is written first, journals never refer to unknown ids
+            self.append('series.idx', ''.join(newSeries).encode('utf-8'))
+        for day, records in journals.items():
+            self.append(day + '.jnl', bytes(records))
+        return sum(len(records) for records in journals.values()) // journalRecord.size
+
+    def append(self, fileName, data):
+        fd = openFile(self.path(fileName), O_WRONLY | O_APPEND | O_CREAT, 0o644)
+        try:
+            write(fd, data)
+        finally:
+            close(fd)
+
+    def compactJournals(self, today = None):
+        """compacts the journals of the days before today into segments, returns the days"""
+        return self.locked(self.compactDays, today or dayOf(time()))
+
+    def compactDays(self, today):
+        days = [fileName[:-4] for fileName in sorted(listdir(self.directory)) if fileName.endswith('.jnl') and fileName[:-4] < today]
+        for day in days:
+            self.compact(day)
+        return days
+
+    def compact(self, day):
+        """merges the journal of a day into its segment and removes the journal"""
+        series = self.readSegment(day) if exists(self.path(day + '.seg')) else {}
+        for seriesId, samples in self.readJournal(day).items():
+            series.setdefault(seriesId, []).extend(samples)
+
+        index, data, offset = [], [], 0
+        for seriesId in sorted(series):
+            samples = sorted(series[seriesId])
+            times, values = array('I', [sample[0] for sample in samples]), array('d', [sample[1] for sample in samples])
+            index.append(segmentIndexEntry.pack(seriesId, offset, len(samples)))
+            data += [times.tobytes(), values.tobytes()]
+            offset += len(samples) * 12
+
+        tempFile = self.path('%s.seg.%i' % (day, getpid()))
+        with open(tempFile, 'wb') as f:
+            f.write(segmentHeader.pack(segmentMagic, len(index), 0))
+            f.write(b''.join(index))
+            f.write(b''.join(data))
+        replace(tempFile, self.path(day + '.seg'))
+        remove(self.path(day + '.jnl'))
+
+    def readJournal(self, day, seriesIds = None):
+        """returns {series id: [(time, value)]}, a partly written last record is ignored"""
+        series = {}
+        try:
+            with open(self.path(day + '.jnl'), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return series
+        data = data[:len(data) - len(data) % journalRecord.size]
+        for seriesId, timestamp, value in journalRecord.iter_unpack(data):
+            if seriesIds is None or seriesId in seriesIds:
+                series.setdefault(seriesId, []).append((timestamp, value))
+        return series
+
+    def readSegment(self, day, seriesIds = None):
+        """returns {series id: [(time, value)]} of a segment, only the requested series are read"""
+        series = {}
+        try:
+            fd = openFile(self.path(day + '.seg'), O_RDONLY)
+        except FileNotFoundError:
+            return series
+        try:
+            magic, count, reserved = segmentHeader.unpack(pread(fd, segmentHeader.size, 0))
+            if magic != segmentMagic:
+                raise ValueError('%s is not a performance data segment' % self.path(day + '.seg'))
+            entries = list(segmentIndexEntry.iter_unpack(pread(fd, count * segmentIndexEntry.size, segmentHeader.size)))
+            dataStart = segmentHeader.size + count * segmentIndexEntry.size
+            ids = [entry[0] for entry in entries]
+            for seriesId in (sorted(seriesIds) if seriesIds is not None else ids):
+                position = bisect_left(ids, seriesId)
+                if position == len(ids) or ids[position] != seriesId:
+                    continue
+                seriesId, offset, samples = entries[position]
+                block = pread(fd, samples * 12, dataStart + offset)
+                times, values = array('I'), array('d')
+                times.frombytes(block[:samples * 4])
+                values.frombytes(block[samples * 4:])
+                series[seriesId] = list(zip(times, values))
+        finally:
+            close(fd)
+        return series
+
+    def series(self, hostName = None, serviceDescription = None, label = None):
+        """returns [(id, host, service, label, unit)] of the matching series"""
+        return [(seriesId,) + key + (self.units[seriesId],) for key, seriesId in sorted(self.dictionary.items(), key=lambda item: item[1])
+                if (hostName is None or key[0] == hostName) and (serviceDescription is None or key[1] == serviceDescription) and (label is None or key[2] == label)]
+
+    def samples(self, seriesIds, day):
+        """returns {series id: [(time, value)]} of one day, from its segment and its journal"""
+        seriesIds = set(seriesIds)
+        series = self.readSegment(day, seriesIds)
+        for seriesId, samples in self.readJournal(day, seriesIds).items():
+            series[seriesId] = sorted(series.get(seriesId, []) + samples)
+        return series
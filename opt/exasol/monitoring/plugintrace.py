@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# optional timing of plugin phases (startup, TLS connects, XMLRPC calls, SQL statements, cache
+# lookups), reported as additional performance data and as JSON trace file
+from threading          import Lock, current_thread, local
+from time               import time
+
+activeTraces            = local() #trace of the check run executed by this thread
+
+class PluginTrace(object):
+    """timings of one check run, shared by all threads working for it"""
+    def __init__(self, started, traceFile = None):
+        self.started = started
+        self.traceFile = traceFile
+        self.lock = Lock()
+        self.events = [('startup', 'arguments', started, time() - started, current_thread().name)]
+        self.counters = {}
+
+    def record(self, category, name, started, duration):
+        with self.lock:
+            self.events.append((category, name, started, duration, current_thread().name))
+
+    def count(self, counter, increment = 1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + increment
+
+    def summary(self, category):
+        with self.lock:
+            durations = [event[3] for event in self.events if event[0] == category]
+        return len(durations), sum(durations)
+
+    def perfdata(self):
+        """time values are summed over all requests, parallel requests may take more time than the run"""
+        fields = ['plugin_time=%.3fs' % (time() - self.started), 'startup_time=%.3fs' % self.summary('startup')[1]]
+        for category, counter in [('rpc', 'rpc_calls'), ('tls', 'tls_connects'), ('sql', 'sql_calls')]:
+            count, duration = self.summary(category)
+            fields.append('%s=%i %s_time=%.3fs' % (counter, count, category, duration))
+        fields.append('cache_hits=%i cache_misses=%i' % (self.counters.get('cache_hits', 0), self.counters.get('cache_misses', 0)))
+        return ' '.join(fields)
+
+    def write(self, fileName):
+        import json
+        from os import replace, getpid
+        from threading import get_ident
+        with self.lock:
+            trace = {
+                'started':  self.started,
+                'duration': time() - self.started,
+                'counters': dict(self.counters),
+                'events':   [{'category': category, 'name': name, 'start': round(started - self.started, 6), 'duration': round(duration, 6), 'thread': thread}
+                            for category, name, started, duration, thread in self.events]
+            }
+        tempFile = '%s.%i.%i' % (fileName, getpid(), get_ident())
+        with open(tempFile, 'w') as f:
+            json.dump(trace, f, indent=1)
+        replace(tempFile, fileName)
+
+def currentTrace():
+    return getattr(activeTraces, 'trace', None)
+
+def beginRun():
+    """called by the exasol_monitord worker process before it executes a check"""
+    activeTraces.trace = None
+    activeTraces.started = time()
+
+def startTrace(perfdata = True, traceFile = None):
+    """starts the trace of the current check run, called by the plugins after parsing their options;
+    the results are printed (and written) when the plugin exits"""
+    import exasol_monitord
+    trace = PluginTrace(getattr(activeTraces, 'started', exasol_monitord.processStarted), traceFile)
+    trace.printPerfdata = perfdata
+    activeTraces.trace = trace
+    if not exasol_monitord.daemonMode: #inside the daemon finishTrace is called by its worker
+        import atexit
+        atexit.register(finishTrace)
+    return trace
+
+def finishTrace(printFunction = print):
+    """appends the timings as performance data of the long output ("| ..." is valid in any line)"""
+    trace = currentTrace()
+    activeTraces.trace = None
+    if trace is None:
+        return
+    if trace.printPerfdata:
+        printFunction('| ' + trace.perfdata())
+    if trace.traceFile:
+        try:
+            trace.write(trace.traceFile)
+        except OSError:
+            pass
+
+class timed(object):
+    """context manager which records the duration of a block in the trace of the current run"""
+    def __init__(self, category, name):
+        self.trace = currentTrace()
+        self.category = category
+        self.name = name
+
+    def __enter__(self):
+        self.started = time()
+        return self
+
+    def __exit__(self, *exception):
+        if self.trace is not None:
+            self.trace.record(self.category, self.name() if callable(self.name) else self.name, self.started, time() - self.started)
+        return False
+
+def count(counter, increment = 1):
+    trace = currentTrace()
+    if trace is not None:
+        trace.count(counter, increment)
+
+def inheritTrace(function):
+    """wraps a function which is executed by a worker thread, so its timings are recorded in the
+    trace of the calling check run"""
+    trace = currentTrace()
+    if trace is None:
+        return function
+
+    def run(*arguments, **options):
+        activeTraces.trace = trace
+        try:
+            return function(*arguments, **options)
+        finally:
+            activeTraces.trace = None
+    return run
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# file based cache for slow changing EXAoperation responses
+import json
+from copy               import deepcopy
+from fcntl              import flock, LOCK_EX, LOCK_UN
+from os                 import getpid, replace
+from os.path            import getmtime, join
+from threading          import Lock
+from time               import time
+from urllib.parse       import quote_plus
+from cachedirectory     import cacheDirectory
+
+cacheVersion            = 1
+maxEntries              = 4096 #per cache file, the oldest entries are evicted first
+
+responseCaches          = {}
+responseCachesLock      = Lock()
+
+class ResponseCache(object):
+    """all cached responses of one license server and user, stored in one JSON file
+
+    Reading needs no lock because the file is always replaced atomically. Updates are merged into
+    the current file content under an exclusive lock, so parallel plugin runs don't lose entries.
+    """
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.entries = {}
+        self.mtime = None
+        self.lock = Lock()
+
+    @staticmethod
+    def key(urlPath, methodName, arguments):
+        return json.dumps([urlPath, methodName, list(arguments)], separators=(',',':'))
+
+    @staticmethod
+    def methodName(key):
+        return json.loads(key)[1]
+
+    def keys(self):
+        """returns the keys of all cached responses"""
+        with self.lock:
+            self.load()
+            return list(self.entries)
+
+    def load(self):
+        """reads the cache file again if another process has replaced it"""
+        try:
+            mtime = getmtime(self.fileName)
+        except OSError:
+            self.entries, self.mtime = {}, None
+            return
+        if mtime != self.mtime:
+            try:
+                with open(self.fileName, 'r') as f:
+                    cache = json.load(f)
+                self.entries = cache['entries'] if cache['version'] == cacheVersion else {}
+            except (ValueError, KeyError, TypeError): #unreadable or written by an older plugin version
+                self.entries = {}
+            self.mtime = mtime
+
+    def get(self, key):
+        """returns (value, time of the request) or None"""
+        with self.lock:
+            self.load()
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            return deepcopy(entry['value']), entry['fetched']
+
+    def update(self, values = {}, removed = [], fetched = None):
+        """stores {key: value} and removes the keys of removed"""
+        fetched = fetched or time()
+        entries = {}
+        for key, value in values.items():
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError): #e.g. xmlrpc DateTime objects are not cached
+                continue
+            entries[key] = {'value': value, 'fetched': fetched}
+
+        with self.lock, open(self.fileName + '.lock', 'a') as lockFile:
+            flock(lockFile, LOCK_EX)
+            try:
+                self.load()
+                self.entries.update(entries)
+                for key in removed:
+                    self.entries.pop(key, None)
+                if len(self.entries) > maxEntries:
+                    for key in sorted(self.entries, key=lambda key: self.entries[key]['fetched'])[:len(self.entries) - maxEntries]:
+                        del self.entries[key]
+
+                tempFile = '%s.%i' % (self.fileName, getpid())
+                with open(tempFile, 'w') as f:
+                    json.dump({'version': cacheVersion, 'entries': self.entries}, f, separators=(',',':'))
+                replace(tempFile, self.fileName)
+                self.mtime = getmtime(self.fileName)
+            finally:
+                flock(lockFile, LOCK_UN)
+
+def ResponseCacheFile(hostName, userName):
+    """returns the response cache of a license server and user"""
+    fileName = join(cacheDirectory, 'exaoperation_%s_%s.cache' % (quote_plus(hostName), quote_plus(userName)))
+    with responseCachesLock:
+        if fileName not in responseCaches:
+            responseCaches[fileName] = ResponseCache(fileName)
+        return responseCaches[fileName]
@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+# topology snapshot of a cluster: nodes, databases, volumes with their segment placement and the
+# storage partitions of the nodes, built once and shared by all checks of the cluster
+import json
+from fcntl              import flock, LOCK_EX, LOCK_UN
+from hashlib            import sha1
+from os                 import getpid, replace
+from os.path            import getmtime, join
+from threading          import Lock, Thread
+from time               import time
+from urllib.parse       import quote_plus
+from cachedirectory     import cacheDirectory
+
+topologyVersion         = 2 #format of the snapshot files
+refreshInterval         = 600 #seconds until a snapshot is refreshed in the background
+maxAge                  = 86400 #seconds an old snapshot may be used if EXAoperation does not answer
+revalidateTimeout       = 10 #seconds to wait for a background refresh before the old snapshot is used
+
+loadedSnapshots         = {} #file name => (mtime, snapshot)
+loadedSnapshotsLock     = Lock()
+
+def TopologyFileName(hostName, userName):
+    return join(cacheDirectory, 'exasol_topology_%s_%s.json' % (quote_plus(hostName), quote_plus(userName)))
+
+def fingerprint(snapshot):
+    content = dict((key, value) for key, value in snapshot.items() if key not in ['generation', 'fetched', 'fingerprint'])
+    return sha1(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+def buildTopology(userName, password, hostName, maxWorkers = 8):
+    """queries the topology from EXAoperation: one call for the nodes, databases and volumes each,
+    then the details of all databases and volumes (batched) and the partitions of the storage nodes
+
+    Node and database lists, volume details and partitions are taken from the response cache while
+    their cacheTimes allow it; the volume list and the database details are always queried.
+    """
+    from exaoperation import XmlRpcSession, XmlRpcParallel, XmlRpcCached, XmlRpcCachedBatch, XmlRpcCachedParallel
+    storage = XmlRpcSession(userName, password, hostName, '/storage')
+    nodes = XmlRpcCached(userName, password, hostName, '/', 'getNodeList')
+    databaseNames = XmlRpcCached(userName, password, hostName, '/', 'getDatabaseList')
+    databaseInfos = XmlRpcParallel(userName, password, hostName, [('/db_' + quote_plus(name), 'getDatabaseInfo', ()) for name in databaseNames], maxWorkers)
+
+    #data volumes and the volumes of the databases; archive volumes are not part of the snapshot
+    databaseVolumes = set(info[key] for info in databaseInfos for key in ['persistent volume', 'temporary volume'])
+    volumeList = sorted(storage.getVolumeList())
+    volumeNames = [volume for volume in volumeList if volume.startswith('v') or volume in databaseVolumes]
+    volumeInfos = XmlRpcCachedBatch(userName, password, hostName, '/storage', 'getVolumeInfo', [(name,) for name in volumeNames], maxWorkers)
+    volumes = dict((name, {
+            'size':         info['size'],
+            'redundancy':   info['redundancy'],
+            'segments':     info['segments'],
+            'disk':         info['disk']
+        }) for name, info in zip(volumeNames, volumeInfos))
+
+    storageNodes = sorted(set(node for volume in volumes.values() for layer in volume['segments'] for node in layer))
+    diskStates = XmlRpcCachedParallel(userName, password, hostName, [('/' + node, 'getDiskStates', ()) for node in storageNodes], maxWorkers)
+    return {
+        'version':      topologyVersion,
+        'nodes':        nodes,
+        'databases':    dict((name, {
+                'persistent volume':    info['persistent volume'],
+                'temporary volume':     info['temporary volume'],
+                'nodes':                info['nodes']['active']
+            }) for name, info in zip(databaseNames, databaseInfos)),
+        'volume list':  volumeList, #all volumes, a check compares it to tell if the snapshot is outdated
+        'volumes':      volumes,
+        'partitions':   dict((node, dict((partition['name'], float(partition['size'])) for partition in partitions))
+                for node, partitions in zip(storageNodes, diskStates))
+    }
+
+def loadTopology(fileName):
+    """returns the stored snapshot or None, a file is only parsed again after it was replaced"""
+    try:
+        mtime = getmtime(fileName)
+    except OSError:
+        return None
+    with loadedSnapshotsLock:
+        if fileName in loadedSnapshots and loadedSnapshots[fileName][0] == mtime:
+            return loadedSnapshots[fileName][1]
+    try:
+        with open(fileName, 'r') as f:
+            snapshot = json.load(f)
+        if snapshot.get('version') != topologyVersion:
+            return None
+    except (OSError, ValueError, AttributeError):
+        return None
+    with loadedSnapshotsLock:
+        loadedSnapshots[fileName] = (mtime, snapshot)
+    return snapshot
+
+def refreshTopology(userName, password, hostName, maxWorkers = 8, newerThan = None):
+    """builds and stores a new snapshot; if another process has stored one after newerThan while
+    this one waited for the lock, that one is returned instead of querying EXAoperation again"""
+    fileName = TopologyFileName(hostName, userName)
+    try:
+        lockFile = open(fileName + '.lock', 'a')
+    except OSError: #e.g. created by another user: a cache miss, the snapshot is built but not stored
+        return newSnapshot(userName, password, hostName, maxWorkers, loadTopology(fileName))
+    with lockFile:
+        flock(lockFile, LOCK_EX)
+        try:
+            previous = loadTopology(fileName)
+            if previous is not None and newerThan is not None and previous['fetched'] > newerThan:
+                return previous
+            snapshot = newSnapshot(userName, password, hostName, maxWorkers, previous)
+            tempFile = '%s.%i' % (fileName, getpid())
+            try:
+                with open(tempFile, 'w') as f:
+                    json.dump(snapshot, f, separators=(',',':'))
+                replace(tempFile, fileName)
+            except OSError: #not writable, the next check builds the snapshot again
+                pass
+            return snapshot
+        finally:
+            flock(lockFile, LOCK_UN)
+
+def newSnapshot(userName, password, hostName, maxWorkers, previous):
+    """builds a snapshot, its generation is increased if it differs from the previous one"""
+    snapshot = buildTopology(userName, password, hostName, maxWorkers)
+    snapshot['fetched'] = time()
+    snapshot['fingerprint'] = fingerprint(snapshot)
+    snapshot['generation'] = (previous or {}).get('generation', 0)
+    if previous is None or previous.get('fingerprint') != snapshot['fingerprint']:
+        snapshot['generation'] += 1 #the topology has changed
+    return snapshot
+
+def Topology(userName, password, hostName, maxWorkers = 8, refresh = False):
+    """returns the topology snapshot of a cluster
+
+    A missing or very old snapshot is built before returning, refresh = True forces this (e.g.
+    the volume list of the cluster differs from the snapshot) and drops the cached responses it is
+    built from, so nothing of the outdated topology is reused. A snapshot older than refreshInterval is
+    refreshed in the background; if that does not finish within revalidateTimeout seconds or
+    fails, the old snapshot is used.
+    """
+    from exaoperation import releaseSessions, invalidateCachedMethods, topologyMethods
+    from plugintrace import inheritTrace
+    requested = time()
+    if refresh:
+        invalidateCachedMethods(userName, hostName, topologyMethods)
+    snapshot = loadTopology(TopologyFileName(hostName, userName))
+    if snapshot is None or refresh or requested - snapshot['fetched'] >= maxAge:
+        return refreshTopology(userName, password, hostName, maxWorkers, None if refresh or snapshot is None else requested)
+    if requested - snapshot['fetched'] < refreshInterval:
+        return snapshot
+
+    refreshed = {}
+    def run():
+        try:
+            refreshed['snapshot'] = refreshTopology(userName, password, hostName, maxWorkers, snapshot['fetched'])
+        except Exception:
+            pass
+        finally:
+            releaseSessions()
+
+    worker = Thread(target=inheritTrace(run), daemon=True)
+    worker.start()
+    worker.join(revalidateTimeout)
+    return refreshed.get('snapshot', snapshot)
+
+if __name__ == '__main__':
+    from sys import exit, argv
+    from getopt import getopt
+    pluginVersion = "19.7"
+    hostName, userName, password, maxParallelCalls, forceRefresh = None, None, None, 8, False
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVH:u:p:n:r')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            print("""
+EXAoperation topology snapshot (version %s)
+  Prints the topology snapshot of a cluster as JSON, it is built if it does not exist yet.
+
+  Options:
+    -h                      shows this help
+    -V                      shows the version
+    -H <license server>     domain of IP of your license server
+    -u <user login>         EXAoperation login user
+    -p <password>           EXAoperation login password, "-" reads it from the first line of stdin
+                            (a password on the command line is visible to all users in the process list)
+    -n <parallel calls>     (optional) maximum number of parallel requests (default: %i)
+    -r                      (optional) build a new snapshot
+""" % (pluginVersion, maxParallelCalls))
+            exit(0)
+
+        elif parameter == '-V':
+            print("EXAoperation topology snapshot (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-H':
+            hostName = value.strip()
+
+        elif parameter == '-u':
+            userName = value.strip()
+
+        elif parameter == '-p':
+            password = value.strip()
+            if password == '-':
+                from sys import stdin
+                password = stdin.readline().rstrip('\n')
+
+        elif parameter == '-n':
+            if not (value.strip().isdigit() and int(value) > 0):
+                print('number of parallel calls must be a positive integer number')
+                exit(4)
+            maxParallelCalls = int(value)
+
+        elif parameter == '-r':
+            forceRefresh = True
+
+    if not (hostName and userName and password):
+        print('Please define at least the following parameters: -H -u -p')
+        exit(4)
+
+    try:
+        print(json.dumps(Topology(userName, password, hostName, maxParallelCalls, forceRefresh), sort_keys=True))
+    except Exception as e:
+        print('topology of %s could not be read: %s' % (hostName, str(e).replace('%s:%s@%s' % (userName, password, hostName), hostName)))
+        exit(3)
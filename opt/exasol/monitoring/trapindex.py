@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+# compiles the ServerView trap definitions (TRAPNAME/TRAPOID/SEVERITY/TTFORMAT blocks) into a hash
+# table file keyed by trap OID, which the trap handler reads with mmap instead of parsing them
+import struct
+from glob               import glob
+from os                 import replace, getpid
+from sys                import exit, argv
+from zlib               import crc32
+
+pluginVersion           = "19.7"
+trapDefinitions         = '/opt/fujitsu/ServerViewSuite/nagios/trap/trapconf/*/*.cfg'
+indexFile               = '/var/cache/nagios/exasol_traps.index'
+indexMagic              = b'EXTRAPS2'
+indexHeader             = struct.Struct('=8sII') #magic, number of slots (power of two), offset of the records
+indexSlot               = struct.Struct('=I') #offset of a record, emptySlot if unused
+recordHeader            = struct.Struct('=I') #length of the NUL separated key and fields
+emptySlot               = 0xFFFFFFFF
+hostKeyPrefix           = 'host:' #records mapping an address to its Nagios host name
+
+def readTrapDefinitions(fileName):
+    """returns a list of {'TRAPNAME', 'TRAPOID', 'SEVERITY', 'TTFORMAT', ...} of a trap definition file"""
+    traps, current = [], {}
+    with open(fileName, 'r', encoding='latin-1') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if line.startswith('#'):
+                continue
+            if line.strip() == '':
+                if 'TRAPOID' in current:
+                    traps.append(current)
+                current = {}
+                continue
+            items = line.split(None, 1)
+            current[items[0]] = items[1].strip() if len(items) > 1 else ''
+    if 'TRAPOID' in current:
+        traps.append(current)
+    return traps
+
+def compileIndex(records, fileName):
+    """writes {key: [fields]} as open addressing hash table; a record is the length of the NUL
+    separated key and fields followed by them, so a lookup reads one slot and one record per probe"""
+    slots = 1
+    while slots < 2 * max(len(records), 1):
+        slots *= 2
+    table = [emptySlot] * slots
+    data = []
+    offset = indexHeader.size + slots * indexSlot.size
+    for key, fields in records.items():
+        record = '\0'.join([key] + fields).encode('utf-8')
+        record = recordHeader.pack(len(record)) + record
+        slot = crc32(key.encode('utf-8')) & (slots - 1)
+        while table[slot] != emptySlot:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = offset
+        data.append(record)
+        offset += len(record)
+
+    tempFile = '%s.%i' % (fileName, getpid())
+    with open(tempFile, 'wb') as f:
+        f.write(indexHeader.pack(indexMagic, slots, indexHeader.size + slots * indexSlot.size))
+        f.write(b''.join(indexSlot.pack(slot) for slot in table))
+        f.write(b''.join(data))
+    replace(tempFile, fileName)
+
+class TrapIndex(object):
+    """read only access to a compiled index, the lookup time does not depend on the number of traps"""
+    def __init__(self, fileName):
+        from mmap import mmap, ACCESS_READ
+        with open(fileName, 'rb') as f:
+            self.data = mmap(f.fileno(), 0, access=ACCESS_READ)
+        magic, self.slots, self.recordsOffset = indexHeader.unpack_from(self.data, 0)
+        if magic != indexMagic:
+            raise ValueError('%s is not a trap index, please compile it again' % fileName)
+
+    def get(self, key):
+        """returns the fields stored for key or None"""
+        encodedKey = key.encode('utf-8')
+        slot = crc32(encodedKey) & (self.slots - 1)
+        while True:
+            offset = indexSlot.unpack_from(self.data, indexHeader.size + slot * indexSlot.size)[0]
+            if offset == emptySlot:
+                return None
+            length = recordHeader.unpack_from(self.data, offset)[0]
+            record = self.data[offset + recordHeader.size:offset + recordHeader.size + length]
+            if record[:len(encodedKey) + 1] == encodedKey + b'\0':
+                return record.decode('utf-8').split('\0')[1:]
+            slot = (slot + 1) & (self.slots - 1)
+
+    def trap(self, trapOid):
+        """returns (trap name, severity, format) of a trap OID or None"""
+        fields = self.get(trapOid if trapOid.startswith('.') else '.' + trapOid)
+        return tuple(fields[:3]) if fields else None
+
+    def hostName(self, address):
+        fields = self.get(hostKeyPrefix + address)
+        return fields[0] if fields else None
+
+    def close(self):
+        self.data.close()
+
+def nagiosHosts():
+    """returns {address: host name} of the Nagios configuration, the trap handler submits the
+    results of an agent to its host"""
+    import exasol_batch
+    objects = exasol_batch.readObjects(sorted(glob(exasol_batch.definitionFiles)) + sorted(glob(exasol_batch.configFiles)))
+    return dict((host['address'], host['host_name']) for host in exasol_batch.resolveObjects(objects.get('host', []))
+            if 'address' in host and 'host_name' in host)
+
+if __name__ == '__main__':
+    from getopt import getopt
+    withHosts = True
+    opts, args = None, None
+    try:
+        opts, args = getopt(argv[1:], 'hVt:o:c:n')
+
+    except:
+        print("Unknown parameter(s): %s" % argv[1:])
+        opts = []
+        opts.append(['-h', None])
+
+    for opt in opts:
+        parameter = opt[0]
+        value     = opt[1]
+
+        if parameter == '-h':
+            import exasol_batch
+            print("""
+Trap index compiler (version %s)
+  Compiles the trap definitions and the addresses of the Nagios hosts into the index used by
+  exasol_traphandler.py. Run it again after changing the definitions or adding a cluster.
+
+  Options:
+    -h                      shows this help
+    -V                      shows the version
+    -t <definition files>   (optional) trap definition files (default: %s)
+    -o <index file>         (optional) index file (default: %s)
+    -c <config files>       (optional) Nagios host configuration files (default: %s)
+    -n                      (optional) don't add the Nagios hosts, traps are submitted to the agent address
+""" % (pluginVersion, trapDefinitions, indexFile, exasol_batch.configFiles))
+            exit(0)
+
+        elif parameter == '-V':
+            print("Trap index compiler (version %s)" % pluginVersion)
+            exit(0)
+
+        elif parameter == '-t':
+            trapDefinitions = value.strip()
+
+        elif parameter == '-o':
+            indexFile = value.strip()
+
+        elif parameter == '-c':
+            import exasol_batch
+            exasol_batch.configFiles = value.strip()
+
+        elif parameter == '-n':
+            withHosts = False
+
+    records = {}
+    duplicates = 0
+    fileNames = sorted(glob(trapDefinitions))
+    for fileName in fileNames:
+        for trap in readTrapDefinitions(fileName):
+            if trap['TRAPOID'] in records:
+                duplicates += 1
+                continue
+            records[trap['TRAPOID']] = [trap.get('TRAPNAME', ''), trap.get('SEVERITY', ''), trap.get('TTFORMAT', trap.get('SUMMARY', ''))]
+    traps = len(records)
+    hosts = nagiosHosts() if withHosts else {}
+    for address, hostName in hosts.items():
+        records[hostKeyPrefix + address] = [hostName]
+
+    compileIndex(records, indexFile)
+    print('%i traps of %i files and %i hosts written to %s%s' % (traps, len(fileNames), len(hosts), indexFile,
+            ' (%i duplicate trap OIDs ignored)' % duplicates if duplicates else ''))
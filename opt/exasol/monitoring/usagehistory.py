@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# fixed size ring file of (time, value) samples with a linear forecast, used for trend thresholds
+import struct
+from array              import array
+from fcntl              import flock, LOCK_EX, LOCK_UN
+from os                 import open as openFile, close, fstat, pread, pwrite, ftruncate, O_RDWR, O_CREAT
+from os.path            import join
+from urllib.parse       import quote_plus
+from cachedirectory     import cacheDirectory
+
+historyMagic            = b'EXH1'
+historyHeader           = struct.Struct('=4sII') #magic, capacity, index of the next sample
+defaultCapacity         = 4096 #samples, 14 days with one sample every five minutes
+minSampleInterval       = 60.0 #seconds, more frequent check runs don't add samples
+
+class UsageHistory(object):
+    """ring buffer of (time, value) pairs in a file of constant size
+
+    The file holds a small header and capacity pairs of doubles; a new sample overwrites the oldest
+    one in place, so a check run writes 16 bytes instead of rewriting the history. All access is
+    serialized by an exclusive lock on the file.
+    """
+    def __init__(self, fileName, capacity = defaultCapacity):
+        self.fileName = fileName
+        self.capacity = capacity
+
+    def add(self, timestamp, value):
+        """stores a sample and returns all samples in time order, including the new one"""
+        fd = openFile(self.fileName, O_RDWR | O_CREAT, 0o644)
+        try:
+            flock(fd, LOCK_EX)
+            size = historyHeader.size + self.capacity * 16
+            header = pread(fd, historyHeader.size, 0)
+            if fstat(fd).st_size != size or len(header) != historyHeader.size or historyHeader.unpack(header)[:2] != (historyMagic, self.capacity):
+                #new file, other capacity or unreadable: start with an empty history
+                ftruncate(fd, 0)
+                ftruncate(fd, size)
+                nextIndex = 0
+            else:
+                nextIndex = historyHeader.unpack(header)[2] % self.capacity
+
+            values = array('d')
+            values.frombytes(pread(fd, self.capacity * 16, historyHeader.size))
+            lastIndex = (nextIndex - 1) % self.capacity
+            if values[2 * lastIndex] == 0.0 or timestamp - values[2 * lastIndex] >= minSampleInterval:
+                values[2 * nextIndex], values[2 * nextIndex + 1] = timestamp, value
+                pwrite(fd, values[2 * nextIndex:2 * nextIndex + 2].tobytes(), historyHeader.size + nextIndex * 16)
+                pwrite(fd, historyHeader.pack(historyMagic, self.capacity, (nextIndex + 1) % self.capacity), 0)
+        finally:
+            flock(fd, LOCK_UN)
+            close(fd)
+
+        return sorted((values[i], values[i + 1]) for i in range(0, len(values), 2) if values[i] > 0.0)
+
+def UsageHistoryFile(hostName, name, capacity = defaultCapacity):
+    """returns the usage history of an object (e.g. a database) of a license server"""
+    return UsageHistory(join(cacheDirectory, 'exasol_history_%s_%s.ring' % (quote_plus(hostName), quote_plus(name))), capacity)
+
+def linearForecast(samples, limit):
+    """fits a line through the samples (least squares), returns the seconds after the last sample
+    until the line reaches limit, or None if there are less than two samples or the values don't
+    move towards limit"""
+    if len(samples) < 2:
+        return None
+    count = float(len(samples))
+    meanTime = sum(timestamp for timestamp, value in samples) / count #centered, timestamps are large numbers
+    meanValue = sum(value for timestamp, value in samples) / count
+    variance = sum((timestamp - meanTime) ** 2 for timestamp, value in samples)
+    if variance == 0.0:
+        return None
+    slope = sum((timestamp - meanTime) * (value - meanValue) for timestamp, value in samples) / variance
+    current = meanValue + slope * (samples[-1][0] - meanTime)
+    if slope == 0.0 or (limit - current) / slope < 0.0:
+        return None
+    return (limit - current) / slope
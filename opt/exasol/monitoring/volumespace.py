@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# free space of the storage partition per node for check_db_diskspace.py, computed on lists
+# indexed by node, so every volume is subtracted in one pass over its segments; a NumPy scatter-add
+# (bincount) was measured slower than this on 200 nodes with 10 to 1000 volumes, because the node
+# names have to be converted to indices element by element anyway, and importing NumPy alone takes
+# longer than the whole computation (see benchmark/benchmark_volumespace.py)
+
+def segmentNodes(volumeInfo, layers = None):
+    """returns the nodes of all segments of a volume, of its first layers or all redundancy layers"""
+    nodes = []
+    for layer in volumeInfo['segments'][:volumeInfo['redundancy'] if layers is None else layers]:
+        nodes += layer
+    return nodes
+
+def freeSpace(partitionSizes, segments):
+    """returns (sorted nodes, free space per node, segments of the first entry per node) of the
+    storage partitions {node: size} after subtracting [(segment nodes, size per segment)]; the
+    first entry is the database volume, whose usage per node depends on its segments there;
+    segments on other nodes are ignored"""
+    nodes = sorted(partitionSizes)
+    position = dict((node, i) for i, node in enumerate(nodes))
+    used = [0.0] * len(nodes)
+    firstSegments = [0] * len(nodes)
+    for entry, (placement, size) in enumerate(segments):
+        for node in placement:
+            i = position.get(node)
+            if i is not None:
+                used[i] += size
+                if entry == 0:
+                    firstSegments[i] += 1
+    return nodes, [partitionSizes[node] - size for node, size in zip(nodes, used)], firstSegments
+
+def smallest(values):
+    """returns the position of the smallest value"""
+    return min(range(len(values)), key=values.__getitem__)
+
+def percentiles(values, percents):
+    """returns the percentiles of the values, linearly interpolated like numpy.percentile"""
+    values = sorted(values)
+    result = []
+    for percent in percents:
+        rank = (len(values) - 1) * percent / 100.0
+        lower = int(rank)
+        upper = min(lower + 1, len(values) - 1)
+        result.append(values[lower] + (values[upper] - values[lower]) * (rank - lower))
+    return result
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# adaptive check intervals of exasol_batch.py (adaptiveschedule.py)
+import unittest
+from os.path            import dirname, realpath, join
+from sys                import path
+from tempfile           import TemporaryDirectory
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+from adaptiveschedule   import thresholdValues, headroom, approaching, AdaptiveSchedule, minInterval, maxInterval
+
+diskCheck               = ('cluster1', 'DB db1 disk space', 'check_db_diskspace.py', [])
+nodesCheck              = ('cluster1', 'Nodes', 'check_nodes.py', [])
+
+def diskOutput(usage):
+    return 'OK - Disk space usage of db1 = %.1f%% |usage_percent=%.1f%%;80.0;90.0 usage=82.0GiB\n' % (usage, usage)
+
+class ThresholdValuesTest(unittest.TestCase):
+    def testOnlyValuesWithWarningThreshold(self):
+        output = 'OK - text | load=2.5;cpu=21.0%;4;8\nlong output\n| temp=5.2%;60.0;80.0 hours=U;;\n'
+        self.assertEqual(thresholdValues(output), {'cpu': (21.0, 4.0), 'temp': (5.2, 60.0)})
+
+    def testNoPerformanceData(self):
+        self.assertEqual(thresholdValues('CRITICAL - 7 nodes online\nn0018: Suspended\n'), {})
+
+class HeadroomTest(unittest.TestCase):
+    def testUpperLimit(self):
+        self.assertAlmostEqual(headroom({'a': (20.0, 80.0), 'b': (60.0, 80.0)}, 0), 0.75)
+
+    def testLowerLimitOfAnOkResult(self):
+        self.assertAlmostEqual(headroom({'hours_to_full': (96.0, 24.0)}, 0), 0.25)
+        self.assertAlmostEqual(headroom({'hours_to_full': (96.0, 24.0)}, 1), 4.0)
+
+    def testValuesWithoutUsableThreshold(self):
+        self.assertIsNone(headroom({'a': (20.0, 0.0), 'b': (-1.0, 80.0)}, 0))
+
+class ApproachingTest(unittest.TestCase):
+    def testReachesTheThresholdWithinTheHorizon(self):
+        self.assertTrue(approaching({'a': (70.0, 80.0)}, {'a': (60.0, 80.0)}, 600.0, 600.0))
+        self.assertFalse(approaching({'a': (70.0, 80.0)}, {'a': (60.0, 80.0)}, 600.0, 300.0))
+
+    def testMovingAwayOrUnknown(self):
+        self.assertFalse(approaching({'a': (60.0, 80.0)}, {'a': (70.0, 80.0)}, 600.0, 3600.0))
+        self.assertFalse(approaching({'a': (70.0, 80.0)}, {}, 600.0, 3600.0))
+        self.assertFalse(approaching({'a': (70.0, 80.0)}, {'a': (60.0, 80.0)}, 0.0, 3600.0))
+
+class AdaptiveScheduleTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.fileName = join(self.directory.name, 'schedule.json')
+        self.schedule = AdaptiveSchedule(self.fileName)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def intervals(self, results, started = 1000000.0):
+        intervals = []
+        for returnCode, output in results:
+            intervals.append(self.schedule.update(diskCheck, returnCode, output, started))
+            started += intervals[-1]
+        return intervals
+
+    def testStableChecksAreRunLessOften(self):
+        intervals = self.intervals([(0, diskOutput(10.0))] * 7)
+        self.assertEqual(intervals, [minInterval, 2 * minInterval, 4 * minInterval, 8 * minInterval, maxInterval, maxInterval, maxInterval])
+
+    def testChangedStateOrCloseValuesAreRunEveryTime(self):
+        self.assertEqual(self.intervals([(0, diskOutput(10.0))] * 3 + [(1, diskOutput(85.0)), (0, diskOutput(10.0))])[-2:], [minInterval, minInterval])
+        self.assertEqual(self.intervals([(0, diskOutput(70.0))]), [minInterval])
+
+    def testIntervalIsKeptBetweenTheRatios(self):
+        self.assertEqual(self.intervals([(0, diskOutput(39.0))] * 3 + [(0, diskOutput(41.0))])[-1], 4 * minInterval)
+
+    def testFastGrowthIsRunEveryTime(self):
+        self.assertEqual(self.intervals([(0, diskOutput(10.0))] * 3 + [(0, diskOutput(35.0))])[-1], minInterval)
+
+    def testDueChecks(self):
+        self.schedule.update(diskCheck, 0, diskOutput(10.0), 1000000.0)
+        self.schedule.checks[AdaptiveSchedule.key(diskCheck)]['nextRun'] = 1000000.0 + 600.0
+        self.assertEqual(self.schedule.due([diskCheck, nodesCheck], 1000000.0 + 120.0), [nodesCheck])
+        self.assertEqual(self.schedule.due([diskCheck, nodesCheck], 1000000.0 + 560.0), [diskCheck, nodesCheck])
+
+    def testSaveDropsRemovedChecks(self):
+        self.schedule.update(diskCheck, 0, diskOutput(10.0), 1000000.0)
+        self.schedule.update(nodesCheck, 2, 'CRITICAL - 7 nodes online', 1000000.0)
+        self.schedule.save([nodesCheck])
+        self.assertEqual(list(AdaptiveSchedule(self.fileName).checks), [AdaptiveSchedule.key(nodesCheck)])
+
+    def testUnreadableFile(self):
+        with open(self.fileName, 'w') as f:
+            f.write('{"version": 1')
+        self.assertEqual(AdaptiveSchedule(self.fileName).checks, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# transaction conflict output of check_db_performance.py (blockergraph.py)
+import unittest
+from os.path            import dirname, realpath, join
+from sys                import path
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+from blockergraph       import blockerGraph
+
+def conflictRows(blockers, totalBlockers = None):
+    """rows as returned by the conflict statement: (session, waiting, max. waited, blocked by) plus
+    the totals over all blocking sessions"""
+    conflicts = sum(row[1] for row in blockers)
+    maxDuration = max(row[2] for row in blockers)
+    return [list(row) + [conflicts, maxDuration, totalBlockers or len(blockers)] for row in blockers]
+
+class BlockerGraphTest(unittest.TestCase):
+    def testOneBlocker(self):
+        self.assertEqual(blockerGraph(conflictRows([(101, 3, 42, None)])),
+                'transaction conflict: session 101 blocks 3 sessions (3 directly) - max duration: 42 seconds\n')
+
+    def testWaitingSessionsAreAddedToTheRootBlocker(self):
+        #102 waits for 101, 103 waits for 102: 101 blocks its own and all their waiting sessions
+        lines = blockerGraph(conflictRows([(101, 1, 60, None), (102, 2, 50, 101), (103, 4, 10, 102)])).splitlines()
+        self.assertEqual(lines, [
+                'transaction conflict: session 101 blocks 7 sessions (1 directly) - max duration: 60 seconds',
+                'transaction conflict: session 102 waiting for 101 blocks 6 sessions (2 directly) - max duration: 50 seconds',
+                'transaction conflict: session 103 waiting for 102 blocks 4 sessions (4 directly) - max duration: 10 seconds'])
+
+    def testRootBlockersFirstThenByBlockedSessions(self):
+        lines = blockerGraph(conflictRows([(101, 1, 5, None), (201, 5, 5, None), (301, 9, 5, 999)])).splitlines()
+        self.assertEqual([line.split()[3] for line in lines], ['201', '101', '301'])
+
+    def testDeadlockCycleTerminates(self):
+        lines = blockerGraph(conflictRows([(101, 1, 5, 102), (102, 1, 5, 101)])).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all('blocks 2 sessions (1 directly)' in line for line in lines))
+
+    def testBlockersBeyondTheLimit(self):
+        lines = blockerGraph(conflictRows([(101, 3, 42, None)], totalBlockers = 12)).splitlines()
+        self.assertEqual(lines[-1], '11 more blocking sessions')
+
+    def testMissingDuration(self):
+        self.assertIn('max duration: 0 seconds', blockerGraph([[101, 1, None, None, 1, None, 1]]))
+
+if __name__ == '__main__':
+    unittest.main()
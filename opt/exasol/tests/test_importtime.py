@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# import time budget of the check plugins: everything up to the option validation must stay cheap,
+# the expensive modules are only imported after it (run with "python3 -m unittest discover")
+import unittest
+from glob               import glob
+from os                 import environ
+from os.path            import dirname, realpath, join, basename
+from subprocess         import Popen, PIPE
+from sys                import executable
+
+checkDirectory          = join(dirname(dirname(realpath(__file__))), 'monitoring')
+importBudget            = 50.0 #milliseconds of module imports for "<check>.py -h"
+heavyModules            = ['ssl', 'json', 'xmlrpc.client', 'asyncio', 'http.client', 'datetime', 'exaoperation', 'ExasolDatabaseConnector']
+
+def importTimes(checkPath, arguments):
+    """runs a plugin with "python3 -X importtime", returns {module: microseconds of its own import}"""
+    environment = dict(environ)
+    environment['EXASOL_MONITORD_SOCKET'] = join(checkDirectory, 'no-daemon.sock') #never delegated
+    process = Popen([executable, '-X', 'importtime', checkPath] + arguments, stdout=PIPE, stderr=PIPE, env=environment)
+    stdout, stderr = process.communicate(timeout=60)
+    times = {}
+    for line in stderr.decode('utf-8', 'replace').split('\n'):
+        fields = line.split('|')
+        if line.startswith('import time:') and len(fields) == 3 and fields[0].split(':')[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[0].split(':')[1])
+    return times
+
+class ImportTimeTest(unittest.TestCase):
+    def checks(self):
+        checks = sorted(glob(join(checkDirectory, 'check_*.py')))
+        self.assertTrue(checks)
+        return checks
+
+    def testHelpStaysWithinBudget(self):
+        for checkPath in self.checks():
+            with self.subTest(check=basename(checkPath)):
+                milliseconds = sum(importTimes(checkPath, ['-h']).values()) / 1000.0
+                self.assertLessEqual(milliseconds, importBudget, '%s -h imports modules for %.1fms' % (basename(checkPath), milliseconds))
+
+    def testOptionErrorsImportNoHeavyModules(self):
+        for checkPath in self.checks():
+            for arguments in [['-h'], ['-V'], []]:
+                with self.subTest(check=basename(checkPath), arguments=arguments):
+                    imported = importTimes(checkPath, arguments)
+                    self.assertEqual([module for module in heavyModules if module in imported], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# compiled blacklist of check_logservice.py (logblacklist.py)
+import unittest
+from os                 import utime
+from os.path            import dirname, realpath, join
+from random             import Random
+from sys                import path
+from tempfile           import TemporaryDirectory
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+from logblacklist       import literalPattern, compileBlacklist, Blacklist
+
+class CompileBlacklistTest(unittest.TestCase):
+    def testWordsAreSubstrings(self):
+        blacklist = compileBlacklist(['Session closed', 'backup started\n', '  '])
+        self.assertTrue(blacklist.search('User sys: Session closed by client'))
+        self.assertTrue(blacklist.search('Remote backup started.'))
+        self.assertFalse(blacklist.search('Session opened'))
+
+    def testSpecialCharactersAreLiteral(self):
+        blacklist = compileBlacklist(['disk (n11) at 90.0%', 'a|b'])
+        self.assertTrue(blacklist.search('warning: disk (n11) at 90.0% usage'))
+        self.assertFalse(blacklist.search('disk n11 at 9000%'))
+        self.assertFalse(blacklist.search('a'))
+
+    def testRegularExpressions(self):
+        blacklist = compileBlacklist(['regex:^Node n\\d+ suspended$', 'literal'])
+        self.assertTrue(blacklist.search('Node n11 suspended'))
+        self.assertFalse(blacklist.search('Node n11 suspended again'))
+        self.assertTrue(blacklist.search('a literal word'))
+
+    def testEmptyBlacklist(self):
+        self.assertIsNone(compileBlacklist(['', '   \n']))
+
+    def testTrieMatchesLikeTheWords(self):
+        random = Random(7)
+        words = [''.join(random.choice('ab.') for i in range(random.randint(1, 4))) for i in range(30)]
+        pattern = compileBlacklist(words)
+        for i in range(500):
+            message = ''.join(random.choice('ab.c') for i in range(random.randint(0, 8)))
+            self.assertEqual(bool(pattern.search(message)), any(word in message for word in words), message)
+
+    def testPrefixWords(self):
+        self.assertEqual(literalPattern(['ab', 'abc', 'b']), '(?:ab(?:c)?|b)')
+
+class BlacklistFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.fileName = join(self.directory.name, 'blacklist')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, content, mtime):
+        with open(self.fileName, 'w') as f:
+            f.write(content)
+        utime(self.fileName, (mtime, mtime))
+
+    def testMissingFile(self):
+        self.assertIsNone(Blacklist(self.fileName))
+
+    def testCompiledUntilTheFileChanges(self):
+        self.write('first\n', 1000000)
+        blacklist = Blacklist(self.fileName)
+        self.assertIs(Blacklist(self.fileName), blacklist)
+        self.write('second\n', 1000060)
+        self.assertFalse(Blacklist(self.fileName).search('first'))
+        self.assertTrue(Blacklist(self.fileName).search('second'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# columnar performance data store of exasol_perfdata.py (perfdatastore.py)
+import unittest
+from calendar           import timegm
+from os                 import listdir
+from os.path            import dirname, realpath, join
+from sys                import path
+from tempfile           import TemporaryDirectory
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+from perfdatastore      import parsePerfdata, PerfdataStore, journalRecord
+
+dayOne                  = timegm((2019, 7, 1, 12, 0, 0))
+dayTwo                  = timegm((2019, 7, 2, 12, 0, 0))
+
+class ParsePerfdataTest(unittest.TestCase):
+    def testValuesAndUnits(self):
+        self.assertEqual(parsePerfdata('usage_percent=2.2%;80.0;90.0 usage=82.0GiB'),
+                [('usage_percent', 2.2, '%'), ('usage', 82.0, 'GiB')])
+
+    def testQuotedLabelsAndSemicolonSeparatedValues(self):
+        self.assertEqual(parsePerfdata("'db1 cpu'=0.5;temp=1e3"), [('db1 cpu', 0.5, ''), ('temp', 1000.0, '')])
+
+    def testUndefinedValuesAreSkipped(self):
+        self.assertEqual(parsePerfdata('hours_to_full=U;; free=3.5GiB'), [('free', 3.5, 'GiB')])
+
+class PerfdataStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.store = PerfdataStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def ingestTwoDays(self):
+        self.store.ingest([
+            (dayOne + 60, 'cluster1', 'disk', 'usage', 2.0, 'GiB'),
+            (dayOne,      'cluster1', 'disk', 'usage', 1.0, 'GiB'),
+            (dayOne,      'cluster1', 'disk', 'free',  9.0, 'GiB'),
+            (dayTwo,      'cluster1', 'disk', 'usage', 3.0, 'GiB')])
+
+    def testIngestWritesOneJournalPerDay(self):
+        self.ingestTwoDays()
+        self.assertEqual(sorted(name for name in listdir(self.directory.name) if name.endswith('.jnl')), ['20190701.jnl', '20190702.jnl'])
+
+    def testSeriesAreKeptInTheDictionary(self):
+        self.ingestTwoDays()
+        expected = [(0, 'cluster1', 'disk', 'usage', 'GiB'), (1, 'cluster1', 'disk', 'free', 'GiB')]
+        self.assertEqual(self.store.series(), expected)
+        self.assertEqual(PerfdataStore(self.directory.name).series(label='free'), expected[1:])
+
+    def testSamplesOfTheJournalAreSorted(self):
+        self.ingestTwoDays()
+        self.assertEqual(self.store.samples([0], '20190701'), {0: [(dayOne, 1.0), (dayOne + 60, 2.0)]})
+
+    def testCompactionKeepsTheSamples(self):
+        self.ingestTwoDays()
+        self.assertEqual(self.store.compactJournals('20190702'), ['20190701'])
+        self.assertEqual(sorted(listdir(self.directory.name)), ['.lock', '20190701.seg', '20190702.jnl', 'series.idx'])
+        self.assertEqual(self.store.samples([0, 1], '20190701'), {0: [(dayOne, 1.0), (dayOne + 60, 2.0)], 1: [(dayOne, 9.0)]})
+        self.assertEqual(self.store.readSegment('20190701', [1]), {1: [(dayOne, 9.0)]})
+
+    def testLateSamplesAreMergedIntoTheSegment(self):
+        self.ingestTwoDays()
+        self.store.compactJournals('20190702')
+        self.store.ingest([(dayOne + 30, 'cluster1', 'disk', 'usage', 1.5, 'GiB')])
+        self.assertEqual(self.store.samples([0], '20190701')[0], [(dayOne, 1.0), (dayOne + 30, 1.5), (dayOne + 60, 2.0)])
+        self.store.compactJournals('20190702')
+        self.assertEqual(self.store.readSegment('20190701', [0])[0], [(dayOne, 1.0), (dayOne + 30, 1.5), (dayOne + 60, 2.0)])
+
+    def testPartlyWrittenRecordIsIgnored(self):
+        self.ingestTwoDays()
+        self.store.append('20190702.jnl', journalRecord.pack(0, dayTwo + 60, 4.0)[:10])
+        self.assertEqual(self.store.samples([0], '20190702'), {0: [(dayTwo, 3.0)]})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# trap definition parser and the compiled trap index of exasol_traphandler.py (trapindex.py)
+import unittest
+from os.path            import dirname, realpath, join
+from sys                import path
+from tempfile           import TemporaryDirectory
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+from trapindex          import readTrapDefinitions, compileIndex, TrapIndex, hostKeyPrefix
+
+trapDefinitions         = """# ServerView trap definitions
+TRAPNAME sniScFanFailed
+TRAPOID .1.3.6.1.4.1.231.2.10.2.2.10.20.1.0.2
+SEVERITY CRITICAL
+TTFORMAT Fan '$5' failed in cabinet $4 of server $3
+
+TRAPNAME sniScTempOk
+TRAPOID .1.3.6.1.4.1.231.2.10.2.2.10.20.1.0.3
+SEVERITY OK
+# a comment within a block is skipped
+TTFORMAT Temperature ok
+
+TRAPNAME sniScNoOid
+SEVERITY WARNING
+"""
+
+class ReadTrapDefinitionsTest(unittest.TestCase):
+    def testBlocksWithOid(self):
+        with TemporaryDirectory() as directory:
+            fileName = join(directory, 'traps.cfg')
+            with open(fileName, 'w', encoding='latin-1') as f:
+                f.write(trapDefinitions)
+            traps = readTrapDefinitions(fileName)
+        self.assertEqual([trap['TRAPNAME'] for trap in traps], ['sniScFanFailed', 'sniScTempOk'])
+        self.assertEqual(traps[0]['TTFORMAT'], "Fan '$5' failed in cabinet $4 of server $3")
+        self.assertEqual(traps[1]['TTFORMAT'], 'Temperature ok')
+
+    def testShippedDefinitions(self):
+        fileName = join(dirname(dirname(dirname(realpath(__file__)))), 'fujitsu/ServerViewSuite/nagios/trap/trapconf/fj/RAID.cfg')
+        with open(fileName, 'r', encoding='latin-1') as f:
+            trapOids = [line.split()[1] for line in f if line.startswith('TRAPOID')]
+        traps = readTrapDefinitions(fileName)
+        self.assertEqual([trap['TRAPOID'] for trap in traps], trapOids)
+        self.assertEqual(traps[0]['TTFORMAT'], 'Undefined event (Server $1)')
+
+class TrapIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.fileName = join(self.directory.name, 'traps.index')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def compiled(self, records):
+        compileIndex(records, self.fileName)
+        index = TrapIndex(self.fileName)
+        self.addCleanup(index.close)
+        return index
+
+    def testTrapsAndHosts(self):
+        index = self.compiled({
+            '.1.3.6.1.4.1.231.2.10.2.2.10.20.1.0.2':    ['sniScFanFailed', 'CRITICAL', 'Fan $5 failed'],
+            hostKeyPrefix + '10.0.0.11':                ['cluster1_n11']})
+        self.assertEqual(index.trap('.1.3.6.1.4.1.231.2.10.2.2.10.20.1.0.2'), ('sniScFanFailed', 'CRITICAL', 'Fan $5 failed'))
+        self.assertEqual(index.trap('1.3.6.1.4.1.231.2.10.2.2.10.20.1.0.2'), ('sniScFanFailed', 'CRITICAL', 'Fan $5 failed'))
+        self.assertEqual(index.hostName('10.0.0.11'), 'cluster1_n11')
+
+    def testEmptyFieldsAreKept(self):
+        index = self.compiled({'.1.2.3': ['trap', '', ''], '.1.2.4': ['', 'OK', 'format']})
+        self.assertEqual(index.trap('.1.2.3'), ('trap', '', ''))
+        self.assertEqual(index.trap('.1.2.4'), ('', 'OK', 'format'))
+
+    def testUnknownKeys(self):
+        index = self.compiled({'.1.2.3': ['a', 'OK', '']})
+        self.assertIsNone(index.trap('.1.2.4'))
+        self.assertIsNone(index.hostName('10.0.0.99'))
+        self.assertIsNone(self.compiled({}).get('.1.2.3'))
+
+    def testKeyPrefixesDoNotMatch(self):
+        index = self.compiled({'.1.2.30': ['long', 'OK', ''], '.1.2.3': ['short', 'OK', '']})
+        self.assertEqual(index.trap('.1.2.3')[0], 'short')
+        self.assertEqual(index.trap('.1.2.30')[0], 'long')
+
+    def testCollisionsAreProbed(self):
+        records = dict(('.1.3.6.1.4.1.231.%i' % number, ['trap%i' % number, 'OK', '']) for number in range(1000))
+        index = self.compiled(records)
+        for key, fields in records.items():
+            self.assertEqual(index.get(key), fields)
+
+    def testOtherFilesAreRejected(self):
+        with open(self.fileName, 'wb') as f:
+            f.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            TrapIndex(self.fileName)
+
+if __name__ == '__main__':
+    unittest.main()
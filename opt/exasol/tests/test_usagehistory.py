@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# usage history ring file and the trend forecast of check_db_diskspace.py (usagehistory.py)
+import unittest
+from os.path            import dirname, realpath, join, getsize
+from sys                import path
+from tempfile           import TemporaryDirectory
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+from usagehistory       import UsageHistory, linearForecast, historyHeader, minSampleInterval
+
+class UsageHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.fileName = join(self.directory.name, 'history.ring')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testSamplesAreReturnedInTimeOrder(self):
+        history = UsageHistory(self.fileName, 8)
+        self.assertEqual(history.add(1000.0, 5.0), [(1000.0, 5.0)])
+        self.assertEqual(history.add(1300.0, 4.0), [(1000.0, 5.0), (1300.0, 4.0)])
+        self.assertEqual(getsize(self.fileName), historyHeader.size + 8 * 16)
+
+    def testFrequentRunsAddNoSamples(self):
+        history = UsageHistory(self.fileName, 8)
+        history.add(1000.0, 5.0)
+        self.assertEqual(history.add(1000.0 + minSampleInterval / 2, 4.0), [(1000.0, 5.0)])
+
+    def testOldestSamplesAreOverwritten(self):
+        history = UsageHistory(self.fileName, 4)
+        for minute in range(6):
+            samples = history.add(1000.0 + minute * 60.0, float(minute))
+        self.assertEqual(samples, [(1120.0, 2.0), (1180.0, 3.0), (1240.0, 4.0), (1300.0, 5.0)])
+        self.assertEqual(getsize(self.fileName), historyHeader.size + 4 * 16)
+
+    def testOtherCapacityStartsAgain(self):
+        UsageHistory(self.fileName, 4).add(1000.0, 5.0)
+        self.assertEqual(UsageHistory(self.fileName, 8).add(1060.0, 4.0), [(1060.0, 4.0)])
+
+    def testUnreadableFileStartsAgain(self):
+        with open(self.fileName, 'wb') as f:
+            f.write(b'not a history')
+        self.assertEqual(UsageHistory(self.fileName, 4).add(1000.0, 5.0), [(1000.0, 5.0)])
+
+class LinearForecastTest(unittest.TestCase):
+    def testSecondsUntilTheLimit(self):
+        samples = [(1000.0 + hour * 3600.0, 100.0 - hour * 10.0) for hour in range(5)] #60 left, 10 per hour
+        self.assertAlmostEqual(linearForecast(samples, 0.0), 6 * 3600.0)
+
+    def testLargeTimestamps(self):
+        samples = [(1.5e9 + minute * 60.0, 50.0 - minute * 0.5) for minute in range(100)]
+        self.assertAlmostEqual(linearForecast(samples, 0.0), 60.0, places=3) #0.5 left, 0.5 per minute
+
+    def testValuesMovingAwayFromTheLimit(self):
+        self.assertIsNone(linearForecast([(1000.0, 50.0), (2000.0, 60.0)], 0.0))
+        self.assertIsNone(linearForecast([(1000.0, 50.0), (2000.0, 50.0)], 0.0))
+
+    def testTooFewSamples(self):
+        self.assertIsNone(linearForecast([], 0.0))
+        self.assertIsNone(linearForecast([(1000.0, 50.0)], 0.0))
+        self.assertIsNone(linearForecast([(1000.0, 50.0), (1000.0, 40.0)], 0.0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# free space per node of check_db_diskspace.py (volumespace.py)
+import unittest
+from os.path            import dirname, realpath, join
+from sys                import path
+path.insert(0, join(dirname(dirname(realpath(__file__))), 'monitoring'))
+from volumespace        import segmentNodes, freeSpace, smallest, percentiles
+
+class SegmentNodesTest(unittest.TestCase):
+    volumeInfo = {'redundancy': 2, 'segments': [['n11', 'n12', 'n13'], ['n12', 'n13', 'n11']]}
+
+    def testAllRedundancyLayers(self):
+        self.assertEqual(segmentNodes(self.volumeInfo), ['n11', 'n12', 'n13', 'n12', 'n13', 'n11'])
+
+    def testFirstLayers(self):
+        self.assertEqual(segmentNodes(self.volumeInfo, 1), ['n11', 'n12', 'n13'])
+
+    def testLayersBeyondRedundancyAreIgnored(self):
+        volumeInfo = dict(self.volumeInfo, redundancy = 1)
+        self.assertEqual(segmentNodes(volumeInfo), ['n11', 'n12', 'n13'])
+
+class FreeSpaceTest(unittest.TestCase):
+    def testSegmentsAreSubtractedPerNode(self):
+        nodes, free, firstSegments = freeSpace({'n12': 100.0, 'n11': 100.0},
+                [(['n11', 'n12', 'n11'], 10.0), (['n12'], 5.0)])
+        self.assertEqual(nodes, ['n11', 'n12'])
+        self.assertEqual(free, [80.0, 85.0])
+        self.assertEqual(firstSegments, [2, 1])
+
+    def testSegmentsOnOtherNodesAreIgnored(self):
+        nodes, free, firstSegments = freeSpace({'n11': 50.0}, [(['n11', 'n99'], 10.0), (['n99'], 20.0)])
+        self.assertEqual(free, [40.0])
+        self.assertEqual(firstSegments, [1])
+
+    def testNoSegments(self):
+        self.assertEqual(freeSpace({'n11': 50.0}, []), (['n11'], [50.0], [0]))
+
+class StatisticsTest(unittest.TestCase):
+    def testSmallestReturnsFirstPosition(self):
+        self.assertEqual(smallest([3.0, 1.0, 2.0, 1.0]), 1)
+
+    def testPercentilesInterpolateLinearly(self):
+        self.assertEqual(percentiles([40.0, 10.0, 30.0, 20.0], [0, 50, 100]), [10.0, 25.0, 40.0])
+        self.assertAlmostEqual(percentiles([10.0, 20.0, 30.0, 40.0], [10])[0], 13.0)
+
+    def testPercentilesOfOneValue(self):
+        self.assertEqual(percentiles([7.0], [10, 50, 90]), [7.0, 7.0, 7.0])
+
+if __name__ == '__main__':
+    unittest.main()